@@ -37,6 +37,7 @@ setup(
         ],
     extras_require={
         'test': ['plone.app.testing>=4.0a6'],
+        'numpy': ['numpy'],
         },
     entry_points="""
     # -*- Entry points: -*-
@@ -0,0 +1,48 @@
+import json
+
+from Products.statusmessages.interfaces import IStatusMessage
+
+from uu.chart.cascadejob import get_job, resume
+
+
+class CascadeStatusView(object):
+    """
+    JSON status and progress of background workflow cascade of context
+    (report or chart), polled by integration.js while it runs.
+    """
+
+    def __init__(self, context, request):
+        self.context = context
+        self.request = request
+
+    def __call__(self, *args, **kwargs):
+        job = get_job(self.context)
+        info = job.info() if job is not None else {'status': None}
+        response = self.request.response
+        response.setHeader('Content-Type', 'application/json')
+        response.setHeader('Cache-Control', 'no-cache')
+        return json.dumps(info)
+
+
+class CascadeResumeView(object):
+    """
+    Resume failed (or stale, e.g. after a restart) background workflow
+    cascade of context from the steps done, on POST; redirects back.
+    """
+
+    def __init__(self, context, request):
+        self.context = context
+        self.request = request
+
+    def __call__(self, *args, **kwargs):
+        req = self.request
+        if req.get('REQUEST_METHOD') == 'POST':
+            job = resume(self.context)
+            if job is None:
+                message = 'No unfinished background cascade to resume.'
+            else:
+                message = '%s of contents will continue in background.' % (
+                    job.action.capitalize(),
+                    )
+            IStatusMessage(req).addStatusMessage(message, type='info')
+        req.response.redirect(self.context.absolute_url())
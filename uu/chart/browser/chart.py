@@ -1,9 +1,12 @@
-import random
-
 from plone.uuid.interfaces import IUUID
+from Products.Five.browser.pagetemplatefile import ViewPageTemplateFile
 from zope.component.hooks import getSite
 from zope.security import checkPermission
 
+from uu.chart.cascadejob import get_job, running_job
+from uu.chart.jsoncache import version_token
+from uu.chart.styleref import styled
+
 
 class ChartView(object):
     """Page using jqPlot to render a chart from AJAX-loaded JSON"""
@@ -13,6 +16,9 @@ class ChartView(object):
         'uu.chart.namedseries',
         ]
 
+    # macros for rendering elements, shared by report page fragments:
+    elements_template = ViewPageTemplateFile('report_page.pt')
+
     def __init__(self, context, request):
         self.context = context
         self.request = request
@@ -23,6 +29,34 @@ class ChartView(object):
     def chart_elements(self):
         return [self.context]
 
+    def page(self, b_start=0):
+        """Page of elements (see ReportView.page()), for chart only one"""
+        return {
+            'elements': [self.context],
+            'plots': 1,
+            'offset': 0,
+            'next': None,
+            'total': 1,
+            }
+
+    def cascade_job(self):
+        """Status dict of background cascade running for context, or None"""
+        job = running_job(self.context)
+        return job.info() if job is not None else None
+
+    def failed_cascade_job(self):
+        """
+        Status dict of failed (or stale) background cascade of context,
+        for managers (who may resume it), or None.
+        """
+        job = get_job(self.context)
+        if job is None:
+            return None
+        if not checkPermission('cmf.ManagePortal', self.context):
+            return None
+        info = job.info()
+        return info if info['status'] == 'failed' else None
+
     def UID(self, context=None):
         if context is None:
             context = self.context
@@ -37,13 +71,25 @@ class ChartView(object):
     def json_url(self, context=None):
         if context is None:
             context = self.context
-        cache_bust = 'cache_bust=%s' % random.randint(1, 2 ** 32)
-        return '%s/%s?%s' % (
+        return '%s/%s?v=%s' % (
             context.absolute_url(),
             '@@chart_json',
-            cache_bust,
+            version_token([context]),
             )
 
+    def report_version(self):
+        """Content version token for all charts in report"""
+        charts = [
+            o for o in self.chart_elements()
+            if getattr(o, 'portal_type', None) in self.PLOT_TYPES
+            ]
+        return version_token(charts)
+
+    def chart_css(self, element):
+        """Effective CSS rules (chart_styles) of element, or None"""
+        css = getattr(styled(element), 'chart_styles', None)
+        return css if css and css.strip() else None
+
     def _fixedheight(self, context):
         """return fixed height in pixels or None"""
         height = getattr(context, 'height', None) or 200
@@ -72,6 +118,7 @@ class ChartView(object):
         """
         if context is None:
             context = self.context
+        context = styled(context)  # effective display values
         width = getattr(context, 'width', None) or width
         width_units = getattr(context, 'width_units', None)
         height = self._fixedheight(context)
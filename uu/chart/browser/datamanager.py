@@ -0,0 +1,19 @@
+# z3c.form data manager for fields of charts (and series) inheriting
+# styles from a bound stylebook (see uu.chart.styleref): edit forms show
+# the effective display values, not the (stale) values stored on the
+# chart, and so only record edits differing from the effective value.
+
+from z3c.form.datamanager import AttributeField
+
+from uu.chart.styleref import effective_styles
+
+
+class StyledAttributeField(AttributeField):
+    """Attribute field data manager reading effective display values"""
+
+    def get(self):
+        styles = effective_styles(self.context)
+        name = self.field.__name__
+        if styles is not None and name in styles:
+            return styles[name]
+        return super(StyledAttributeField, self).get()
@@ -2,6 +2,7 @@ from plone.app.uuid.utils import uuidToCatalogBrain
 
 from uu.chart.interfaces import INamedDataSequence, IMeasureSeriesProvider
 from uu.chart.interfaces import SUMMARIZATION_STRATEGIES
+from uu.chart.materialize import materialized_info
 
 STRATEGIES = dict(SUMMARIZATION_STRATEGIES)
 
@@ -46,6 +47,15 @@ class DataTableView(object):
                         ))
         return result
 
+    def materialized(self):
+        """Staleness info of precomputed data, if applicable"""
+        return materialized_info(self.context)
+
+    def rejected(self):
+        """Rows of input rejected by parsing, if applicable"""
+        diagnostics = getattr(self.context, 'diagnostics', None)
+        return diagnostics() if diagnostics is not None else []
+
     def fieldnames(self):
         return (self.keyname(), 'value', 'note', 'uri')
 
@@ -1,6 +1,4 @@
-import calendar
 from datetime import date
-import itertools
 
 from Acquisition import aq_base
 from persistent.dict import PersistentDict
@@ -39,6 +37,76 @@ def get_locale(request):
     return locale
 
 
+DEFAULT_LOCALE = 'en_US'
+
+LABEL_MEMO_SIZE = 10000  # dates labeled by each formatter, kept
+
+
+def _month_names(locname):
+    """(month names, abbreviations) of zope.i18n locale, as lists"""
+    language, territory = (locname.split('_') + [None])[:2]
+    try:
+        locale = locales.getLocale(language, territory)
+    except LoadLocaleError:
+        locale = locales.getLocale('en', 'US')
+    calendar = locale.dates.calendars['gregorian']
+    return calendar.getMonthNames(), calendar.getMonthAbbreviations()
+
+
+class LabelFormatter(object):
+    """
+    Default date label formatter for a locale name (e.g. 'en_US') and
+    label format (see DATE_AXIS_LABEL_CHOICES).  Month names are read
+    once from zope.i18n locale data: the process locale is never
+    changed (as calendar.LocaleTextCalendar does), so formatters are
+    safe to share between threads (see label_formatter()).
+    Abbreviated month names are English for all locales, as before.
+    """
+
+    def __init__(self, locname, usage):
+        self.locname = locname
+        self.usage = usage
+        self.names = _month_names(locname)[0]
+        self.abbreviations = _month_names(DEFAULT_LOCALE)[1]
+        self._labels = {}  # date -> label
+
+    def format(self, d):
+        usage = self.usage
+        if usage == 'abbr':
+            return self.abbreviations[d.month - 1]
+        if usage == 'abbr+year':
+            return u'%s %s' % (self.abbreviations[d.month - 1], d.year)
+        if usage == 'name+year':
+            return u'%s %s' % (self.names[d.month - 1], d.year)
+        if usage == 'name':
+            return self.names[d.month - 1]
+        return '%02d/%02d/%04d' % (d.month, d.day, d.year)
+
+    def __call__(self, d):
+        label = self._labels.get(d)
+        if label is None:
+            if len(self._labels) >= LABEL_MEMO_SIZE:
+                self._labels = {}
+            label = self._labels[d] = self.format(d)
+        return label
+
+    def labels(self, dates):
+        """Dict of date to label for all dates (e.g. a date axis)"""
+        return dict((d, self(d)) for d in dates)
+
+
+_formatters = {}  # (locale name, format) -> LabelFormatter
+
+
+def label_formatter(locname, usage):
+    """Shared LabelFormatter for locale name and label format"""
+    key = (locname, usage)
+    formatter = _formatters.get(key)
+    if formatter is None:
+        formatter = _formatters[key] = LabelFormatter(locname, usage)
+    return formatter
+
+
 class DateLabelView(object):
     """View for managing date label aliases"""
 
@@ -59,37 +127,32 @@ class DateLabelView(object):
     def included_dates(self, data=None):
         """
         Returns dates of unique date keys in use by all series data
-        computed by chart.  Returns list of datetime.date.
+        computed by chart (see identities() of chart, which caches
+        these), optionally given list of (series, data) pairs.  Returns
+        list of datetime.date.
 
         Template should use by iterating over dates and calling .isoformat()
         method for a label and key.
         """
-        all_series = self.context.series()
-        if data is None:
-            data = [(s, s.data) for s in all_series]
-        q = itertools.chain(
-            *[[p.identity() for p in t[1]] for t in data]
-            )
-        # we can de-dupe point dates since hash(datetime.date()) is reliable:
-        return sorted(list(set(q)))  # iterate all unique point identity dates
+        return self.context.identities(data)
+
+    def locale_name(self):
+        """Locale name for request, e.g. 'en_US' (default)"""
+        if not hasattr(self, '_locname'):
+            self._locname = DEFAULT_LOCALE
+            r_locale = get_locale(self.request)
+            if r_locale and r_locale.id.territory:
+                self._locname = '_'.join(
+                    (r_locale.id.language, r_locale.id.territory)
+                    )
+        return self._locname
+
+    def formatter(self):
+        usage = getattr(aq_base(self.context), 'label_default', 'locale')
+        return label_formatter(self.locale_name(), usage)
 
     def date_to_formatted(self, d):
-        usage = getattr(aq_base(self.context), 'label_default', 'locale')
-        locname = 'en_US'  # default locale
-        r_locale = get_locale(self.request)
-        if r_locale and r_locale.id.territory:
-            locname = '_'.join((r_locale.id.language, r_locale.id.territory))
-        cal1 = calendar.LocaleTextCalendar(locale=(locname, 'UTF-8'))
-        name = cal1.formatmonthname(*d.timetuple()[:2], width=0)  # month name
-        if usage == 'abbr':
-            return calendar.month_abbr[d.month]
-        if usage == 'abbr+year':
-            return '%s %s' % (calendar.month_abbr[d.month], d.year)
-        if usage == 'name+year':
-            return name
-        if usage == 'name':
-            return name.split(' ')[0]  # name, no year
-        return d.strftime('%m/%d/%Y')
+        return self.formatter()(d)
 
     def parse_date(self, d):
         if isinstance(d, date):
@@ -109,6 +172,18 @@ class DateLabelView(object):
     def label_for(self, d):
         return self.custom_label_for(d) or self.date_to_formatted(d)
 
+    def labels(self, dates):
+        """
+        Dict of ISO 8601 date stamp to label for dates (e.g. all dates
+        included in chart), with the formatter and any custom labels
+        looked up once for all.
+        """
+        store = getattr(aq_base(self.context), 'label_overrides', None) or {}
+        formatted = self.formatter().labels(dates)
+        return dict(
+            (d.isoformat(), store.get(d) or formatted[d]) for d in dates
+            )
+
     def update(self, *args, **kwargs):
         req = self.request
         method = req.get('REQUEST_METHOD')
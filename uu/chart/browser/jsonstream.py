@@ -0,0 +1,170 @@
+"""
+Streaming JSON encoding for chart and report payloads.
+
+iterencode() yields JSON text in fragments, so that large payloads
+(reports of many charts) never need to exist as one nested structure
+or one string in memory.  Arrays whose items are produced on demand are
+wrapped in LazyArray, and already-encoded (e.g. cached) JSON in
+RawJSON; everything else is ordinary JSON-serializable data.  Output is
+byte-identical to json.dumps() with the same indent (and default
+separators), or compact (no whitespace) with indent=None.
+"""
+
+import json
+
+
+STREAM_THRESHOLD = 64 * 1024  # bytes buffered before streaming response
+
+
+class LazyArray(object):
+    """
+    JSON array of items from an iterable, consumed once on encoding.
+    If leaves is True, items are known to contain no LazyArray (so are
+    encoded whole, without inspection); if encoded is True, items are
+    already-encoded JSON text (as for RawJSON), emitted as-is.
+    """
+
+    def __init__(self, iterable, leaves=False, encoded=False):
+        self.iterable = iterable
+        self.leaves = leaves or encoded
+        self.encoded = encoded
+
+    def __iter__(self):
+        return iter(self.iterable)
+
+
+class RawJSON(object):
+    """
+    Already-encoded JSON text (at top level, with the same indent as
+    the output it is included in), emitted as-is, re-indented for its
+    position in output.
+    """
+
+    def __init__(self, text):
+        self.text = text
+
+
+_CONTAINERS = (dict, list, tuple, LazyArray, RawJSON)
+
+
+def _streamed(obj):
+    """Does obj (need to) contain a LazyArray at any depth?"""
+    if isinstance(obj, (LazyArray, RawJSON)):
+        return True
+    if isinstance(obj, dict):
+        obj = obj.itervalues()
+    elif not isinstance(obj, (list, tuple)):
+        return False
+    return any(_streamed(v) for v in obj if isinstance(v, _CONTAINERS))
+
+
+def _key(key):
+    """Convert dict key as json module does"""
+    if isinstance(key, basestring):
+        return key
+    if key is True:
+        return 'true'
+    if key is False:
+        return 'false'
+    if key is None:
+        return 'null'
+    if isinstance(key, float):
+        return repr(key)
+    if isinstance(key, (int, long)):
+        return str(key)
+    raise TypeError('key %r is not a string' % (key,))
+
+
+class _Encoder(object):
+
+    def __init__(self, indent=None):
+        self.indent = indent
+        if indent is None:
+            self.separators = (',', ':')
+        else:
+            self.separators = (', ', ': ')
+
+    def newline(self, level):
+        if self.indent is None:
+            return ''
+        return '\n' + ' ' * (self.indent * level)
+
+    def dumps(self, obj, level):
+        if isinstance(obj, RawJSON):
+            text = obj.text
+        else:
+            text = json.dumps(
+                obj,
+                indent=self.indent,
+                separators=self.separators,
+                )
+        if self.indent and level:
+            text = text.replace('\n', self.newline(level))
+        return text
+
+    def iterencode(self, obj, level=0):
+        if isinstance(obj, RawJSON) or not _streamed(obj):
+            yield self.dumps(obj, level)
+            return
+        is_dict = isinstance(obj, dict)
+        leaves = isinstance(obj, LazyArray) and obj.leaves
+        encoded = leaves and obj.encoded
+        opener, closer = '{}' if is_dict else '[]'
+        item_separator, key_separator = self.separators
+        inner = self.newline(level + 1)
+        empty = True
+        for item in (obj.iteritems() if is_dict else obj):
+            prefix = (opener if empty else item_separator) + inner
+            empty = False
+            if is_dict:
+                key, item = item
+                prefix += json.dumps(_key(key)) + key_separator
+            if encoded:
+                if self.indent:
+                    item = item.replace('\n', inner)
+                yield prefix + item
+                continue
+            if leaves:
+                yield prefix + self.dumps(item, level + 1)  # one chunk
+                continue
+            yield prefix
+            for chunk in self.iterencode(item, level + 1):
+                yield chunk
+        yield opener + closer if empty else self.newline(level) + closer
+
+
+def iterencode(obj, indent=None):
+    """
+    Generate JSON text fragments for obj, which may contain LazyArray
+    values; indent is as for json.dumps(), None for compact output.
+    """
+    return _Encoder(indent).iterencode(obj)
+
+
+def write_json(response, chunks, threshold=STREAM_THRESHOLD):
+    """
+    Write JSON text chunks to response, return body to return from the
+    view.  Output smaller than threshold is returned whole, with its
+    Content-Length; larger output is streamed to the response (without
+    Content-Length, as its size is not known) in writes of about
+    threshold bytes, and the returned body is empty.
+    """
+    response.setHeader('Content-type', 'application/json')
+    buf = []
+    size = 0
+    streaming = False
+    for chunk in chunks:
+        buf.append(chunk)
+        size += len(chunk)
+        if size >= threshold:
+            response.write(''.join(buf))
+            buf = []
+            size = 0
+            streaming = True
+    data = ''.join(buf)
+    if streaming:
+        if data:
+            response.write(data)
+        return ''
+    response.setHeader('Content-length', str(len(data)))
+    return data
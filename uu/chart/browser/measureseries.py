@@ -3,9 +3,16 @@ import json
 from plone.uuid.interfaces import IUUID
 from zope.component.hooks import getSite
 from Products.CMFCore.utils import getToolByName
+from Products.statusmessages.interfaces import IStatusMessage
 
 from uu.formlibrary.measure.interfaces import IMeasureDefinition
 
+from uu.chart.depindex import get_index
+from uu.chart.interfaces import IMeasureSeriesProvider
+from uu.chart.interfaces import resolve_uid, resolve_uids
+from uu.chart.jobqueue import get_queue
+from uu.chart.materialize import is_materialized, refresh
+
 
 DATASET_TYPE = 'uu.formlibrary.setspecifier'
 
@@ -49,11 +56,7 @@ class DatasetListerView(object):
         if self.ispath(measure_uid):
             r = find({'path': {'query': measure_uid, 'depth': 0}})
             measure_uid = r[0].UID if r else None  # value from catalog brain
-        r = find({'UID': measure_uid})
-        if not measure_uid or not r:
-            req.response.setHeader('Content-Length', 2)
-            return '[]'   # empty
-        measure = r[0]._unrestrictedGetObject()
+        measure = resolve_uid(measure_uid) if measure_uid else None
         if not IMeasureDefinition.providedBy(measure):
             req.response.setHeader('Content-Length', 2)
             return '[]'   # empty
@@ -63,3 +66,68 @@ class DatasetListerView(object):
         req.response.setHeader('Content-Length', len(msg))
         return msg
 
+
+class RefreshDataView(object):
+    """
+    Refresh materialized data of measure series now: of context series,
+    or of all series of context chart; redirects back to context.
+    """
+
+    def __init__(self, context, request):
+        self.context = context
+        self.request = request
+
+    def series(self):
+        if IMeasureSeriesProvider.providedBy(self.context):
+            return [self.context]
+        return self.context.series()
+
+    def __call__(self, *args, **kwargs):
+        refreshed = [s for s in self.series() if is_materialized(s)]
+        queue = get_queue()
+        for series in refreshed:
+            refresh(series)
+            if queue is not None:
+                queue.discard(IUUID(series))  # refreshed: not needed
+        IStatusMessage(self.request).addStatusMessage(
+            'Refreshed precomputed data of %s series.' % len(refreshed),
+            type='info',
+            )
+        self.request.response.redirect(self.context.absolute_url())
+
+
+class ChartUsageView(object):
+    """
+    Where is this measure (or dataset) used: reports and charts with
+    series bound to context, found by the dependency index.
+    """
+
+    def __init__(self, context, request):
+        self.context = context
+        self.request = request
+
+    @property
+    def noun(self):
+        """What context is, for display: measure or dataset"""
+        if IMeasureDefinition.providedBy(self.context):
+            return u'measure'
+        return u'dataset'
+
+    def _items(self, uids):
+        """(title, URL) of items for UIDs, skipping any not found"""
+        return [
+            (item.Title(), item.absolute_url())
+            for item in resolve_uids(uids)
+            if item is not None
+            ]
+
+    def usage(self):
+        """Dict of lists of (title, URL) for reports, charts"""
+        index = get_index()
+        uid = IUUID(self.context)
+        if index is None:
+            return {'reports': [], 'charts': []}
+        return {
+            'reports': self._items(index.report_uids(uid)),
+            'charts': self._items(index.chart_uids(uid)),
+            }
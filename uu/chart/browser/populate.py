@@ -4,13 +4,12 @@ import itertools
 from persistent.dict import PersistentDict
 from Acquisition import aq_base
 from plone.dexterity.utils import createContentInContainer
-from plone.app.uuid.utils import uuidToObject
 from Products.statusmessages.interfaces import IStatusMessage
 
 from uu.chart.interfaces import TIMESERIES_TYPE, NAMEDSERIES_TYPE
 from uu.chart.interfaces import DATE_AXIS_LABEL_CHOICES
 from uu.chart.interfaces import MEASURESERIES_DATA
-from uu.chart.interfaces import resolve_uid
+from uu.chart.interfaces import resolve_uid, resolve_uids
 
 from uu.chart.browser.styles import clone_chart_styles
 
@@ -70,7 +69,7 @@ class ReportPopulateView(object):
         if end_date:
             chart.end = end_date
 
-    def _measureinfo(self, uid):
+    def _measureinfo(self, uid, measure=None):
         raw = self.request.form
         r = {'uid': uid}
         chart_type = raw.get('charttype-%s' % uid, 'runchart-line')
@@ -78,7 +77,7 @@ class ReportPopulateView(object):
         r['portal_type'] = fti
         r['display_precision'] = 0  # default, assumes count
         if fti == TIMESERIES_TYPE:
-            measure = uuidToObject(uid)
+            measure = measure if measure is not None else resolve_uid(uid)
             if measure.value_type == 'percentage':
                 r['range_min'] = 0
                 r['range_max'] = 100
@@ -138,7 +137,11 @@ class ReportPopulateView(object):
             msg = u'You must select at least one of each: data-set, measure.'
             self.status.addStatusMessage(msg, type='info')
         else:
-            measures = map(self._measureinfo, measure_uids)
+            measures = map(
+                self._measureinfo,
+                measure_uids,
+                resolve_uids(measure_uids),  # one query for all measures
+                )
             datasets = map(self._datasetinfo, dataset_uids)
         return measures, datasets
 
@@ -0,0 +1,72 @@
+from datetime import datetime
+
+from Products.statusmessages.interfaces import IStatusMessage
+
+from uu.chart.jobqueue import PRIORITY_LABELS, get_queue
+from uu.chart.materialize import wake_queue
+
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class RefreshQueueView(object):
+    """
+    Status of the queue of refresh jobs for materialized measure series:
+    queue depth (by priority), totals, and timings of recent jobs; a
+    POST with 'run' wakes the worker (e.g. for jobs queued before a
+    restart).
+    """
+
+    def __init__(self, context, request):
+        self.context = context   # site
+        self.request = request
+        self.queue = get_queue(self.context)
+
+    def depth(self):
+        return self.queue.depth() if self.queue is not None else 0
+
+    def depth_by_priority(self):
+        """List of (priority label, number of jobs queued)"""
+        if self.queue is None:
+            return []
+        depths = self.queue.depth_by_priority()
+        return [
+            (PRIORITY_LABELS.get(priority, priority), depths[priority])
+            for priority in sorted(depths)
+            ]
+
+    def totals(self):
+        """Dict of numbers of jobs done, failed"""
+        if self.queue is None:
+            return {'done': 0, 'failed': 0}
+        return {'done': self.queue.done(), 'failed': self.queue.failed()}
+
+    def recent(self):
+        """Recent jobs, most recent first, formatted for display"""
+        if self.queue is None:
+            return []
+        _time = lambda t: datetime.fromtimestamp(t).strftime(TIME_FORMAT)
+        return [
+            {
+                'path': job['path'] or job['uid'],
+                'priority': PRIORITY_LABELS.get(job['priority']),
+                'finished': _time(job['finished']),
+                'wait': '%.1f s' % job['wait'],
+                'duration': '%.3f s' % job['duration'],
+                'status': job['status'],
+            }
+            for job in self.queue.recent()
+            ]
+
+    def update(self, *args, **kwargs):
+        req = self.request
+        if req.get('REQUEST_METHOD') == 'POST' and 'run' in req.form:
+            wake_queue(self.context)
+            IStatusMessage(req).addStatusMessage(
+                'Running queued refresh jobs.',
+                type='info',
+                )
+
+    def __call__(self, *args, **kwargs):
+        self.update(*args, **kwargs)
+        return self.index(*args, **kwargs)  # provided by template/framework
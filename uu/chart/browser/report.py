@@ -1,15 +1,14 @@
-from AccessControl.SecurityManagement import getSecurityManager
+from Products.CMFCore.utils import getToolByName
 
 from uu.chart.browser.chart import ChartView
+from uu.chart.config import setting
 
 
 def batch(items, b_start=0, b_size=None):
     """
-    Simple batching that does not try to avoid loading objects from
-    ZODB; rather, the win (for report loading via ReportJSON view),
-    is from avoiding the overhead of getting data.  There is benefit
-    in pre-loading the content for the report; batching should not
-    try to avoid that.
+    Simple batching of a sequence; for lazy catalog results (as used
+    by ReportView), only brains in the batch are loaded, and callers
+    load objects only for those.
     """
     if b_size is None and not b_start:
         return items  # no batching specified
@@ -20,7 +19,15 @@ def batch(items, b_start=0, b_size=None):
 
 
 class ReportView(ChartView):
-    """Report is aggregate of charts and page (html fragment) elements"""
+    """
+    Report is aggregate of charts and page (html fragment) elements.
+
+    Elements are found by catalog query, so that counts and batches
+    of elements do not load content from ZODB, other than the objects
+    in the batch requested.  The report page renders elements in pages
+    of report_page_size (see uu.chart.config; 0 for all), the rest are
+    loaded by the browser as needed (see ReportPageView).
+    """
 
     PLOT_TYPES = [
         'uu.chart.timeseries',
@@ -31,27 +38,89 @@ class ReportView(ChartView):
         'Document',
         ]
 
+    PAGE_SIZE = 12
+
     def __init__(self, context, request):
         super(ReportView, self).__init__(context, request)
+        self._results = {}
+        self._elements = {}
+        self._pages = {}
+
+    def brains(self, types=None):
+        """
+        Lazy catalog results for contained elements of types (default
+        all element types) visible to user, in order of position;
+        expired or not yet effective elements are included (as in
+        contents of report), whether or not user may access inactive
+        content.
+        """
+        types = tuple(types or self.ELEMENT_TYPES)
+        if types not in self._results:
+            catalog = getToolByName(self.context, 'portal_catalog')
+            self._results[types] = catalog.searchResults(
+                {
+                    'path': {
+                        'query': '/'.join(self.context.getPhysicalPath()),
+                        'depth': 1,
+                        },
+                    'portal_type': list(types),
+                    'sort_on': 'getObjPositionInParent',
+                },
+                show_inactive=True,
+                )
+        return self._results[types]
 
     def size(self):
-        return len([o for o in self.chart_elements(types=self.PLOT_TYPES)])
+        """Number of plots in report"""
+        return len(self.brains(self.PLOT_TYPES))
 
     def chart_elements(self, types=None, b_start=0, b_size=None):
-        if not hasattr(self, '_content'):
-            sm = getSecurityManager()
-            self._content = filter(
-                lambda o: sm.checkPermission('View', o),
-                filter(
-                    lambda o: o.portal_type in self.ELEMENT_TYPES,
-                    self.context.contentValues(),
-                    )
-                )
-        content = self._content
-        if types:
-            content = filter(
-                lambda o: o.portal_type in types,
-                content,
+        """Elements (objects) of types in batch, loaded only for batch"""
+        key = (tuple(types or ()), b_start, b_size)
+        if key not in self._elements:
+            self._elements[key] = [
+                brain.getObject()
+                for brain in batch(self.brains(types), b_start, b_size)
+                ]
+        return self._elements[key]
+
+    def page_size(self):
+        """Number of elements per page, or None for all (no paging)"""
+        return setting('report_page_size', self.PAGE_SIZE, int) or None
+
+    def page(self, b_start=0):
+        """
+        Page of elements starting at b_start, as a dict of elements
+        (objects), number of plots in page and before it (the offset
+        of its plots in report JSON), start of the next page (or None
+        if last) and total number of elements.
+        """
+        if b_start not in self._pages:
+            brains = self.brains()
+            total = len(brains)
+            b_size = self.page_size() or total
+            end = b_start + b_size
+            elements = self.chart_elements(b_start=b_start, b_size=b_size)
+            _plots = lambda seq: len(
+                [b for b in seq if b.portal_type in self.PLOT_TYPES]
                 )
-        return batch(content, b_start, b_size)
+            self._pages[b_start] = {
+                'elements': elements,
+                'plots': _plots(brains[b_start:end]),
+                'offset': _plots(brains[:b_start]),
+                'next': end if end < total else None,
+                'total': total,
+                }
+        return self._pages[b_start]
+
+
+class ReportPageView(ReportView):
+    """
+    HTML fragment for a page of report elements, starting at b_start
+    in request, loaded by integration.js as the report page is
+    scrolled; contains a report-core element for plotqi to load plots
+    of the page, and a placeholder for the next page, if any.
+    """
 
+    def b_start(self):
+        return max(0, int(self.request.get('b_start', 0)))
@@ -838,8 +838,9 @@ uu.chart = (function (ns, $) {
 
     ns.loadreport = function (url) {
         var total = $('.chartdiv').length,
+            version = $('#report-core').attr('data-report-version'),
             rnd = (Math.floor(Math.random() * Math.pow(10,8))),
-            cacheBust = '&cache_bust=' + rnd,
+            cacheBust = version ? '&v=' + version : '&cache_bust=' + rnd,
             batch_spec = ns.geometric_batch(total);
         batch_spec.forEach(function (pair) {
             var pos = pair[0],
@@ -52,7 +52,88 @@
 
   window.plotqi.ADDITIONAL_PLUGINS.push(IntegrationPlugin);
 
+  // Paged reports: the report page renders the first page of elements,
+  // followed by a .report-more placeholder; when it is scrolled near
+  // the viewport, the next page (@@report_page fragment, with its own
+  // .report-core and placeholder) replaces it, and plotqi loads its
+  // plots.  plotqi loads the first .report-core in the document, so
+  // pages already loaded are hidden from it while it loads a new one.
+  var pageLoading = false,
+      NEAR = 1.5;  // load when placeholder within 1.5 viewport heights
+
+  var loadPage = function loadPage(placeholder) {
+    var xhr = new XMLHttpRequest(),
+        url = placeholder.getAttribute('data-report-next');
+    pageLoading = true;
+    xhr.open('GET', url);
+    xhr.onload = function () {
+      var holder = document.createElement('div'),
+          parent = placeholder.parentNode,
+          loaded = [].slice.call(document.querySelectorAll('.report-core'));
+      pageLoading = false;
+      if (xhr.status !== 200) return;  // placeholder links to print view
+      holder.innerHTML = xhr.responseText;
+      while (holder.firstChild) {
+        parent.insertBefore(holder.firstChild, placeholder);
+      }
+      parent.removeChild(placeholder);
+      loaded.forEach(function (el) { el.classList.remove('report-core'); });
+      window.plotqi.load();
+      loaded.forEach(function (el) { el.classList.add('report-core'); });
+      checkPage();  // next page may be in view already
+    };
+    xhr.onerror = function () {
+      pageLoading = false;
+    };
+    xhr.send();
+  };
+
+  var checkPage = function checkPage() {
+    var placeholder = document.querySelector('.report-more');
+    if (pageLoading || !placeholder) return;
+    if (placeholder.getBoundingClientRect().top < window.innerHeight * NEAR) {
+      loadPage(placeholder);
+    }
+  };
+
+  window.addEventListener('scroll', checkPage);
+  window.addEventListener('resize', checkPage);
+
+  // Background publishing of contents: while a workflow cascade job
+  // runs, the page shows its progress (in place of contents), polled
+  // from @@cascade_status, and is reloaded when the job is finished.
+  var POLL = 2000;  // ms
+
+  var pollCascade = function pollCascade() {
+    var progress = document.querySelector('.cascade-progress'),
+        xhr;
+    if (!progress) return;
+    xhr = new XMLHttpRequest();
+    xhr.open('GET', progress.getAttribute('data-cascade-status'));
+    xhr.onload = function () {
+      var info = (xhr.status === 200) ? JSON.parse(xhr.responseText) : {},
+          bar = progress.querySelector('progress');
+      if (info.status !== 'queued' && info.status !== 'running') {
+        window.location.reload();
+        return;
+      }
+      progress.querySelector('.cascade-done').textContent = info.done;
+      progress.querySelector('.cascade-total').textContent = info.total;
+      bar.setAttribute('value', info.done);
+      bar.setAttribute('max', info.total);
+      window.setTimeout(pollCascade, POLL);
+    };
+    xhr.onerror = function () {
+      window.setTimeout(pollCascade, POLL);
+    };
+    xhr.send();
+  };
+
   window.plotqi.ready(window.plotqi.load);
+  window.plotqi.ready(checkPage);
+  window.plotqi.ready(function () {
+    window.setTimeout(pollCascade, POLL);
+  });
 
 
 }());
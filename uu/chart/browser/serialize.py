@@ -108,15 +108,28 @@ Notes, enumerated choices:
 from datetime import date, datetime
 from fractions import Fraction
 import json
+from json.encoder import encode_basestring_ascii
+import math
 import re
 
 from plone.uuid.interfaces import IUUID
+from zope.interface import implements
+from zope.publisher.interfaces import IPublishTraverse, NotFound
 
-from uu.chart.interfaces import ITimeSeriesChart
+from uu.chart.interfaces import ITimeSeriesChart, resolve_uids
+from uu.chart.columns import Distribution, PointColumns, NOSIZE
 from uu.chart.data import non_numeric
-from uu.chart.handlers import wfinfo
+from uu.chart.handlers import MEMBERS, PUBLIC, audience
+from uu.chart.jsoncache import chart_json_key, content_version, etag
+from uu.chart.jsoncache import json_cache
+from uu.chart.materialize import materialized_info
+from uu.chart.measureseries import referenced_uids
+from uu.chart.parallel import series_data
+from uu.chart.styleref import Styled, bound_stylebook
+from uu.chart.styleref import chart_styles, series_styles
 
 from datelabel import DateLabelView
+from jsonstream import LazyArray, RawJSON, iterencode, write_json
 from report import ReportView
 
 
@@ -135,33 +148,194 @@ def stripms(stamp):
     return '%s%s' % (parts[0], found.groups()[1])
 
 
+def _indent(compact):
+    return None if compact else 2
+
+
 def isodate(dt):
     # convert to naive datetime:
     dt = datetime(*dt.timetuple()[:7])
     return stripms(dt.isoformat())
 
 
+# batch (columnar) point serialization:
+
+# point dict keys, in order set by _datarow(), and flag of optional keys:
+_POINT_KEYS = (
+    ('key', 0),
+    ('title', 0),
+    ('value', 0),
+    ('note', 1),
+    ('uri', 2),
+    ('sample_size', 4),
+    ('distribution', 4),
+    )
+
+_datejson = {}  # date ordinal -> JSON of (isodate key, title)
+
+_rowformats = {}  # (indent, flags of keys present) -> format of point
+
+_distformats = {}  # indent -> (format of distribution item, value first?)
+
+
+def _scalar(v):
+    """JSON for scalar value, as encoded by json module"""
+    if isinstance(v, basestring):
+        return encode_basestring_ascii(v)
+    if isinstance(v, float) and not (math.isinf(v) or math.isnan(v)):
+        return repr(v)
+    return json.dumps(v)
+
+
+def _date_json(ordinal):
+    """JSON of key and title of point for date ordinal, cached"""
+    result = _datejson.get(ordinal)
+    if result is None:
+        d = date.fromordinal(ordinal)
+        result = _datejson[ordinal] = (
+            _scalar(isodate(d)),
+            _scalar(unicode(d).title()),
+            )
+    return result
+
+
+def _separators(indent):
+    """(item separator, key separator, function of level to newline)"""
+    if indent is None:
+        return ',', ':', lambda level: ''
+    return ', ', ': ', lambda level: '\n' + ' ' * (indent * level)
+
+
+def _dict_order(keys):
+    """Keys, in the order json iterates a dict built in that order"""
+    return list(dict((key, None) for key in keys))
+
+
+def _rowformat(indent, flags):
+    """
+    Format string (of dict of field JSON) for (key, point dict) pair
+    with the optional keys in flags present, as encoded by json.dumps()
+    with indent.
+    """
+    key = (indent, flags)
+    if key not in _rowformats:
+        item_sep, key_sep, newline = _separators(indent)
+        present = [name for name, flag in _POINT_KEYS if flag & flags == flag]
+        fields = (item_sep + newline(2)).join(
+            '"%s"%s%%(%s)s' % (name, key_sep, name)
+            for name in _dict_order(present)
+            )
+        _rowformats[key] = ''.join((
+            '[', newline(1), '%(key)s', item_sep, newline(1),
+            '{', newline(2), fields, newline(1), '}',
+            newline(0), ']',
+            ))
+    return _rowformats[key]
+
+
+def _distformat(indent):
+    """
+    Format (of JSON of value, sample size, in the order of the second
+    item) for an item of distribution, as encoded by json.dumps().
+    """
+    if indent not in _distformats:
+        item_sep, key_sep, newline = _separators(indent)
+        order = _dict_order(('value', 'sample_size'))
+        fields = (item_sep + newline(4)).join(
+            '"%s"%s%%s' % (name, key_sep) for name in order
+            )
+        _distformats[indent] = (
+            '{' + newline(4) + fields + newline(3) + '}',
+            order[0] == 'value',
+            )
+    return _distformats[indent]
+
+
+def _distribution_json(distribution, indent):
+    """JSON of Distribution, at the level of point fields"""
+    if not distribution:
+        return '[]'
+    item_sep, key_sep, newline = _separators(indent)
+    template, value_first = _distformat(indent)
+    pairs = (
+        (
+            'null' if value is None else _scalar(value),
+            'null' if size is None else str(size),
+        )
+        for value, size in distribution
+        )
+    if not value_first:
+        pairs = ((size, value) for value, size in pairs)
+    items = (item_sep + newline(3)).join(template % pair for pair in pairs)
+    return '[' + newline(3) + items + newline(2) + ']'
+
+
 class ChartJSON(object):
-    """Adapter to create JSON for use by view"""
+    """
+    Adapter to create JSON for use by view, for audience variant (see
+    handlers.audience(); default that of context).
+    """
 
-    def __init__(self, context):
+    def __init__(self, context, variant=None):
         self.context = context
-        self.state = wfinfo(context)[0]
-        self.show_uris = self.show_notes = self.state != 'published'
+        self.variant = variant or audience(context)
+        self.show_uris = self.show_notes = self.variant != PUBLIC
 
-    def _series_list(self):
-        """Get all series represented as dict"""
-        r = []
+    def _series_data(self):
+        """List of (series, data) for all series"""
         if not hasattr(self, '_data'):
             self._data = [(s, s.data) for s in self.context.series()]
-        for seq, data in self._data:
+        return self._data
+
+    def _styled(self):
+        """
+        Tuple of context, and dict of series id to series styles, for
+        effective display values: for charts inheriting styles from a
+        stylebook by reference (see uu.chart.styleref), context is a
+        Styled view, else the chart itself (and the dict is empty).
+        """
+        if not hasattr(self, '_style_info'):
+            context = self.context
+            stylebook = bound_stylebook(context)
+            self._style_info = (context, {})
+            if stylebook is not None:
+                self._style_info = (
+                    Styled(context, chart_styles(context, stylebook)),
+                    series_styles(context, stylebook),
+                    )
+        return self._style_info
+
+    def _series_list(self):
+        """Get all series represented as dict"""
+        return list(self._iterseries())
+
+    def _iterseries(self, lazy=False, compact=False):
+        """
+        Generate dict for each series; if lazy, point data for each is
+        a LazyArray, producing point dicts (or for PointColumns, their
+        JSON, formatted for compact or indented output) only as they
+        are encoded.
+        """
+        styles = self._styled()[1]
+        for seq, data in self._series_data():
+            if not data:
+                continue  # omit series with no data from JSON output
+            display = seq  # effective display values of series
+            if styles and seq.getId() in styles:
+                display = Styled(seq, styles[seq.getId()])
             series = {}
             # series data is mapping of keys to point objects
-            series['data'] = list(
-                [(p['key'], p) for p in map(self._datapoint, data)]
-                )
-            if not series['data']:
-                continue  # omit series with no data from JSON output
+            if lazy and isinstance(data, PointColumns):
+                series['data'] = LazyArray(
+                    self._iterrows_json(data, _indent(compact)),
+                    encoded=True,
+                    )
+            else:
+                points = ((p['key'], p) for p in self._iterpoints(data))
+                if lazy:
+                    series['data'] = LazyArray(points, leaves=True)
+                else:
+                    series['data'] = list(points)
             for name in (
                 'title',
                 'description',
@@ -177,7 +351,7 @@ class ChartJSON(object):
                 'break_lines',
                 'point_labels',
                     ):
-                v = getattr(seq, name, None)
+                v = getattr(display, name, None)
                 if v is not None and v != '':
                     if not (name.endswith('color') and
                             str(v).upper() == 'AUTO'):
@@ -187,21 +361,111 @@ class ChartJSON(object):
                     if name == 'marker_style' and v.startswith('filled'):
                         series[name] = v.replace('filled', '').lower()
             # display format via display precision (digits after decimal pt)
-            precision = getattr(seq, 'display_precision', 1)
+            precision = getattr(display, 'display_precision', 1)
             series['display_format'] = '%%.%if' % precision
-            r.append(series)
-        return r
-
-    def _distribution(self, point):
+            materialized = materialized_info(seq)
+            if materialized is not None:
+                series['materialized'] = materialized  # staleness info
+            yield series
+
+    def _distribution(self, distribution):
+        """JSON shape (list of dict) of distribution of aggregated point"""
+        if isinstance(distribution, Distribution):
+            return [
+                {'value': value, 'sample_size': size}
+                for value, size in distribution
+                ]
         _value = lambda v: None if non_numeric(v) else v
         return [
             {
                 'value': _value(v.get('value')),
                 'sample_size': v.get('sample_size')
             }
-            for v in point.distribution or []
+            for v in distribution or []
             ]
 
+    def _points(self, data):
+        """Get list of point dicts for series data"""
+        return list(self._iterpoints(data))
+
+    def _iterpoints(self, data):
+        """
+        Generate point dicts for series data; reads columns directly
+        for PointColumns, without constructing point objects.
+        """
+        if isinstance(data, PointColumns):
+            return (self._datarow(data, i) for i in xrange(len(data)))
+        return (self._datapoint(p) for p in data)
+
+    def _datarow(self, columns, idx):
+        """Equivalent of _datapoint() for row idx of PointColumns"""
+        r = {}
+        key = columns.identity(idx)
+        r['key'] = isodate(key) if columns.dated else key
+        r['title'] = unicode(key).title()
+        value = columns.value(idx)
+        r['value'] = None if non_numeric(value) else value
+        note = columns.notes.get(idx)
+        if note is not None and self.show_notes:
+            r['note'] = note
+        uri = columns.uris.get(idx)
+        if uri is not None and self.show_uris:
+            r['uri'] = uri
+        sample_size = columns.sample_size(idx)
+        if sample_size is not None:
+            r['sample_size'] = sample_size
+            r['distribution'] = self._distribution(
+                columns.distributions.get(idx)
+                )
+        return r
+
+    def _iterrows_json(self, columns, indent=None):
+        """
+        Generate JSON (as encoded by json.dumps() with indent) of each
+        (key, point dict) pair for PointColumns, in one pass over the
+        columns, without constructing the point dicts of _datarow().
+        """
+        dated = columns.dated
+        values = columns.values
+        sizes = columns.sample_sizes
+        nulls = columns.nulls
+        ints = columns.ints
+        notes = columns.notes if self.show_notes else {}
+        uris = columns.uris if self.show_uris else {}
+        distributions = columns.distributions
+        isnan, isinf = math.isnan, math.isinf
+        for idx, key in enumerate(columns.keys):
+            if dated:
+                key, title = _date_json(key)
+            else:
+                key, title = _scalar(key), _scalar(unicode(key).title())
+            value = values[idx]
+            if idx in nulls or isnan(value):
+                value = 'null'
+            elif idx in ints:
+                value = str(int(value))
+            else:
+                value = json.dumps(value) if isinf(value) else repr(value)
+            flags = 0
+            fields = {'key': key, 'title': title, 'value': value}
+            note = notes.get(idx)
+            if note is not None:
+                flags |= 1
+                fields['note'] = _scalar(note)
+            uri = uris.get(idx)
+            if uri is not None:
+                flags |= 2
+                fields['uri'] = _scalar(uri)
+            size = sizes[idx]
+            if size != NOSIZE:
+                flags |= 4
+                fields['sample_size'] = str(size)
+                fields['distribution'] = _distribution_json(
+                    distributions.get(idx),  # Distribution or None
+                    indent,
+                    )
+            yield _rowformat(indent, flags) % fields
+
     def _datapoint(self, point):
         r = {}
         r['key'] = key = point.identity()
@@ -217,10 +481,15 @@ class ChartJSON(object):
         if point.sample_size is not None:
             r['sample_size'] = point.sample_size
         if point.sample_size is not None:
-            r['distribution'] = self._distribution(point)
+            r['distribution'] = self._distribution(point.distribution)
         return r
 
-    def _chart(self):
+    def _chart(self, lazy=False, compact=False):
+        """
+        Chart as dict; if lazy, series (and their points) are LazyArray
+        values, generated as they are encoded by iterencode() (compact,
+        or not, as given).
+        """
         chart_attrs = [
             'title',
             'description',
@@ -252,20 +521,22 @@ class ChartJSON(object):
             'url': context.absolute_url(),
             'name': context.getId(),
             }
-        r['series'] = self._series_list()
+        if lazy:
+            r['series'] = LazyArray(self._iterseries(True, compact))
+        else:
+            r['series'] = self._series_list()
         if ITimeSeriesChart.providedBy(context):
             chart_attrs = chart_attrs + timeseries_chart_attrs
             label_view = DateLabelView(context)
-            included = label_view.included_dates(data=self._data)
+            included = label_view.included_dates(data=self._series_data())
             r['x_axis_type'] = 'date'
             r['auto_crop'] = True  # default, explcit value may disable
-            r['labels'] = dict(
-                (d.isoformat(), label_view.label_for(d)) for d in included
-                )
-        if context.chart_styles:
-            r['css'] = context.chart_styles
+            r['labels'] = label_view.labels(included)
+        styled = self._styled()[0]
+        if styled.chart_styles:
+            r['css'] = styled.chart_styles
         for name in chart_attrs:
-            v = getattr(self.context, name, None)
+            v = getattr(styled, name, None)
             if v is not None and v != '':
                 if (name.endswith('color') and str(v).upper() == 'AUTO'):
                     continue
@@ -273,11 +544,11 @@ class ChartJSON(object):
                     r[name] = isodate(v)
                 else:
                     r[name] = v
-        if not self.context.show_goal and r.get('goal', None):
+        if not styled.show_goal and r.get('goal', None):
             del(r['goal'])  # omit if show_goal is false
-        if not self.context.show_goal and r.get('goal_color', None):
+        if not styled.show_goal and r.get('goal_color', None):
             del(r['goal_color'])  # superfluous if show_goal is false
-        self._set_aspect_ratio(context, r)
+        self._set_aspect_ratio(styled, r)
         return r
 
     def _set_aspect_ratio(self, context, r):
@@ -294,8 +565,79 @@ class ChartJSON(object):
             f = Fraction(1.0 / (height / 100.0)).limit_denominator(20)
             r['aspect_ratio'] = [f.numerator, f.denominator]
 
-    def render(self):
-        return json.dumps(self._chart(), indent=2)
+    def cachekey(self, compact=False):
+        """Key for rendered JSON in JSON cache, or None if not cacheable"""
+        if not hasattr(self, '_cachekeys'):
+            self._cachekeys = {}
+        if compact not in self._cachekeys:
+            self._cachekeys[compact] = chart_json_key(
+                self.context,
+                self.variant,
+                compact,
+                )
+        return self._cachekeys[compact]
+
+    def cached(self, compact=False):
+        """Is rendered JSON for chart in JSON cache?"""
+        key = self.cachekey(compact)
+        return key is not None and key in json_cache()
+
+    def use_data(self, data):
+        """
+        Use precomputed list of (series id, data) pairs for series data,
+        if it matches the current series of chart.
+        """
+        data = dict(data)
+        series = self.context.series()
+        if set(data) == set(s.getId() for s in series):
+            self._data = [(s, data[s.getId()]) for s in series]
+
+    def encoded(self, compact=False):
+        """
+        Chart for iterencode(): RawJSON of rendered chart, from (or saved
+        to) JSON cache, or lazy chart dict if JSON cannot be cached.
+        """
+        key = self.cachekey(compact)
+        if key is None:
+            return self._chart(lazy=True, compact=compact)
+        cache = json_cache()
+        text = cache.get(key)
+        if text is None:
+            text = self._render(compact)
+            cache.set(key, text, len(text))
+            self._precompute(compact)
+        return RawJSON(text)
+
+    def _render(self, compact=False):
+        chunks = iterencode(
+            self._chart(lazy=True, compact=compact),
+            _indent(compact),
+            )
+        return ''.join(chunks)
+
+    def _precompute(self, compact=False):
+        """
+        Cache JSON for the other audience variant, if not cached yet,
+        from the series data already computed for this one.
+        """
+        other = ChartJSON(
+            self.context,
+            MEMBERS if self.variant == PUBLIC else PUBLIC,
+            )
+        key = other.cachekey(compact)
+        cache = json_cache()
+        if key is None or key in cache:
+            return
+        other._data = self._series_data()
+        text = other._render(compact)
+        cache.set(key, text, len(text))
+
+    def iterencode(self, compact=False):
+        """Generate JSON text fragments for chart"""
+        return iterencode(self.encoded(compact), _indent(compact))
+
+    def render(self, compact=False):
+        return ''.join(self.iterencode(compact))
 
 
 class ReportJSON(object):
@@ -311,6 +653,7 @@ class ReportJSON(object):
 
     def __init__(self, context):
         self.context = context
+        self._batches = {}
 
     def _contained_charts(self, b_start=0, b_size=None):
         visible = ReportView(self.context, None).chart_elements(
@@ -320,37 +663,122 @@ class ReportJSON(object):
             )
         return visible
 
-    def getdata(self, chart):
-        return (IUUID(chart), ChartJSON(chart)._chart())
+    def _adapters(self, b_start=0, b_size=None):
+        """ChartJSON adapters for batch of contained charts"""
+        batch = (b_start, b_size)
+        if batch not in self._batches:
+            charts = self._contained_charts(b_start, b_size)
+            resolve_uids(referenced_uids(charts))  # one query for batch
+            self._batches[batch] = map(ChartJSON, charts)
+        return self._batches[batch]
+
+    def getdata(self, chart, lazy=False):
+        return (IUUID(chart), ChartJSON(chart)._chart(lazy))
+
+    def _computed(self, adapters, compact=False):
+        """
+        Generate adapters in order, with series data computed by parallel
+        workers for the charts whose JSON is not cached (if enabled).
+        """
+        pending = [a for a in adapters if not a.cached(compact)]
+        results = series_data(  # in order
+            [a.context for a in pending],
+            content_version,
+            )
+        pending = set(map(id, pending))
+        for adapter in adapters:
+            if id(adapter) in pending:
+                data = next(results)
+                if data is not None:
+                    adapter.use_data(data)
+            yield adapter
+
+    def etag(self, b_start=0, b_size=None, compact=False):
+        """ETag for batch of charts, or None if any is not cacheable"""
+        adapters = self._adapters(b_start, b_size)
+        return etag([adapter.cachekey(compact) for adapter in adapters])
+
+    def iterencode(self, b_start=0, b_size=None, compact=False):
+        """
+        Generate JSON text fragments for report; each chart is computed
+        (or read from JSON cache) only as it is reached in output.
+        """
+        adapters = self._adapters(b_start, b_size)
+        data = LazyArray(
+            (IUUID(adapter.context), adapter.encoded(compact))
+            for adapter in self._computed(adapters, compact)
+            )
+        return iterencode(data, _indent(compact))
 
-    def render(self, b_start=0, b_size=None, **kwargs):
-        charts = self._contained_charts(b_start, b_size)
-        data = map(self.getdata, charts)
-        return json.dumps(data, indent=2)
+    def render(self, b_start=0, b_size=None, compact=False, **kwargs):
+        return ''.join(self.iterencode(b_start, b_size, compact))
 
 
 class ChartJSONView(object):
-    """Browser view for JSON representation of chart context"""
+    """
+    Browser view for JSON representation of chart context; JSON is
+    written to the response as it is encoded, compact (without any
+    indentation) if requested with compact=1.
+    """
 
     def __init__(self, context, request):
         self.context = context
         self.request = request
 
+    @property
+    def compact(self):
+        return bool(int(self.request.get('compact', 0)))
+
+    def not_modified(self, tag):
+        """
+        Set ETag (if not None) on response; return True (and set 304
+        status) if request If-None-Match header matches it.
+        """
+        if tag is None:
+            return False
+        response = self.request.response
+        response.setHeader('ETag', tag)
+        response.setHeader('Cache-Control', 'private, no-cache')
+        match = self.request.get_header('If-None-Match', None) or ''
+        if tag in [t.strip() for t in match.split(',')]:
+            response.setStatus(304)
+            return True
+        return False
+
     def __call__(self, *args, **kwargs):
-        self.request.response.setHeader('Content-type', 'application/json')
-        return ChartJSON(self.context).render()
+        adapter = ChartJSON(self.context)
+        if self.not_modified(etag([adapter.cachekey(self.compact)])):
+            return ''
+        chunks = adapter.iterencode(self.compact)
+        return write_json(self.request.response, chunks)
 
 
 class ReportJSONView(ChartJSONView):
+    """
+    Report JSON view; a numeric path segment after the view name is an
+    offset added to b_start, so that plotqi loads the plots of a page
+    of report elements (see ReportPageView) from their own base URL,
+    e.g. @@report_json/12?b_start=0&b_size=4.
+    """
+
+    implements(IPublishTraverse)
+
+    offset = 0
+
+    def publishTraverse(self, request, name):
+        if not name.isdigit():
+            raise NotFound(self, name, request)
+        self.offset = int(name)
+        return self
 
     def __call__(self, *args, **kwargs):
         adapter = ReportJSON(self.context)
-        b_start = int(self.request.get('b_start', 0))
+        b_start = self.offset + int(self.request.get('b_start', 0))
         b_size = int(self.request.get('b_size', 0)) or None
-        data = adapter.render(b_start, b_size)
-        self.request.response.setHeader('Content-type', 'application/json')
-        self.request.response.setHeader('Content-length', str(len(data)))
-        return data
+        if self.not_modified(adapter.etag(b_start, b_size, self.compact)):
+            return ''
+        chunks = adapter.iterencode(b_start, b_size, self.compact)
+        return write_json(self.request.response, chunks)
 
 
 class SingleChartReportJSONView(ChartJSONView):
@@ -361,7 +789,8 @@ class SingleChartReportJSONView(ChartJSONView):
 
     def __call__(self, *args, **kwrgs):
         adapter = ChartJSON(self.context)
-        data = json.dumps([[IUUID(self.context), adapter._chart()]], indent=2)
-        self.request.response.setHeader('Content-type', 'application/json')
-        self.request.response.setHeader('Content-length', str(len(data)))
-        return data
+        if self.not_modified(etag([adapter.cachekey(self.compact)])):
+            return ''
+        data = [[IUUID(self.context), adapter.encoded(self.compact)]]
+        chunks = iterencode(data, _indent(self.compact))
+        return write_json(self.request.response, chunks)
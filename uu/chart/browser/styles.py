@@ -1,13 +1,18 @@
 import json
+from weakref import WeakKeyDictionary
 
 from zope.schema import getFieldsInOrder
 
+from Acquisition import aq_base
+from persistent.dict import PersistentDict
 from persistent.mapping import PersistentMapping
 from plone.dexterity.utils import createContentInContainer
 from plone.uuid.interfaces import IUUID
 from Products.statusmessages.interfaces import IStatusMessage
 from zope.annotation import IAnnotations
+import transaction
 
+from uu.chart.depindex import index_binding
 from uu.chart.interfaces import STYLEBOOK_TYPE, CHART_TYPES, LINESTYLE_TYPE
 from uu.chart.interfaces import ILineDisplayCore
 from uu.chart.interfaces import IChartStyleBook
@@ -15,18 +20,59 @@ from uu.chart.interfaces import IChartStyleBook
 
 ANNO_KEY = 'uu.chart'
 
+_marker = object()
+
+_plans = {}  # (schema, excluded names) -> copy plan
+
+_pending = WeakKeyDictionary()  # transaction -> {path: object to reindex}
+
+
+def copy_plan(schema, exclude=()):
+    """
+    Tuple of (name, default) for fields of schema copied by
+    _clone_attrs(), computed once per schema and excluded names.
+    """
+    key = (schema, tuple(sorted(exclude)))
+    if key not in _plans:
+        _plans[key] = tuple(
+            (name, field.default)
+            for name, field in getFieldsInOrder(schema)
+            if name not in exclude
+            )
+    return _plans[key]
+
+
+def reindex_once(context):
+    """
+    Reindex context once, before the current transaction is committed,
+    however often this is called for it in the transaction.
+    """
+    txn = transaction.get()
+    if txn not in _pending:
+        _pending[txn] = {}
+        txn.addBeforeCommitHook(_reindex_pending, args=(txn,))
+    _pending[txn][context.getPhysicalPath()] = context
+
+
+def _reindex_pending(txn):
+    for context in _pending.pop(txn, {}).values():
+        context.reindexObject()
+
 
 def _clone_attrs(source, target, schema, exclude=()):
-    for name, field in getFieldsInOrder(schema):
-        if name in exclude:
-            continue
-        v = getattr(source, name, field.default)
-        setattr(target, name, v)
+    """Copy field values that differ, return True if any were copied"""
+    changed = False
+    for name, default in copy_plan(schema, exclude):
+        v = getattr(source, name, default)
+        if getattr(target, name, _marker) != v:
+            setattr(target, name, v)
+            changed = True
+    return changed
 
 
 def clone_line_styles(source, target):
-    _clone_attrs(source, target, ILineDisplayCore)
-    target.reindexObject()
+    if _clone_attrs(source, target, ILineDisplayCore):
+        reindex_once(target)
 
 
 def clone_chart_styles(source, target, exclude=()):
@@ -34,23 +80,30 @@ def clone_chart_styles(source, target, exclude=()):
     Clone chart styles from source to target, where either may be
     a stylebook or a chart.
     """
-    _clone_attrs(
+    changed = _clone_attrs(
         source,
         target,
         IChartStyleBook,
         exclude=['x_label', 'y_label'] + list(exclude),
         )
+    if changed:
+        reindex_once(target)
     source_lines = source.objectValues()
     target_lines = target.objectValues()
-    target.reindexObject()
-    for i in range(len(source_lines)):
-        if i >= len(target_lines):
-            break
-        source_line = source_lines[i]
-        target_line = target_lines[i]
+    for source_line, target_line in zip(source_lines, target_lines):
         clone_line_styles(source_line, target_line)
 
 
+def clear_overrides(chart):
+    """
+    Remove style overrides recorded on chart and its series (see
+    uu.chart.styleref), as the chart is (re)bound to a stylebook.
+    """
+    for context in [chart] + list(chart.objectValues()):
+        if getattr(aq_base(context), 'style_overrides', None):
+            context.style_overrides = PersistentDict()
+
+
 class ReportStylesView(object):
     """View for report style control"""
 
@@ -104,7 +157,8 @@ class ReportStylesView(object):
 
     def update_apply(self, *args, **kwargs):
         req = self.request
-        do_bind = bool(req.get('bind-stylebook', False))
+        do_inherit = bool(req.get('inherit-stylebook', False))
+        do_bind = do_inherit or bool(req.get('bind-stylebook', False))
         _get = lambda name: self.context.get(name, None)
         stylebook = _get(req.get('selected-stylebook'))
         if stylebook is None:
@@ -118,19 +172,25 @@ class ReportStylesView(object):
                 )
             return
         for target in targets:
-            clone_chart_styles(stylebook, target)  # copy styles now
+            if not do_inherit:
+                clone_chart_styles(stylebook, target)  # copy styles now
             if do_bind:
                 bookuid = IUUID(stylebook, None)
                 target.stylebook = bookuid
+                target.inherit_styles = do_inherit  # see uu.chart.styleref
+                clear_overrides(target)
+                index_binding(target)
         _listcharts = lambda s: ', '.join(['"%s"' % o.Title() for o in s])
         msg = 'Copied styles from' if not do_bind else 'Bound'
+        if do_inherit:
+            msg = 'Bound (inheriting styles from)'
         self.status.addStatusMessage(
             '%s stylebook "%s" to %s charts: %s' % (
                 msg, stylebook.Title(), len(targets), _listcharts(targets),
                 ),
             type='info',
             )
-        if do_bind:
+        if do_bind and not do_inherit:
             self.status.addStatusMessage(
                 'IMPORTANT: subsequent changes to style book and line '
                 'styles will propogate to the charts listed as bound '
@@ -192,7 +252,8 @@ class ReportStylesView(object):
         self.show_paste = self.can_paste_stylebooks()
         req = self.request
         if req.get('REQUEST_METHOD', 'GET') == 'POST':
-            if 'apply-stylebook' in req.form or 'bind-stylebook' in req.form:
+            actions = ('apply', 'bind', 'inherit')
+            if any('%s-stylebook' % name in req.form for name in actions):
                 self.update_apply(*args, **kwargs)
             if 'existing-mimic' in req.form:
                 self.update_mimic(*args, **kwargs)
@@ -0,0 +1,217 @@
+"""
+Process-wide caches used by uu.chart.
+
+LRUCache is a thread-safe least-recently-used mapping bounded by the
+(estimated) size of its values, in bytes.
+
+ColumnFileStore is an optional shared, on-disk tier for parsed series
+input (columns and diagnostics): one file per series, read via mmap,
+usable by all worker processes and ZEO clients that share the directory.
+"""
+
+from collections import OrderedDict
+import mmap
+import os
+import tempfile
+import threading
+
+from Acquisition import aq_base
+
+from uu.chart.ingest import ParsedInput
+from uu.chart.config import setting
+
+
+MB = 1024 * 1024
+
+
+class LRUCache(object):
+    """
+    Least-recently-used cache, bounded by maxsize (sum of sizes passed
+    to set(), usually in bytes).
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.size = 0
+        self.hits = self.misses = 0
+        self._items = OrderedDict()  # key -> (value, size)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, size = self._items.pop(key)
+            except KeyError:
+                self.misses += 1
+                return default
+            self._items[key] = (value, size)  # re-insert as most recent
+            self.hits += 1
+            return value
+
+    def set(self, key, value, size=1):
+        if size > self.maxsize:
+            return  # never cache what does not fit
+        with self._lock:
+            if key in self._items:
+                self.size -= self._items.pop(key)[1]
+            self._items[key] = (value, size)
+            self.size += size
+            while self.size > self.maxsize:
+                self.size -= self._items.popitem(last=False)[1][1]
+
+    def discard(self, key):
+        with self._lock:
+            if key in self._items:
+                self.size -= self._items.pop(key)[1]
+
+    def discard_if(self, predicate):
+        """Discard all items with key for which predicate(key) is true"""
+        with self._lock:
+            for key in [k for k in self._items if predicate(k)]:
+                self.size -= self._items.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.size = 0
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+
+class ColumnFileStore(object):
+    """
+    Directory of files containing serialized ParsedInput (parsed columns
+    and diagnostics), one file per series UID.  Each file is stamped
+    with the serial (version) of the series from which it was parsed; a
+    file for any other serial is a miss, and is replaced on the next
+    set().
+    """
+
+    SUFFIX = '.columns'
+
+    def __init__(self, path):
+        self.path = path
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def _filename(self, uid):
+        return os.path.join(self.path, '%s%s' % (uid, self.SUFFIX))
+
+    def get(self, uid, serial, pointcls):
+        try:
+            f = open(self._filename(uid), 'rb')
+        except IOError:
+            return None
+        try:
+            try:
+                m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (ValueError, EnvironmentError):
+                return None  # empty or unreadable file
+            try:
+                if m[:len(serial)] != serial:
+                    return None  # stale: parsed from another version
+                return ParsedInput.fromstring(pointcls, m[len(serial):])
+            except ValueError:
+                return None  # incompatible or corrupt file, re-parse
+            finally:
+                m.close()
+        finally:
+            f.close()
+
+    def set(self, uid, serial, parsed):
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            f = os.fdopen(fd, 'wb')
+            try:
+                f.write(serial)
+                f.write(parsed.tostring())
+            finally:
+                f.close()
+            os.rename(tmp, self._filename(uid))  # atomic replace
+        except EnvironmentError:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+
+
+class ParseCache(object):
+    """
+    Cache of ParsedInput for (unfiltered) series input keyed by (UID,
+    serial), with memory LRU tier and optional on-disk tier.  The most
+    recently cached serial for each UID is remembered, so that a newer
+    version of a series can be parsed incrementally from it.
+    """
+
+    MAX_SERIALS = 100000  # number of UIDs for which latest() is tracked
+
+    def __init__(self, maxsize, path=None):
+        self.memory = LRUCache(maxsize)
+        self.disk = ColumnFileStore(path) if path else None
+        self.serials = LRUCache(self.MAX_SERIALS)  # UID -> latest serial
+
+    def get(self, uid, serial, pointcls):
+        key = (uid, serial)
+        parsed = self.memory.get(key)
+        if parsed is None and self.disk is not None:
+            parsed = self.disk.get(uid, serial, pointcls)
+            if parsed is not None:
+                self.memory.set(key, parsed, parsed.nbytes())
+        return parsed
+
+    def latest(self, uid, pointcls):
+        """Most recently cached ParsedInput for UID, any serial, or None"""
+        serial = self.serials.get(uid)
+        if serial is None:
+            return None
+        return self.get(uid, serial, pointcls)
+
+    def set(self, uid, serial, parsed):
+        self.memory.set((uid, serial), parsed, parsed.nbytes())
+        self.serials.set(uid, serial)
+        if self.disk is not None:
+            self.disk.set(uid, serial, parsed)
+
+
+_parse_cache = None
+_memory_caches = {}
+_memory_caches_lock = threading.Lock()
+
+
+def parse_cache():
+    """Get process-wide ParseCache, configured on first use"""
+    global _parse_cache
+    if _parse_cache is None:
+        _parse_cache = ParseCache(
+            setting('parse_cache_size', 64, int) * MB,
+            setting('parse_cache_dir', None),
+            )
+    return _parse_cache
+
+
+def memory_cache(name, default_size):
+    """
+    Get process-wide LRUCache for name, bounded by the '<name>_cache_size'
+    setting (in MB), or default_size (MB) if not configured.
+    """
+    cache = _memory_caches.get(name)
+    if cache is None:
+        with _memory_caches_lock:
+            cache = _memory_caches.get(name)
+            if cache is None:
+                size = setting('%s_cache_size' % name, default_size, int)
+                cache = _memory_caches[name] = LRUCache(size * MB)
+    return cache
+
+
+def committed_serial(obj):
+    """ZODB serial of committed, unmodified object, or None"""
+    base = aq_base(obj)
+    if getattr(base, '_p_jar', None) is None:
+        return None
+    base._p_activate()  # ghost: load state, and serial with it
+    if base._p_changed:
+        return None  # modified in current transaction
+    return base._p_serial
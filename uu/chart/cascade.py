@@ -0,0 +1,238 @@
+"""
+Single-pass workflow cascade: publishing (or un-publishing) a report or
+chart publishes (un-publishes) its contents, and theirs in turn.
+
+Rather than each transition firing the cascade for its own children
+(each looking up workflow chain and state again, and updating the
+catalog for every transition, and for the whole subtree on every
+change of security), Cascade plans the transitions for the subtree up
+front, runs them with catalog updates of uu.chart content deferred
+(see DeferredIndexing), then updates the catalog once per object, and
+logs the counts and time taken.
+"""
+
+import logging
+import time
+from weakref import WeakKeyDictionary
+
+from Acquisition import aq_base
+from Products.CMFCore.utils import getToolByName
+import transaction
+
+
+logger = logging.getLogger('uu.chart')
+
+# depends on conventions of collective.teamwork or uu.qiext workflow(s):
+WORKFLOW = 'workspace_workflow'
+
+SECURITY_INDEX = 'allowedRolesAndUsers'
+
+COMMENTS = {
+    'publish': 'Publishing item',
+    'unpublish': 'Un-publishing item',
+    }
+
+_active = WeakKeyDictionary()  # transaction -> Cascade running in it
+
+
+def publish_transitions(state, ignore_states=()):
+    """Names of transitions publishing item in state, in order"""
+    if state == 'published' or state in ignore_states:
+        return []
+    if state == 'collaborative_editing':
+        return ['end_collaboration', 'publish']
+    if state not in ('pending', 'archived', 'visible'):
+        return ['share', 'publish']
+    return ['publish']
+
+
+def unpublish_transitions(state, ignore_states=()):
+    """Names of transitions un-publishing item in state"""
+    if state == 'published' and state not in ignore_states:
+        return ['return_for_editing']
+    return []
+
+
+# action -> (transitions function, states of contents ignored):
+ACTIONS = {
+    'publish': (publish_transitions, ('private',)),
+    'unpublish': (unpublish_transitions, ()),
+    }
+
+
+def active():
+    """Cascade running in current transaction, or None"""
+    return _active.get(transaction.get(), None)
+
+
+class Cascade(object):
+    """
+    Cascade of action ('publish' or 'unpublish') to the contents of
+    context; messages is a sequence of comments for transitions, by
+    depth (the last used for any deeper items).  Contents are only
+    transitioned (and their own contents visited) if their container
+    is, as if each transition cascaded to the container's contents.
+    """
+
+    def __init__(self, context, action, messages=()):
+        self.context = context
+        self.action = action
+        self.messages = list(messages)
+        self.wftool = getToolByName(context, 'portal_workflow')
+        # (item, transition names, comment, under transitioned item) for
+        # items transitioned or under one, parents first:
+        self.steps = None
+        self.deferred = {}  # path -> (item, set of indexes, None for all)
+        self.done = 0  # transitions done
+        self.reindexed = 0
+        self.elapsed = None
+        self._chains = {}  # portal_type -> chain (same policy in subtree)
+
+    @property
+    def plan(self):
+        """Steps of items transitioned"""
+        return [step for step in self.steps or () if step[1]]
+
+    @property
+    def transitions(self):
+        return sum(len(step[1]) for step in self.plan)
+
+    def _state(self, item):
+        """Review state of item, None if not in known workflow"""
+        portal_type = getattr(aq_base(item), 'portal_type', None)
+        if portal_type not in self._chains:
+            self._chains[portal_type] = self.wftool.getChainFor(item)
+        chain = self._chains[portal_type]
+        if not chain or WORKFLOW not in chain[0]:
+            return None
+        return self.wftool.getStatusOf(chain[0], item).get('review_state')
+
+    def _comment(self, depth):
+        message = self.messages[min(depth, len(self.messages)) - 1]
+        return COMMENTS[self.action] + (': %s' % message if message else '')
+
+    def _walk(self, container, depth=1, cascading=True, under=False):
+        """
+        Plan transitions for contents of container, if cascading (that
+        is, if container is transitioned); items under any transitioned
+        item are affected by it, and updated in catalog after.
+        """
+        transitions, ignore_states = ACTIONS[self.action]
+        for item in container.contentValues():
+            state = self._state(item) if cascading else None
+            names = transitions(state, ignore_states) if state else []
+            if names or under:
+                comment = self._comment(depth) if names else None
+                self.steps.append((item, names, comment, under))
+                if getattr(aq_base(item), 'isPrincipiaFolderish', False):
+                    self._walk(item, depth + 1, bool(names), under=True)
+
+    def prepare(self):
+        """Plan steps, if not done yet; returns steps"""
+        if self.steps is None:
+            self.steps = []
+            self._walk(self.context)
+        return self.steps
+
+    def defer(self, item, idxs=None):
+        """Record catalog update of item, for idxs (None for all)"""
+        if idxs == []:
+            return
+        path = item.getPhysicalPath()
+        current = self.deferred.get(path, (item, set()))[1]
+        if idxs is None or current is None:
+            self.deferred[path] = (item, None)
+        else:
+            self.deferred[path] = (item, current | set(idxs))
+
+    def flush(self, steps):
+        """
+        Update catalog once for each item of steps, and any other with
+        updates deferred; items under a transitioned item are updated
+        for its change of security.
+        """
+        pending = [
+            (item.getPhysicalPath(), item, under)
+            for item, names, comment, under in steps
+            ]
+        known = set(path for path, item, under in pending)
+        pending += [
+            (path, item, False)
+            for path, (item, idxs) in self.deferred.items()
+            if path not in known
+            ]
+        for path, item, under in pending:
+            idxs = self.deferred.pop(path, (item, set()))[1]
+            if idxs is not None and under:
+                idxs.add(SECURITY_INDEX)
+            if idxs is None:
+                item.reindexObject()
+            elif idxs:
+                item.reindexObject(idxs=sorted(idxs))
+            else:
+                continue
+            self.reindexed += 1
+
+    def execute(self, steps):
+        """
+        Run transitions of steps (all, or a chunk of them) with catalog
+        updates deferred, then flush; returns False (doing nothing) if
+        a cascade is running already, which covers any contents.
+        """
+        txn = transaction.get()
+        if txn in _active:
+            return False
+        _active[txn] = self
+        try:
+            for item, names, comment, under in steps:
+                for name in names:
+                    self.wftool.doActionFor(item, name, comment=comment)
+                    self.done += 1
+        finally:
+            del _active[txn]
+        self.flush(steps)
+        return True
+
+    def run(self):
+        """
+        Plan and run transitions; returns self, or None if a cascade is
+        running already.
+        """
+        started = time.time()
+        if active() is not None or not self.execute(self.prepare()):
+            return None
+        self.elapsed = time.time() - started
+        logger.info(self.summary())
+        return self
+
+    def summary(self):
+        return '%s of %s: %s transitions of %s items, %s reindexed, ' \
+               'in %.2f seconds' % (
+                   self.action.capitalize(),
+                   '/'.join(self.context.getPhysicalPath()),
+                   self.done,
+                   len(self.plan),
+                   self.reindexed,
+                   self.elapsed or 0,
+                   )
+
+
+class DeferredIndexing(object):
+    """
+    Mixin for content classes, deferring catalog updates while a
+    cascade is running, to be done once per item by Cascade.flush().
+    """
+
+    def reindexObject(self, idxs=[]):
+        cascade = active()
+        if cascade is None:
+            return super(DeferredIndexing, self).reindexObject(idxs)
+        cascade.defer(self, list(idxs) or None)
+
+    def reindexObjectSecurity(self, skip_self=False):
+        cascade = active()
+        if cascade is None:
+            return super(DeferredIndexing, self).reindexObjectSecurity(
+                skip_self,
+                )
+        cascade.defer(self, [] if skip_self else [SECURITY_INDEX])
@@ -0,0 +1,303 @@
+"""
+Background workflow cascade jobs, for reports (or charts) with many
+contents: a cascade (see uu.chart.cascade) of more transitions than
+the cascade_background_size setting (see uu.chart.config; 0, the
+default, never runs cascades in background) is planned in the request
+transitioning the report, and stored as a job in an annotation of it.
+
+After the request commits, a worker thread runs the job as the same
+user, in chunks of CHUNK items, each chunk in its own transaction,
+retried on conflict.  The job records its progress for the status view
+(@@cascade_status); while it runs, report and chart views show its
+progress in place of their contents, so that visitors do not see
+contents partly transitioned.
+
+A transition of a report (or chart) while its job runs does not start
+another job (which would replace the running one, halfway): its
+cascade is queued on the running job instead, and is planned and run
+as a new job, as the user who queued it, once the running job is done.
+
+The worker running a job records itself as owner of the job, and a
+heartbeat (time of its last progress) with each chunk.  A job without
+progress for cascade_stale_after seconds (default STALE_AFTER), e.g.
+as its process was restarted, is treated as failed: its contents are
+shown again, and transitions start new jobs.  Managers may resume a
+failed job from the steps done (see resume(), @@cascade_resume); a
+worker stops once its job is taken over (resumed or replaced).
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+
+from AccessControl.SecurityManagement import getSecurityManager
+from Acquisition import aq_base
+from persistent import Persistent
+from zope.annotation.interfaces import IAnnotations
+from zope.component.hooks import getSite
+from ZODB.POSException import ConflictError
+import transaction
+
+from uu.chart.cascade import Cascade
+from uu.chart.config import setting
+from uu.chart.jobqueue import RETRIES
+from uu.chart.parallel import opened
+
+
+logger = logging.getLogger('uu.chart')
+
+ANNOTATION_KEY = 'uu.chart.cascade'
+
+CHUNK = 50  # items transitioned (or reindexed) per transaction
+
+RUNNING = ('queued', 'running')
+
+STALE_AFTER = 300  # seconds without progress, default
+
+
+def stale_after():
+    """Configured seconds without progress after which a job is dead"""
+    return setting('cascade_stale_after', STALE_AFTER, int)
+
+
+def worker_name():
+    """Name of current worker thread, as owner of jobs"""
+    return '%s:%s:%s' % (
+        socket.gethostname(),
+        os.getpid(),
+        threading.current_thread().ident,
+        )
+
+
+class CascadeJob(Persistent):
+    """Planned cascade of action to contents of a report or chart"""
+
+    def __init__(self, action, steps, userid=None):
+        self.action = action
+        # (path, transition names, comment, under transitioned item):
+        self.steps = tuple(steps)
+        self.userid = userid
+        self.position = 0  # steps done
+        self.transitions = 0  # transitions done
+        self.status = 'queued'
+        self.started = time.time()
+        self.finished = None
+        self.queued = None  # (action, messages, userid) to run after
+        self.owner = None  # worker_name() of worker running job
+        self.heartbeat = self.started  # time of last progress
+
+    def queue(self, action, messages, userid=None):
+        """
+        Queue cascade of action (with messages by depth) to be run once
+        this job is done, replacing any queued before.
+        """
+        self.queued = (action, tuple(messages), userid)
+
+    def stale(self):
+        """True if (queued or running) job has made no recent progress"""
+        heartbeat = getattr(self, 'heartbeat', self.started)
+        return self.status in RUNNING and \
+            time.time() - heartbeat > stale_after()
+
+    def running(self):
+        return self.status in RUNNING and not self.stale()
+
+    def info(self):
+        """Dict of status and progress, for status view"""
+        return {
+            'action': self.action,
+            'status': 'failed' if self.stale() else self.status,
+            'owner': getattr(self, 'owner', None),
+            'done': self.position,
+            'total': len(self.steps),
+            'transitions': self.transitions,
+            'queued': (getattr(self, 'queued', None) or (None,))[0],
+            }
+
+    def run_chunk(self, context, size=CHUNK):
+        """
+        Run next chunk of steps, for context (report or chart); caller
+        commits.  Items removed since the job was planned are skipped.
+        """
+        steps = []
+        for path, names, comment, under in self.steps[
+                self.position:self.position + size]:
+            item = context.unrestrictedTraverse(path, None)
+            if item is not None:
+                steps.append((item, names, comment, under))
+        cascade = Cascade(context, self.action)
+        cascade.execute(steps)
+        self.position = min(self.position + size, len(self.steps))
+        self.transitions += cascade.done
+        self.status = 'running'
+        self.heartbeat = time.time()
+        if self.position >= len(self.steps):
+            self.status = 'done'
+            self.finished = time.time()
+            logger.info('%s of %s: %s transitions in background, in '
+                        '%.2f seconds' % (
+                            self.action.capitalize(),
+                            '/'.join(context.getPhysicalPath()),
+                            self.transitions,
+                            self.finished - self.started,
+                            ))
+
+
+def get_job(context):
+    """CascadeJob of context, or None"""
+    return IAnnotations(context).get(ANNOTATION_KEY, None)
+
+
+def running_job(context):
+    """CascadeJob of context if (queued or) running, else None"""
+    job = get_job(context)
+    return job if job is not None and job.running() else None
+
+
+def background_size():
+    """Configured number of transitions above which cascades are jobs"""
+    return setting('cascade_background_size', 0, int)
+
+
+def in_background(cascade):
+    """True if (prepared) cascade should run as a background job"""
+    size = background_size()
+    jar = getattr(aq_base(cascade.context), '_p_jar', None)
+    return bool(size) and jar is not None and cascade.transitions > size
+
+
+def current_userid():
+    user = getSecurityManager().getUser()
+    return user.getId() if user is not None else None
+
+
+def start(cascade, userid=None):
+    """
+    Store job for prepared cascade, to be run by a worker thread (as
+    userid, default the current user) once the current transaction is
+    committed; returns the job.
+    """
+    context = cascade.context
+    job = CascadeJob(
+        cascade.action,
+        [
+            (item.getPhysicalPath(), tuple(names), comment, under)
+            for item, names, comment, under in cascade.prepare()
+        ],
+        userid=userid or current_userid(),
+        )
+    IAnnotations(context)[ANNOTATION_KEY] = job
+    _dispatch(context, job)
+    return job
+
+
+def resume(context):
+    """
+    Resume failed (or stale) job of context from the steps done, in a
+    worker started once the current transaction is committed; returns
+    the job, or None if there is none to resume.
+    """
+    job = get_job(context)
+    if job is None or job.running() or job.status == 'done':
+        return None
+    job.status = 'queued'
+    job.owner = None  # any worker still running it stops
+    job.heartbeat = time.time()
+    job.finished = None
+    _dispatch(context, job)
+    return job
+
+
+def _dispatch(context, job):
+    """Start worker for job of context once transaction is committed"""
+    transaction.get().addAfterCommitHook(
+        _after_commit,
+        args=(
+            aq_base(context)._p_jar.db(),
+            getSite().getPhysicalPath(),
+            context.getPhysicalPath(),
+            job.userid,
+            ),
+        )
+
+
+def _after_commit(success, db, site_path, path, userid):
+    if success:
+        worker = threading.Thread(
+            target=run,
+            args=(db, site_path, path, userid),
+            name='uu.chart cascade',
+            )
+        worker.daemon = True
+        worker.start()
+
+
+def run(db, site_path, path, userid=None):
+    """
+    Run job of report or chart at path to completion, one chunk per
+    transaction; on failure (or repeated conflicts), the job is marked
+    failed, with chunks done so far committed.  The worker claims the
+    job (as owner) with its first chunk, and stops if it is taken over.
+    """
+    owner = worker_name()
+    with opened(db, site_path, userid) as app:
+        conflicts = 0
+        claimed = False
+        while True:
+            context = app.unrestrictedTraverse(path, None)
+            job = get_job(context) if context is not None else None
+            expected = owner if claimed else None
+            if job is None or job.status not in RUNNING or \
+                    getattr(job, 'owner', None) != expected:
+                break  # done, failed, or taken over (resumed, replaced)
+            try:
+                job.owner = owner
+                job.run_chunk(context)
+                transaction.commit()
+                claimed = True
+                conflicts = 0
+            except ConflictError:
+                transaction.abort()
+                conflicts += 1
+                if conflicts < RETRIES:
+                    continue
+                logger.error('Repeated conflicts in cascade for %s' % (
+                    '/'.join(path),
+                    ))
+                _fail(app, path)
+                break
+            except Exception:
+                logger.exception('Failed cascade for %s' % '/'.join(path))
+                transaction.abort()
+                _fail(app, path)
+                break
+        try:
+            _start_queued(app, path)
+        except Exception:
+            logger.exception('Failed queued cascade for %s' % '/'.join(path))
+            transaction.abort()
+
+
+def _start_queued(app, path):
+    """Plan and start job for cascade queued on finished job at path"""
+    context = app.unrestrictedTraverse(path, None)
+    job = get_job(context) if context is not None else None
+    queued = getattr(job, 'queued', None)
+    if queued is None or job.status in RUNNING:
+        return  # none, or job not finished (e.g. taken over)
+    action, messages, userid = queued
+    job.queued = None
+    cascade = Cascade(context, action, messages)
+    cascade.prepare()
+    if cascade.plan:
+        start(cascade, userid)  # worker started once committed
+    transaction.commit()
+
+
+def _fail(app, path):
+    job = get_job(app.unrestrictedTraverse(path))
+    job.status = 'failed'
+    job.finished = time.time()
+    transaction.commit()
@@ -0,0 +1,506 @@
+"""
+Columnar, array-backed storage of data points for a series.
+
+Rather than one point object (with its own __dict__) per row, points are
+stored as parallel arrays:
+
+  * keys: date ordinals (array of int) for time-series, or a list of
+    names for named series;
+
+  * values: float64 array (None values are stored as NaN, and remembered
+    in a small set of null indices; indices of integer values are kept in
+    a set too, so that they are read, and serialized, as integers);
+
+  * sample_sizes: int array, using NOSIZE as sentinel for None;
+
+  * notes, uris, distributions: sparse side tables (dict) keyed by row
+    index, as most rows do not have these; distributions of aggregated
+    points are themselves stored as two arrays, and a set of indices of
+    integer values (see Distribution).
+
+Point objects (ITimeSeriesDataPoint / INamedDataPoint) are constructed
+lazily on iteration or item access; consumers that care about speed
+(serialization, date labels, summarization) read the columns directly.
+
+Time-series columns sorted by key (see sorted_by_key()) are cropped to
+a date range by bisection, rather than by scanning all rows.  Crops are
+slices copied in bulk (array slices, a C-level copy of the rows kept),
+not views over the source arrays: cropped columns are cached and shared
+as independent objects, and a view would need every accessor (and the
+serialized form) to be offset-aware.
+
+Columns may be shared between threads via process-wide caches, so
+consumers treat them as read-only once constructed.
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+from itertools import izip
+import marshal
+import math
+import struct
+
+from uu.chart.data import TimeSeriesDataPoint
+from uu.chart.data import non_numeric
+
+
+NOSIZE = -1  # sentinel in sample size column for no (None) sample size
+
+NAN = float('NaN')
+
+# serialized header: magic, format version, dated flag, int item size, rows
+_HEADER = struct.Struct('<4sBBBI')
+_MAGIC = 'UUPC'
+_VERSION = 3
+
+
+def _ordinal(key):
+    if isinstance(key, datetime):
+        key = key.date()
+    if not isinstance(key, date):
+        raise ValueError('date must be datetime.date object')
+    return key.toordinal()
+
+
+def merge_keys(sequences):
+    """
+    Sorted unique keys of sequences of keys (e.g. sorted key columns of
+    each series of a chart).  Keys are de-duplicated before sorting, as
+    series of a chart mostly share keys: in CPython this is much faster
+    than a k-way merge (heapq.merge) of the sorted sequences.
+    """
+    return sorted(set().union(*sequences))
+
+
+class Distribution(object):
+    """
+    Values and sample sizes of the source rows of an aggregated point,
+    stored as two compact arrays (NaN for None values, NOSIZE for None
+    sample sizes) rather than as a list of dicts, with indices of integer
+    values in a set (as for PointColumns).  Iteration yields (value,
+    sample size) pairs, None for either if missing; only the JSON
+    serializer converts these to the dict shape documented in
+    IAggregateDescription.
+    """
+
+    __slots__ = ('values', 'sample_sizes', 'ints')
+
+    def __init__(self, values=None, sample_sizes=None, ints=None):
+        self.values = array('d') if values is None else values
+        if sample_sizes is None:
+            sample_sizes = array('l')
+        self.sample_sizes = sample_sizes
+        self.ints = set() if ints is None else ints
+
+    @classmethod
+    def from_pairs(cls, pairs):
+        """Construct from (value, sample size) pairs"""
+        result = cls()
+        for value, size in pairs:
+            if type(value) in (int, long):
+                result.ints.add(len(result.values))
+            result.values.append(NAN if value is None else value)
+            result.sample_sizes.append(NOSIZE if size is None else int(size))
+        return result
+
+    @classmethod
+    def from_dicts(cls, items):
+        """Construct from list of dict with value, sample_size keys"""
+        return cls.from_pairs(
+            (item.get('value'), item.get('sample_size')) for item in items
+            )
+
+    def tostring(self):
+        """
+        Strings of raw array values, and integer indices (marshal-able)
+        """
+        return (
+            self.values.tostring(),
+            self.sample_sizes.tostring(),
+            sorted(self.ints),
+            )
+
+    @classmethod
+    def fromstring(cls, data):
+        result = cls()
+        result.values.fromstring(data[0])
+        result.sample_sizes.fromstring(data[1])
+        result.ints = set(data[2])
+        return result
+
+    def nbytes(self):
+        return 160 + len(self) * (
+            self.values.itemsize + self.sample_sizes.itemsize
+            )
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        ints = self.ints
+        for idx, (value, size) in enumerate(
+                izip(self.values, self.sample_sizes)):
+            if math.isnan(value):
+                value = None
+            elif idx in ints:
+                value = int(value)
+            yield (value, None if size == NOSIZE else size)
+
+    def __eq__(self, other):
+        if not isinstance(other, Distribution):
+            return NotImplemented
+        return list(self) == list(other)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'Distribution(%r)' % list(self)
+
+
+class PointColumns(object):
+    """
+    Sequence of points for a series, stored as parallel columns.
+    Behaves like a (read-only) list of point objects of pointcls.
+    """
+
+    def __init__(self, pointcls=TimeSeriesDataPoint):
+        self.pointcls = pointcls
+        self.dated = issubclass(pointcls, TimeSeriesDataPoint)
+        self.keys = array('l') if self.dated else []
+        self.values = array('d')
+        self.sample_sizes = array('l')
+        self.nulls = set()          # indices of None (not NaN) values
+        self.ints = set()           # indices of integer values
+        self.notes = {}
+        self.uris = {}
+        self.distributions = {}
+        self.ordered = False        # known to be sorted by key?
+
+    @classmethod
+    def from_points(cls, pointcls, points):
+        result = cls(pointcls)
+        for point in points:
+            result.append(
+                point.identity(),
+                point.value,
+                point.note,
+                point.uri,
+                point.sample_size,
+                point.distribution,
+                )
+        return result
+
+    # construction:
+
+    def _append(
+            self,
+            key,
+            value,
+            note=None,
+            uri=None,
+            sample_size=None,
+            distribution=None):
+        """Append row, given key already in column form (ordinal/name)"""
+        idx = len(self.values)
+        self.ordered = False
+        self.keys.append(key)
+        if value is None:
+            self.nulls.add(idx)
+            value = NAN
+        elif type(value) in (int, long):
+            self.ints.add(idx)
+        self.values.append(value)
+        if sample_size is None:
+            sample_size = NOSIZE
+        self.sample_sizes.append(sample_size)
+        if note is not None:
+            self.notes[idx] = note
+        if uri is not None:
+            self.uris[idx] = uri
+        if distribution is not None:
+            self.distributions[idx] = distribution
+
+    def append(
+            self,
+            key,
+            value,
+            note=None,
+            uri=None,
+            sample_size=None,
+            distribution=None):
+        """
+        Append a row, with arguments (and normalization) mirroring the
+        constructor of the point class.
+        """
+        if self.dated:
+            key = _ordinal(key)
+        if non_numeric(sample_size):
+            sample_size = None
+        if sample_size is not None:
+            sample_size = int(sample_size)
+        if distribution is not None and \
+                not isinstance(distribution, Distribution):
+            distribution = Distribution.from_dicts(distribution)
+        self._append(key, value, note, uri, sample_size, distribution)
+
+    def append_row(self, source, idx):
+        """Copy row at index idx from source columns"""
+        self._append(
+            source.keys[idx],
+            source.value(idx),
+            source.notes.get(idx),
+            source.uris.get(idx),
+            source.sample_size(idx),
+            source.distributions.get(idx),
+            )
+
+    def extend(self, other):
+        """Append all rows of other columns (of same point class)"""
+        offset = len(self)
+        self.ordered = self.ordered and other.ordered and (
+            not offset or not other or self.keys[-1] <= other.keys[0]
+            )
+        self.keys.extend(other.keys)
+        self.values.extend(other.values)
+        self.sample_sizes.extend(other.sample_sizes)
+        self.nulls.update(idx + offset for idx in other.nulls)
+        self.ints.update(idx + offset for idx in other.ints)
+        for name in ('notes', 'uris', 'distributions'):
+            getattr(self, name).update(
+                (idx + offset, v) for idx, v in getattr(other, name).items()
+                )
+
+    def take(self, indices):
+        """Return new columns for the rows at the given indices, in order"""
+        result = type(self)(self.pointcls)
+        for idx in indices:
+            result.append_row(self, idx)
+        return result
+
+    # serialization and size:
+
+    def tostring(self):
+        """
+        Serialize columns to a string; arrays are stored as raw machine
+        values, side tables and names via marshal (not pickle, as the
+        data may be read from a shared location).
+        """
+        parts = [
+            _HEADER.pack(
+                _MAGIC,
+                _VERSION,
+                int(self.dated),
+                self.sample_sizes.itemsize,
+                len(self),
+                ),
+            self.keys.tostring() if self.dated else '',
+            self.values.tostring(),
+            self.sample_sizes.tostring(),
+            marshal.dumps((
+                None if self.dated else self.keys,
+                sorted(self.nulls),
+                self.notes,
+                self.uris,
+                dict(
+                    (idx, d.tostring())
+                    for idx, d in self.distributions.items()
+                    ),
+                sorted(self.ints),
+                )),
+            ]
+        return ''.join(parts)
+
+    @classmethod
+    def fromstring(cls, pointcls, data):
+        """
+        Construct columns from string made by tostring(); raises
+        ValueError on incompatible data.
+        """
+        result = cls(pointcls)
+        if len(data) < _HEADER.size:
+            raise ValueError('Truncated point column data')
+        magic, version, dated, itemsize, length = _HEADER.unpack_from(data)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError('Unknown point column data format')
+        if bool(dated) != result.dated:
+            raise ValueError('Point column data key type mismatch')
+        if itemsize != result.sample_sizes.itemsize:
+            raise ValueError('Point column data from incompatible platform')
+        pos = _HEADER.size
+        columns = [result.values, result.sample_sizes]
+        if result.dated:
+            columns.insert(0, result.keys)
+        for column in columns:
+            end = pos + length * column.itemsize
+            column.fromstring(data[pos:end])
+            pos = end
+        try:
+            tables = marshal.loads(data[pos:])
+        except (EOFError, TypeError):
+            raise ValueError('Truncated point column data')
+        names, nulls, notes, uris, distributions, ints = tables
+        if names is not None:
+            result.keys = names
+        result.nulls = set(nulls)
+        result.ints = set(ints)
+        result.notes = notes
+        result.uris = uris
+        result.distributions = dict(
+            (idx, Distribution.fromstring(v))
+            for idx, v in distributions.items()
+            )
+        return result
+
+    def nbytes(self):
+        """Approximate memory size of columns, in bytes"""
+        size = 512 + len(self) * (
+            self.values.itemsize + self.sample_sizes.itemsize
+            )
+        if self.dated:
+            size += len(self.keys) * self.keys.itemsize
+        else:
+            size += sum(len(name) + 64 for name in self.keys)
+        for table in (self.notes, self.uris):
+            size += sum(len(v) + 96 for v in table.values())
+        size += sum(d.nbytes() for d in self.distributions.values())
+        return size
+
+    # column accessors:
+
+    def identity(self, idx):
+        key = self.keys[idx]
+        return date.fromordinal(key) if self.dated else key
+
+    def identities(self):
+        if self.dated:
+            return map(date.fromordinal, self.keys)
+        return list(self.keys)
+
+    def distribution(self, rows):
+        """Distribution of values and sample sizes of rows (indices)"""
+        ints = self.ints
+        return Distribution(
+            array('d', [self.values[idx] for idx in rows]),
+            array('l', [self.sample_sizes[idx] for idx in rows]),
+            set(pos for pos, idx in enumerate(rows) if idx in ints),
+            )
+
+    def value(self, idx):
+        if idx in self.nulls:
+            return None
+        if idx in self.ints:
+            return int(self.values[idx])
+        return self.values[idx]
+
+    def sample_size(self, idx):
+        size = self.sample_sizes[idx]
+        return None if size == NOSIZE else size
+
+    def point(self, idx):
+        """Construct point object for row"""
+        return self.pointcls(
+            self.identity(idx),
+            self.value(idx),
+            self.notes.get(idx),
+            self.uris.get(idx),
+            self.sample_size(idx),
+            self.distributions.get(idx),
+            )
+
+    def sorted_by_key(self):
+        """
+        Return columns sorted (stable) by key, or self if already sorted.
+        """
+        keys = list(self.keys)
+        if keys == sorted(keys):
+            self.ordered = True
+            return self
+        order = sorted(xrange(len(keys)), key=keys.__getitem__)
+        result = self.take(order)
+        result.ordered = True
+        return result
+
+    def bounds(self, start=None, end=None):
+        """
+        Index range [lo, hi) of rows with keys in [start, end] for
+        columns sorted by key (bisection, without scanning rows).
+        """
+        lo, hi = 0, len(self)
+        if start:
+            lo = bisect_left(self.keys, _ordinal(start))
+        if end:
+            hi = max(lo, bisect_right(self.keys, _ordinal(end)))
+        return lo, hi
+
+    def crop(self, start=None, end=None, excluded=False):
+        """
+        Return columns for date-keyed rows within [start, end], inclusive
+        of both (either may be None, for no bound); if excluded is True,
+        return the complement, the rows outside of the range.  Sorted
+        columns are cropped to slices (self, if the range is all rows).
+        """
+        if self.ordered:
+            lo, hi = self.bounds(start, end)
+            if not excluded:
+                return self if (lo, hi) == (0, len(self)) else self[lo:hi]
+            result = self[:lo]
+            result.extend(self[hi:])
+            return result
+        lo = _ordinal(start) if start else None
+        hi = _ordinal(end) if end else None
+        _in = lambda k: (lo is None or k >= lo) and (hi is None or k <= hi)
+        return self.take(
+            [i for i, k in enumerate(self.keys) if _in(k) != excluded]
+            )
+
+    def _slice(self, start, stop):
+        """
+        New columns for contiguous rows [start, stop), copied in bulk:
+        arrays are sliced (copied without per-row Python work), side
+        tables are filtered to rows in range.  Not a zero-copy view (see
+        module docstring).
+        """
+        result = type(self)(self.pointcls)
+        result.keys = self.keys[start:stop]
+        result.values = self.values[start:stop]
+        result.sample_sizes = self.sample_sizes[start:stop]
+        _within = lambda idx: start <= idx < stop
+        result.nulls = set(idx - start for idx in self.nulls if _within(idx))
+        result.ints = set(idx - start for idx in self.ints if _within(idx))
+        for name in ('notes', 'uris', 'distributions'):
+            setattr(result, name, dict(
+                (idx - start, v)
+                for idx, v in getattr(self, name).items()
+                if _within(idx)
+                ))
+        result.ordered = self.ordered
+        return result
+
+    # sequence protocol, lazy construction of points:
+
+    def __len__(self):
+        return len(self.values)
+
+    def __nonzero__(self):
+        return bool(len(self.values))
+
+    def __iter__(self):
+        for idx in xrange(len(self.values)):
+            yield self.point(idx)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            start, stop, step = idx.indices(len(self))
+            if step == 1:
+                return self._slice(start, max(start, stop))
+            return self.take(xrange(start, stop, step))
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError('point index out of range')
+        return self.point(idx)
@@ -0,0 +1,48 @@
+"""
+Deployment settings for uu.chart, read from a product-config section in
+zope.conf (e.g. via the zope-conf-additional option of a buildout
+instance recipe):
+
+    <product-config uu.chart>
+        parse_cache_size 64
+        parse_cache_dir /var/cache/uu.chart
+        crop_cache_size 16
+        json_cache_size 32
+        points_cache_size 16
+        styles_cache_size 1
+        report_parallelism 4
+        report_page_size 12
+        cascade_background_size 500
+        cascade_stale_after 300
+        summarization_engine vectorized
+    </product-config>
+
+A report_page_size of 0 renders all elements of a report at once,
+rather than in pages loaded as the report is scrolled.
+
+A workflow cascade (publishing or un-publishing the contents of a
+report or chart with it) of more than cascade_background_size
+transitions runs as a background job; 0 (default) never does.  A job
+without progress for cascade_stale_after seconds (default 300) is
+treated as failed, and may be resumed by managers.
+
+Settings that are not configured use the default passed by caller.
+"""
+
+from App.config import getConfiguration
+
+
+PRODUCT_NAME = 'uu.chart'
+
+
+def setting(name, default=None, cast=None):
+    """
+    Get named setting from product-config, or default if not set; if
+    cast is provided, it is used to convert the configured (string)
+    value.
+    """
+    config = getattr(getConfiguration(), 'product_config', None) or {}
+    value = config.get(PRODUCT_NAME, {}).get(name, None)
+    if value is None or value == '':
+        return default
+    return cast(value) if cast is not None else value
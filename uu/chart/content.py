@@ -1,16 +1,11 @@
-import csv
 from datetime import date
-from hashlib import md5
-from StringIO import StringIO
 
 from Acquisition import aq_base, aq_inner, aq_parent
 from ComputedAttribute import ComputedAttribute
 from persistent.dict import PersistentDict
 from plone.dexterity.content import Item, Container
 from zope.interface import implements
-from plone.uuid.interfaces import IAttributeUUID
-
-from uu.formlibrary.utils import normalize_usa_date
+from plone.uuid.interfaces import IAttributeUUID, IUUID
 
 from uu.chart.interfaces import IDataReport
 from uu.chart.interfaces import ITimeSeriesChart, ITimeDataSequence
@@ -19,6 +14,10 @@ from uu.chart.interfaces import INamedSeriesChart, INamedDataSequence
 from uu.chart.interfaces import TIME_DATA_TYPE, NAMED_DATA_TYPE
 from uu.chart.interfaces import MEASURE_DATA_TYPE
 from uu.chart.data import TimeSeriesDataPoint, NamedDataPoint
+from uu.chart.cache import committed_serial, memory_cache, parse_cache
+from uu.chart.cascade import DeferredIndexing
+from uu.chart.columns import PointColumns, merge_keys
+from uu.chart.ingest import parse_input, input_digest
 
 
 _type_filter = lambda o, t: hasattr(o, 'portal_type') and o.portal_type == t
@@ -32,20 +31,53 @@ def computed_attribute(level=0):
     return computed_attribute_wrapper
 
 
-def filter_data(context, points):
+def data_version(chart):
+    """
+    Key for the version of the data of all series of chart: serial of
+    chart (its date range crops series) and data_version() of each
+    series; None if any is not known.
+    """
+    serial = committed_serial(chart)
+    versions = tuple(series.data_version() for series in chart.series())
+    if serial is None or None in versions:
+        return None
+    return (serial, versions)
+
+
+def filter_data(context, points, excluded=False, version=None):
+    """
+    Crop points (list or PointColumns) of context series by start/end
+    of parent time-series collection, if configured to force crop.
+    If excluded is True, return only the points cropped out.
+
+    If a version key for points is given, the cropped PointColumns are
+    memoized per (version, start, end, force_crop, excluded).
+    """
     parent = aq_parent(aq_inner(context))
-    if ITimeSeriesCollection.providedBy(parent):
-        if getattr(parent, 'force_crop', False):
-            if parent.start:
-                _after_start = lambda p: p.date >= parent.start
-                points = filter(_after_start, points)
-            if parent.end:
-                _before_end = lambda p: p.date <= parent.end
-                points = filter(_before_end, points)
-    return points
+    if not ITimeSeriesCollection.providedBy(parent):
+        return [] if excluded else points
+    force_crop = bool(getattr(parent, 'force_crop', False))
+    if not force_crop:
+        return [] if excluded else points
+    if isinstance(points, PointColumns):
+        if version is None:
+            return points.crop(parent.start, parent.end, excluded=excluded)
+        cache = memory_cache('crop', 16)
+        key = version + (parent.start, parent.end, force_crop, excluded)
+        result = cache.get(key)
+        if result is None:
+            result = points.crop(parent.start, parent.end, excluded=excluded)
+            size = 64 if result is points else result.nbytes()
+            cache.set(key, result, size)
+        return result
+    _included = lambda p: (
+        (not parent.start or p.date >= parent.start) and
+        (not parent.end or p.date <= parent.end)
+        )
+    return [p for p in points if _included(p) != excluded]
 
 
-class BaseDataSequence(Item):
+class BaseDataSequence(DeferredIndexing, Item):
 
     POINTCLS = None
     KEYTYPE = unicode
@@ -53,47 +85,89 @@ class BaseDataSequence(Item):
     def __init__(self, id=None, *args, **kwargs):
         super(BaseDataSequence, self).__init__(id, *args, **kwargs)
 
+    def _parse(self, previous=None):
+        """
+        Parse input into ParsedInput, only parsing what was appended to
+        input since previous ParsedInput, if possible.
+        """
+        return parse_input(
+            getattr(self, 'input', u''),
+            self.POINTCLS,
+            previous,
+            )
+
+    def _version(self):
+        """
+        Return (UID, serial) key for the committed state of this series,
+        or None if there is no committed, unmodified state to key on.
+        """
+        base = aq_base(self)
+        if getattr(base, '_p_jar', None) is None or base._p_changed:
+            return None  # new, or modified in the current transaction
+        uid = IUUID(self, None)
+        if uid is None:
+            return None
+        return (uid, base._p_serial)
+
+    def data_version(self):
+        """Key for the version of data of series, or None if not known"""
+        return self._version()
+
+    def _parsed_input(self):
+        """
+        ParsedInput for input, memoized in the process-wide parse cache
+        by (UID, serial) for committed state, otherwise in a volatile
+        attribute keyed by hash of input.  Changed input is re-parsed
+        incrementally from the last known parse of this series.
+        """
+        cached = getattr(self, '_v_parsed', None)  # (hash, ParsedInput)
+        previous = cached[1] if cached is not None else None
+        version = self._version()
+        if version is None:
+            cachekey = input_digest(getattr(self, 'input', None) or u'')
+            if cached is None or cached[0] != cachekey:
+                cached = self._v_parsed = (cachekey, self._parse(previous))
+            return cached[1]
+        cache = parse_cache()
+        uid, serial = version
+        result = cache.get(uid, serial, self.POINTCLS)
+        if result is None:
+            result = self._parse(
+                cache.latest(uid, self.POINTCLS) or previous
+                )
+            cache.set(uid, serial, result)
+        return result
+
+    def parsed(self):
+        """
+        Unfiltered PointColumns for input, sorted by date for time series;
+        callers must not modify the (shared) result.
+        """
+        return self._parsed_input().ordered()
+
+    def diagnostics(self):
+        """
+        Return list of RejectedRow (line, row, reason) for rows of input
+        that could not be parsed into points.
+        """
+        return self._parsed_input().rejected
+
     def _data(self, filtered=True, excluded=False):
-        """Unfiltered data"""
-        if not self.input:
-            return []
-        result = []
-        reader = csv.reader(StringIO(getattr(self, 'input', u'')))
-        rows = list(reader)  # iterate over CSV
-        for row in rows:
-            note = uri = sample_size = None  # default empty optional values
-            if len(row) < 2:
-                continue  # silently ignore
-            try:
-                key = row[0]
-                if self.KEYTYPE == date:
-                    key = normalize_usa_date(key)
-                value = float(row[1])
-            except ValueError:
-                continue  # failed to type-cast value, ignore row
-            if len(row) >= 3:
-                note = row[2]
-            if len(row) >= 4:
-                uri = row[3]
-            if len(row) >= 5:
-                sample_size = int(row[4])
-            result.append(self.POINTCLS(key, value, note, uri, sample_size))
-        if filtered and not excluded:
-            result = filter_data(self, result)
+        """Parsed PointColumns, optionally filtered"""
+        result = self.parsed()
         if excluded:
-            included = filter_data(self, result)
-            result = [p for p in result if p not in included]
+            return filter_data(self, result, True, self._version())
+        if filtered:
+            result = filter_data(self, result, False, self._version())
         return result
 
     @computed_attribute(level=1)
     def data(self):
-        """Parse self.input, return list of point objects"""
-        if not hasattr(self, '_v_data'):
-            self._v_data = {}
-        cachekey = md5(self.input).hexdigest()
-        if cachekey not in self._v_data:
-            self._v_data[cachekey] = self._data(filtered=True)
-        return self._v_data[cachekey]
+        """
+        Parse self.input, return PointColumns sequence of (lazily
+        constructed) point objects.
+        """
+        return self._data(filtered=True)
 
     def excluded(self):
         return self._data(excluded=True)
@@ -129,7 +203,7 @@ class TimeDataSequence(BaseDataSequence):
         self.label_overrides = PersistentDict()
 
 
-class TimeSeriesChart(Container):
+class TimeSeriesChart(DeferredIndexing, Container):
     implements(ITimeSeriesChart, IAttributeUUID)
 
     def series(self):
@@ -144,6 +218,30 @@ class TimeSeriesChart(Container):
         v1 = list(filter(_f, contained))
         return v1 + list(filter(_f_measure, contained))
 
+    def identities(self, data=None):
+        """
+        Return sorted unique dates of the points of all series (the date
+        axis of the chart), merged from the key columns of each series;
+        data is a list of (series, data) pairs, if already computed.
+        Cached per version of the data of chart (see data_version()).
+        """
+        version = data_version(self)
+        cached = getattr(self, '_v_identities', None)
+        if version is not None and cached and cached[0] == version:
+            return list(cached[1])
+        if data is None:
+            data = [(s, s.data) for s in self.series()]
+        sequences = []  # of date ordinals
+        for seq, points in data:
+            if isinstance(points, PointColumns) and points.dated:
+                sequences.append(points.keys)
+            else:
+                sequences.append(p.identity().toordinal() for p in points)
+        result = map(date.fromordinal, merge_keys(sequences))
+        if version is not None:
+            self._v_identities = (version, result)
+        return list(result)
+
 
 class NamedDataSequence(BaseDataSequence):
     implements(INamedDataSequence)
@@ -152,7 +250,7 @@ class NamedDataSequence(BaseDataSequence):
     KEYTYPE = unicode
 
 
-class NamedSeriesChart(Container):
+class NamedSeriesChart(DeferredIndexing, Container):
     implements(INamedSeriesChart, IAttributeUUID)
 
     def __init__(self, id=None, *args, **kwargs):
@@ -171,8 +269,20 @@ class NamedSeriesChart(Container):
         v1 = list(filter(_f, contained))
         return v1 + list(filter(_f_measure, contained))
 
+    def identities(self, data=None):
+        """Return sorted unique names of the points of all series"""
+        if data is None:
+            data = [(s, s.data) for s in self.series()]
+        names = set()
+        for seq, points in data:
+            if isinstance(points, PointColumns):
+                names.update(points.keys)
+            else:
+                names.update(p.identity() for p in points)
+        return sorted(names)
+
 
-class DataReport(Container):
+class DataReport(DeferredIndexing, Container):
     implements(IDataReport, IAttributeUUID)
 
 
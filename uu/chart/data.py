@@ -11,6 +11,13 @@ def non_numeric(value):
 
 
 class BaseDataPoint(object):
+    """
+    Base data point; points (and subclasses) use __slots__ rather than
+    an instance __dict__, as a loaded report may construct many.
+    """
+
+    __slots__ = ('value', 'note', 'uri', 'sample_size', 'distribution')
+
     def __init__(
             self,
             value,
@@ -35,6 +42,8 @@ class BaseDataPoint(object):
 class NamedDataPoint(BaseDataPoint):
     implements(INamedDataPoint)
 
+    __slots__ = ('name',)
+
     def __init__(
             self,
             name,
@@ -59,6 +68,8 @@ class NamedDataPoint(BaseDataPoint):
 class TimeSeriesDataPoint(BaseDataPoint):
     implements(ITimeSeriesDataPoint)
 
+    __slots__ = ('date',)
+
     def __init__(
             self,
             date,
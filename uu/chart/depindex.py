@@ -0,0 +1,243 @@
+"""
+Reverse dependency index, from measure and dataset UIDs to the UIDs of
+the measure series providers bound to them, and the charts and reports
+containing those providers; stored in an annotation of the site.
+
+The index is maintained by subscribers for addition, modification,
+move and removal of providers (and so of charts and reports containing
+them), so that the content affected by a change to a measure or dataset
+is found in time proportional to the number of affected items, without
+catalog queries.  rebuild() indexes all existing providers (run by the
+upgrade step to profile version 3, and on install); only rebuild()
+creates the index, so that it is complete whenever it exists: until
+then, callers fall back to catalog queries.
+
+Also here: the index of charts by the stylebook they are bound to (see
+uu.chart.styles), maintained by subscribers for modification and move
+of charts, and built for existing charts by the upgrade step to profile
+version 4 (and on install); likewise, only rebuild_bindings() creates
+it, and until then charts bound to a stylebook are found by scanning.
+"""
+
+from Acquisition import aq_base, aq_inner, aq_parent
+from BTrees.OOBTree import OOBTree, OOTreeSet
+from persistent import Persistent
+from plone.uuid.interfaces import IUUID
+from Products.CMFCore.utils import getToolByName
+from zope.annotation.interfaces import IAnnotations
+from zope.component.hooks import getSite
+
+from uu.chart.interfaces import CHART_TYPES, IDataReport, MEASURESERIES_DATA
+
+
+ANNOTATION_KEY = 'uu.chart.dependencies'
+
+BINDINGS_KEY = 'uu.chart.stylebindings'
+
+
+class DependencyIndex(Persistent):
+    """Index of measure series providers by measure and dataset UIDs"""
+
+    def __init__(self):
+        self.providers = OOBTree()  # source UID -> OOTreeSet of UIDs
+        self.info = OOBTree()  # provider UID -> (sources, chart, report)
+
+    def index(self, uid, sources, chart=None, report=None):
+        """
+        Index provider UID, with sources (UIDs of measure and dataset)
+        and UIDs of its chart and report (None if not contained in one).
+        """
+        sources = tuple(sorted(set(s for s in sources if s)))
+        info = (sources, chart, report)
+        if self.info.get(uid, None) == info:
+            return  # unchanged
+        self.unindex(uid)
+        for source in sources:
+            if source not in self.providers:
+                self.providers[source] = OOTreeSet()
+            self.providers[source].insert(uid)
+        self.info[uid] = info
+
+    def unindex(self, uid):
+        info = self.info.get(uid, None)
+        if info is None:
+            return
+        for source in info[0]:
+            providers = self.providers.get(source, None)
+            if providers is not None and uid in providers:
+                providers.remove(uid)
+                if not providers:
+                    del self.providers[source]
+        del self.info[uid]
+
+    def provider_uids(self, source):
+        """UIDs of providers bound to source (measure or dataset UID)"""
+        return list(self.providers.get(source, ()))
+
+    def _containers(self, source, position):
+        result = set(
+            self.info[uid][position] for uid in self.provider_uids(source)
+            )
+        result.discard(None)
+        return sorted(result)
+
+    def chart_uids(self, source):
+        """UIDs of charts containing providers bound to source"""
+        return self._containers(source, 1)
+
+    def report_uids(self, source):
+        """UIDs of reports containing providers bound to source"""
+        return self._containers(source, 2)
+
+
+class StyleBindingIndex(Persistent):
+    """Index of charts by UID of the stylebook they are bound to"""
+
+    def __init__(self):
+        self.charts = OOBTree()  # stylebook UID -> OOTreeSet of chart UIDs
+        self.bound = OOBTree()  # chart UID -> stylebook UID
+
+    def bind(self, uid, stylebook=None):
+        """Index chart UID as bound to stylebook UID (None: unbound)"""
+        current = self.bound.get(uid, None)
+        if current == stylebook:
+            return  # unchanged
+        if current is not None:
+            charts = self.charts[current]
+            charts.remove(uid)
+            if not charts:
+                del self.charts[current]
+            del self.bound[uid]
+        if stylebook is not None:
+            if stylebook not in self.charts:
+                self.charts[stylebook] = OOTreeSet()
+            self.charts[stylebook].insert(uid)
+            self.bound[uid] = stylebook
+
+    def chart_uids(self, stylebook):
+        """UIDs of charts bound to stylebook UID"""
+        return list(self.charts.get(stylebook, ()))
+
+
+def get_index(site=None):
+    """DependencyIndex for site (default current), or None until built"""
+    site = site if site is not None else getSite()
+    return IAnnotations(site).get(ANNOTATION_KEY, None)
+
+
+def get_bindings(site=None):
+    """StyleBindingIndex for site (default current), or None until built"""
+    site = site if site is not None else getSite()
+    return IAnnotations(site).get(BINDINGS_KEY, None)
+
+
+def index_binding(chart, removed=False):
+    """
+    Index stylebook binding of chart; the index is not created here
+    (see rebuild_bindings()), as it would be incomplete.
+    """
+    uid = IUUID(chart, None)
+    stylebook = getattr(aq_base(chart), 'stylebook', None) or None
+    if removed:
+        stylebook = None
+    index = get_bindings()
+    if uid is not None and index is not None:
+        index.bind(uid, stylebook)
+
+
+def _containers(context):
+    """(chart UID, report UID) for provider, either may be None"""
+    chart = aq_parent(aq_inner(context))
+    report = aq_parent(aq_inner(chart)) if chart is not None else None
+    if not IDataReport.providedBy(report):
+        report = None
+    return (
+        IUUID(chart, None) if chart is not None else None,
+        IUUID(report, None) if report is not None else None,
+        )
+
+
+def index_provider(index, context):
+    chart, report = _containers(context)
+    index.index(
+        IUUID(context),
+        (getattr(context, 'measure', None), getattr(context, 'dataset', None)),
+        chart,
+        report,
+        )
+
+
+def rebuild(site):
+    """Rebuild index for site from all providers found in catalog"""
+    index = IAnnotations(site)[ANNOTATION_KEY] = DependencyIndex()
+    catalog = getToolByName(site, 'portal_catalog')
+    for brain in catalog.unrestrictedSearchResults(
+            {'portal_type': MEASURESERIES_DATA}):
+        index_provider(index, brain._unrestrictedGetObject())
+    return index
+
+
+def upgrade_rebuild(setup_tool):
+    """Upgrade step: index existing providers"""
+    rebuild(getToolByName(setup_tool, 'portal_url').getPortalObject())
+
+
+def install(setup_tool):
+    """Post-install handler of default profile: build indexes"""
+    upgrade_rebuild(setup_tool)
+    upgrade_rebuild_bindings(setup_tool)
+
+
+def rebuild_bindings(site):
+    """Rebuild stylebook binding index for site from charts in catalog"""
+    index = IAnnotations(site)[BINDINGS_KEY] = StyleBindingIndex()
+    catalog = getToolByName(site, 'portal_catalog')
+    for brain in catalog.unrestrictedSearchResults(
+            {'portal_type': list(CHART_TYPES)}):
+        chart = brain._unrestrictedGetObject()
+        stylebook = getattr(aq_base(chart), 'stylebook', None)
+        if stylebook:
+            index.bind(IUUID(chart), stylebook)
+    return index
+
+
+def upgrade_rebuild_bindings(setup_tool):
+    """Upgrade step: index stylebook bindings of existing charts"""
+    rebuild_bindings(
+        getToolByName(setup_tool, 'portal_url').getPortalObject()
+        )
+
+
+# event handlers:
+
+def handle_provider_modified(context, event):
+    """
+    Handler for addition or modification of provider; the index is not
+    created here (see rebuild()), as it would be incomplete.
+    """
+    index = get_index()
+    if index is not None:
+        index_provider(index, context)
+
+
+def handle_provider_moved(context, event):
+    """
+    Handler for move (also addition, removal) of provider, or of chart
+    or report containing it.
+    """
+    if event.newParent is None:
+        index = get_index()
+        if index is not None:
+            index.unindex(IUUID(context))
+        return
+    handle_provider_modified(context, event)
+
+
+def handle_chart_modified(context, event):
+    """Handler for modification of chart (e.g. its bound stylebook)"""
+    index_binding(context)
+
+
+def handle_chart_moved(context, event):
+    """Handler for move (also addition, removal) of chart"""
+    index_binding(context, removed=event.newParent is None)
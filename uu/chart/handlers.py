@@ -1,66 +1,160 @@
+from Acquisition import aq_base
 from Products.CMFCore.utils import getToolByName
+from Products.statusmessages.interfaces import IStatusMessage
+from zope.globalrequest import getRequest
+
+from uu.chart import cascadejob
+from uu.chart.cascade import Cascade, WORKFLOW, active
+from uu.chart.cascade import publish_transitions, unpublish_transitions
+from uu.chart.interfaces import CHART_TYPES, REPORT_TYPE
+
+
+REPORT_MESSAGES = {
+    'publish': 'publishing report components with report.',
+    'unpublish': 'returning any published components in report '
+                 'to the Shared with Workgroup state.',
+    }
+
+PUBLIC, MEMBERS = 'public', 'members'  # audiences of chart JSON
+
+SNAPSHOT = '_review_state'  # of chart or report, see snapshot_state()
+
+CHART_MESSAGES = {
+    'publish': 'publishing all chart series components with chart.',
+    'unpublish': 'returning any published series in chart '
+                 'to the Shared with Workgroup state.',
+    }
 
 
 def wfinfo(context):
     wftool = getToolByName(context, 'portal_workflow')
     chain = wftool.getChainFor(context)[0]
-    if 'workspace_workflow' not in chain:
-        # depends on conventions of collective.teamwork or uu.qiext workflow(s)
+    if WORKFLOW not in chain:
         raise ValueError('Context does not use known workflow: %s' % chain)
     state = wftool.getStatusOf(chain, context)['review_state']
     return state, wftool
 
 
+def review_state(context):
+    """Review state of context, in any workflow (None if it has none)"""
+    wftool = getToolByName(context, 'portal_workflow')
+    return wftool.getInfoFor(context, 'review_state', None)
+
+
+def audience(chart):
+    """
+    Audience of chart JSON: PUBLIC (notes and URIs of points omitted)
+    if chart is published, else MEMBERS.  Read from the snapshot of its
+    review state stored on chart by snapshot_state() (and for existing
+    charts, by the upgrade step to profile version 5), or from workflow
+    for any chart without one.
+    """
+    state = getattr(aq_base(chart), SNAPSHOT, None)
+    if state is None:
+        state = review_state(chart)
+    return PUBLIC if state == 'published' else MEMBERS
+
+
+def snapshot_state(context, event=None):
+    """
+    Handler for addition (or copy) and transition of chart or report:
+    store its review state, None if not known yet.
+    """
+    state = review_state(context)
+    if getattr(aq_base(context), SNAPSHOT, None) != state:
+        setattr(context, SNAPSHOT, state)
+
+
+def upgrade_snapshot_states(setup_tool):
+    """Upgrade step: store review state snapshot of existing content"""
+    catalog = getToolByName(setup_tool, 'portal_catalog')
+    for brain in catalog.unrestrictedSearchResults(
+            {'portal_type': list(CHART_TYPES) + [REPORT_TYPE]}):
+        snapshot_state(brain._unrestrictedGetObject())
+
+
 def publish(context, message=None, ignore_states=()):
     message = 'Publishing item' + (': %s' % message if message else '')
     state, wftool = wfinfo(context)
-    transition = lambda o, t: wftool.doActionFor(o, t, comment=message)
-    if state == 'published' or state in ignore_states:
-        return
-    if state == 'collaborative_editing':
-        transition(context, 'end_collaboration')
-    elif state not in ('pending', 'archived', 'visible'):
-        transition(context, 'share')
-    transition(context, 'publish')
+    for transition in publish_transitions(state, ignore_states):
+        wftool.doActionFor(context, transition, comment=message)
 
 
 def unpublish(context, message):
     message = 'Un-publishing item' + (': %s' % message if message else '')
     state, wftool = wfinfo(context)
-    transition = lambda o, t: wftool.doActionFor(o, t, comment=message)
-    if state == 'published':
-        transition(context, 'return_for_editing')
+    for transition in unpublish_transitions(state):
+        wftool.doActionFor(context, transition, comment=message)
+
+
+def publish_children(context, message, *messages):
+    """
+    Publish contents of context (and theirs, with any further messages
+    by depth), in one cascade; returns Cascade, or None if one is
+    running already.
+    """
+    return Cascade(context, 'publish', (message,) + messages).run()
 
 
-def publish_children(context, message):
-    for content in context.contentValues():
-        publish(content, message, ignore_states=('private',))
+def unpublish_children(context, message, *messages):
+    """Un-publish contents of context, see publish_children()"""
+    return Cascade(context, 'unpublish', (message,) + messages).run()
 
 
-def unpublish_children(context, message):
-    for content in context.contentValues():
-        unpublish(content, message)
+def _cascade(context, event, messages):
+    """
+    Cascade publish or return_for_editing action of event to contents
+    of context, with messages (dicts of action to message) by depth;
+    large cascades run as background jobs (see uu.chart.cascadejob),
+    and while a job runs for context, the cascade is queued to run once
+    it is done.  Shows summary of changes to user.
+    """
+    action = {
+        'publish': 'publish',
+        'return_for_editing': 'unpublish',
+        }.get(event.action)
+    if action is None:
+        return
+    if active() is not None:
+        return  # contents are covered by cascade running already
+    messages = [m[action] for m in messages]
+    job = cascadejob.running_job(context)
+    if job is not None:
+        # never replace (or run alongside) a running job: queue on it
+        job.queue(action, messages, cascadejob.current_userid())
+        summary = '%s of contents will follow the %s still running in ' \
+                  'background.' % (action.capitalize(), job.action)
+        _status(summary)
+        return
+    cascade = Cascade(context, action, messages)
+    cascade.prepare()
+    if not cascade.plan:
+        return
+    if cascadejob.in_background(cascade):
+        cascadejob.start(cascade)
+        summary = '%s of %s items will continue in background.' % (
+            action.capitalize(),
+            len(cascade.plan),
+            )
+    else:
+        summary = cascade.run().summary()
+    _status(summary)
+
+
+def _status(message):
+    request = getRequest()
+    if request is not None:
+        IStatusMessage(request).addStatusMessage(message, type='info')
 
 
 def after_chart_transition(context, event):
-    if event.action == 'publish':
-        message = 'publishing all chart series components with chart.'
-        publish_children(context, message=message)
-    if event.action == 'return_for_editing':
-        message = 'returning any published series in chart '\
-                  'to the Shared with Workgroup state.'
-        unpublish_children(context, message=message)
+    """Handler for (IBaseChart, IActionSucceededEvent)"""
+    # within a report cascade (which includes series of charts), the
+    # cascade from chart does nothing
+    _cascade(context, event, [CHART_MESSAGES])
 
 
 def after_report_transition(context, event):
     """Handler for (IDataReport, IActionSucceededEvent)"""
-    # note, publising children (charts) will fire its own events
-    # to affect items within those charts, such as series.
-    if event.action == 'publish':
-        message = 'publishing report components with report.'
-        publish_children(context, message=message)
-    if event.action == 'return_for_editing':
-        message = 'returning any published components in report '\
-                  'to the Shared with Workgroup state.'
-        unpublish_children(context, message=message)
-
+    # charts and their series are transitioned in one cascade
+    _cascade(context, event, [REPORT_MESSAGES, CHART_MESSAGES])
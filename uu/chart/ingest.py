@@ -0,0 +1,408 @@
+"""
+Bulk ingest of CSV series input into PointColumns.
+
+The whole input is read in one pass into raw string columns, then keys
+and values are converted in bulk:
+
+  * Dates: a date format is detected once per series (from the first
+    key that normalize_usa_date() accepts), then applied to all keys
+    with a compiled regular expression; keys not matching the detected
+    format fall back to normalize_usa_date(), so results are the same
+    as parsing each row with normalize_usa_date().
+
+  * Values: converted with NumPy in one vectorized call when NumPy is
+    available, otherwise with map(float, ...); either falls back to
+    per-value conversion only if some value cannot be converted.
+
+NumPy is optional (install uu.chart[numpy]): the order-of-magnitude
+speedup of bulk ingest for large inputs depends on it (as do bulk
+date conversion and the vectorized summarization engine); without it,
+the pure-Python path is only modestly (about 1.3x) faster than parsing
+row by row, with the same results.
+
+Rows that cannot be used are reported as RejectedRow diagnostics rather
+than silently dropped.
+
+Parsing is resumable: when input is appended to (the common case of
+adding new rows at the end of a series), parse_input() given the
+previous ParsedInput parses only the new tail of the input.
+"""
+
+from array import array
+from bisect import bisect_right
+from collections import namedtuple
+import csv
+from datetime import date
+from hashlib import md5
+import marshal
+import re
+import struct
+
+from uu.formlibrary.utils import normalize_usa_date
+
+from uu.chart.columns import PointColumns, NOSIZE
+
+try:
+    import numpy
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+
+RejectedRow = namedtuple('RejectedRow', ('line', 'row', 'reason'))
+
+
+class DateFormat(object):
+    """
+    Compiled date format: regular expression with year, month, day groups
+    (in the order given), for single keys and for bulk (multi-line) use.
+    """
+
+    def __init__(self, name, pattern, order):
+        self.name = name
+        self.regex = re.compile('^[ \t]*%s[ \t]*$' % pattern)
+        self.bulk_regex = re.compile(self.regex.pattern, re.M)
+        self.order = order  # indexes of year, month, day in match groups
+
+    def _ymd(self, groups):
+        return [int(groups[i]) for i in self.order]
+
+    def parse(self, key):
+        """
+        Return datetime.date or None if key does not match format; raises
+        ValueError for key matching the format, but not a valid date.
+        """
+        match = self.regex.match(key)
+        if match is None:
+            return None
+        return date(*self._ymd(match.groups()))
+
+    def parse_all(self, keys):
+        """
+        Return list of ordinals for all keys, or None if any key does not
+        match format or is not a valid date.
+        """
+        text = '\n'.join(keys)
+        found = self.bulk_regex.findall(text)
+        if len(found) != len(keys) or text.count('\n') != len(keys) - 1:
+            return None  # some key does not match (or contains newline)
+        if HAS_NUMPY and found:
+            ymd = numpy.array(found, dtype=numpy.int64)[:, self.order]
+            return self._ordinals(ymd)
+        try:
+            return [date(*self._ymd(groups)).toordinal() for groups in found]
+        except ValueError:
+            return None
+
+    def _ordinals(self, ymd):
+        """Vectorized date ordinals from (N, 3) array of year, month, day"""
+        year, month, day = ymd[:, 0], ymd[:, 1], ymd[:, 2]
+        if year.min() < 1 or not (1 <= month.min() <= month.max() <= 12):
+            return None
+        months = (year - 1970) * 12 + (month - 1)
+        first = months.astype('datetime64[M]').astype('datetime64[D]')
+        following = (months + 1).astype('datetime64[M]').astype(
+            'datetime64[D]'
+            )
+        if day.min() < 1 or (day > (following - first).astype(int)).any():
+            return None  # day out of range for month
+        days = first.astype(numpy.int64) + (day - 1)
+        return (days + _EPOCH_ORDINAL).tolist()
+
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+DATE_FORMATS = (
+    DateFormat('usa', r'(\d{1,2})/(\d{1,2})/(\d{4})', (2, 0, 1)),
+    DateFormat('iso8601', r'(\d{4})-(\d{1,2})-(\d{1,2})', (0, 1, 2)),
+    )
+
+
+def _normalized(key):
+    try:
+        return normalize_usa_date(key)
+    except ValueError:
+        return None
+
+
+def detect_date_format(keys):
+    """
+    Guess DateFormat for sequence of string keys, verified to agree with
+    normalize_usa_date() on the first key it accepts; returns None if no
+    known format is detected.
+    """
+    for key in keys:
+        expected = _normalized(key)
+        if expected is None:
+            continue
+        for fmt in DATE_FORMATS:
+            try:
+                if fmt.parse(key) == expected:
+                    return fmt
+            except ValueError:
+                continue
+        return None  # first date in unknown (to us) format
+    return None
+
+
+def parse_dates(keys):
+    """
+    Given list of string keys, return list of date ordinals, with None
+    for any key that is not a date.
+    """
+    fmt = detect_date_format(keys)
+    if fmt is not None:
+        result = fmt.parse_all(keys)
+        if result is not None:
+            return result  # fast path: all keys in detected format
+    result = []
+    for key in keys:
+        d = None
+        if fmt is not None:
+            try:
+                d = fmt.parse(key)
+            except ValueError:
+                d = None  # matches pattern, not valid date: fall back
+        if d is None:
+            d = _normalized(key)
+        result.append(d.toordinal() if d is not None else None)
+    return result
+
+
+def _float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def parse_floats(values):
+    """
+    Given list of strings, return list of floats, with None for any
+    value that cannot be converted.
+    """
+    try:
+        if HAS_NUMPY:
+            return numpy.array(values).astype(numpy.float64).tolist()
+        return map(float, values)
+    except ValueError:
+        return map(_float, values)  # slow path, at least one failure
+
+
+def _sample_size(value):
+    """Parse sample size, or return NOSIZE if empty; raise ValueError"""
+    if not value.strip():
+        return NOSIZE
+    return int(value)
+
+
+def input_digest(text):
+    """Hex MD5 digest of (unicode or UTF-8) input text"""
+    if isinstance(text, unicode):
+        text = text.encode('utf-8')
+    return md5(text).hexdigest()
+
+
+class ParsedInput(object):
+    """
+    Result of parsing series input: columns, rejected rows, and state
+    needed to resume parsing if more input is appended.
+
+    All records before the last record of the input are final; the last
+    record may be incomplete (e.g. a partial row, continued by appended
+    text), so it is re-parsed on resume.  offset is the position in the
+    input text where that last record starts, lines the number of
+    physical lines before it; rows and nrejected count the points and
+    rejected rows parsed from input[:offset].
+    """
+
+    # serialized header: metadata length, followed by marshal metadata
+    _HEADER = struct.Struct('<I')
+
+    def __init__(
+            self,
+            columns,
+            rejected=(),
+            offset=0,
+            lines=0,
+            rows=0,
+            nrejected=0,
+            digest=None):
+        self.columns = columns
+        self.rejected = list(rejected)
+        self.offset = offset
+        self.lines = lines
+        self.rows = rows
+        self.nrejected = nrejected
+        self.digest = digest  # of input[:offset]
+        self._ordered = None
+
+    def ordered(self):
+        """Columns sorted by key (for dated columns), computed once"""
+        if self._ordered is None:
+            columns = self.columns
+            if columns.dated:
+                columns = columns.sorted_by_key()
+            self._ordered = columns
+        return self._ordered
+
+    def resumable(self, text):
+        """Is text an extension of the final part of parsed input?"""
+        if not self.offset or len(text) < self.offset:
+            return False
+        return input_digest(text[:self.offset]) == self.digest
+
+    def tostring(self):
+        meta = marshal.dumps((
+            self.offset,
+            self.lines,
+            self.rows,
+            self.nrejected,
+            self.digest,
+            [tuple(r) for r in self.rejected],
+            ))
+        return ''.join(
+            (self._HEADER.pack(len(meta)), meta, self.columns.tostring())
+            )
+
+    @classmethod
+    def fromstring(cls, pointcls, data):
+        """
+        Construct from string made by tostring(); raises ValueError on
+        incompatible data.
+        """
+        if len(data) < cls._HEADER.size:
+            raise ValueError('Truncated parsed input data')
+        size = cls._HEADER.unpack_from(data)[0]
+        pos = cls._HEADER.size
+        try:
+            meta = marshal.loads(data[pos:pos + size])
+            offset, lines, rows, nrejected, digest, rejected = meta
+        except (EOFError, TypeError, ValueError):
+            raise ValueError('Truncated parsed input data')
+        columns = PointColumns.fromstring(pointcls, data[pos + size:])
+        return cls(
+            columns,
+            [RejectedRow(*r) for r in rejected],
+            offset,
+            lines,
+            rows,
+            nrejected,
+            digest,
+            )
+
+    def nbytes(self):
+        return self.columns.nbytes() + 256 * (len(self.rejected) + 1)
+
+
+def _parse(text, pointcls):
+    """Parse input text, return ParsedInput with line numbers from 1"""
+    result = PointColumns(pointcls)
+    rejected = []
+    lines = text.split('\n')
+    reader = csv.reader([line + '\n' for line in lines])
+    records = [(reader.line_num, row) for row in reader]
+    # records ending on or before this line are final; the last is not:
+    final = records[-2][0] if len(records) > 1 else 0
+    offset = len('\n'.join(lines[:final])) + 1 if final else 0
+    rows = [(line, row) for line, row in records if row]
+    if any(len(row) < 2 for line, row in rows):
+        rejected.extend(
+            RejectedRow(line, row, 'Missing value')
+            for line, row in rows if len(row) < 2
+            )
+        rows = [(line, row) for line, row in rows if len(row) >= 2]
+    keys = [row[0] for line, row in rows]
+    if result.dated:
+        keys = parse_dates(keys)
+    values = parse_floats([row[1] for line, row in rows])
+    simple = rows and max(len(row) for line, row in rows) == 2
+    if simple and None not in keys and None not in values:
+        # fast path: all rows are just valid key, value pairs:
+        result.keys = array('l', keys) if result.dated else keys
+        result.values = array('d', values)
+        result.sample_sizes = array('l', [NOSIZE]) * len(values)
+        kept = [line for line, row in rows]
+    else:
+        kept = []
+        kept_keys = []
+        kept_values = []
+        sizes = []
+        for i, (line, row) in enumerate(rows):
+            key, value = keys[i], values[i]
+            if key is None:
+                rejected.append(RejectedRow(line, row, 'Unrecognized date'))
+                continue
+            if value is None:
+                rejected.append(RejectedRow(line, row, 'Non-numeric value'))
+                continue
+            size = NOSIZE
+            if len(row) >= 5:
+                try:
+                    size = _sample_size(row[4])
+                except ValueError:
+                    rejected.append(
+                        RejectedRow(line, row, 'Invalid sample size')
+                        )
+                    continue
+            idx = len(kept_values)
+            if len(row) >= 3:
+                result.notes[idx] = row[2]
+            if len(row) >= 4:
+                result.uris[idx] = row[3]
+            kept.append(line)
+            kept_keys.append(key)
+            kept_values.append(value)
+            sizes.append(size)
+        result.keys = array('l', kept_keys) if result.dated else kept_keys
+        result.values = array('d', kept_values)
+        result.sample_sizes = array('l', sizes)
+        rejected.sort(key=lambda r: r.line)
+    return ParsedInput(
+        result,
+        rejected,
+        offset,
+        final,
+        bisect_right(kept, final),
+        bisect_right([r.line for r in rejected], final),
+        )
+
+
+def parse_input(text, pointcls, previous=None):
+    """
+    Parse series input text into ParsedInput for point class.  If a
+    previous ParsedInput is given, and text extends the input it was
+    parsed from (e.g. rows were appended), only the changed tail of
+    text is parsed, and merged with the previously parsed rows.
+    """
+    text = text or u''
+    if previous is not None and previous.resumable(text):
+        tail = _parse(text[previous.offset:], pointcls)
+        columns = previous.columns[:previous.rows]
+        columns.extend(tail.columns)
+        shifted = [
+            r._replace(line=r.line + previous.lines) for r in tail.rejected
+            ]
+        result = ParsedInput(
+            columns,
+            previous.rejected[:previous.nrejected] + shifted,
+            previous.offset + tail.offset,
+            previous.lines + tail.lines,
+            previous.rows + tail.rows,
+            previous.nrejected + tail.nrejected,
+            )
+    else:
+        result = _parse(text, pointcls)
+    result.digest = input_digest(text[:result.offset])
+    return result
+
+
+def parse_series(text, pointcls):
+    """
+    Parse CSV text (key, value, [note], [uri], [sample size]) into
+    PointColumns for point class; dates are parsed for time-series
+    point classes.  Returns tuple of columns, list of RejectedRow.
+    """
+    result = parse_input(text, pointcls)
+    return result.columns, result.rejected
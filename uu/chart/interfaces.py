@@ -113,6 +113,7 @@ from uu.formlibrary.measure.interfaces import PermissiveVocabulary
 
 from uu.chart import _  # MessageFactory for package
 from uu.chart.browser.color import NativeColorFieldWidget
+from uu.chart.memo import request_memo
 
 # type name globals:
 TIMESERIES_TYPE = 'uu.chart.timeseries'
@@ -210,12 +211,28 @@ VOCAB_PLOT_TYPES = SimpleVocabulary([
     ])
 
 
+def resolve_uids(uids):
+    """
+    Resolve UIDs to objects (None for any None or not found), in order;
+    UIDs not already resolved in the current request are found with one
+    catalog query.  UIDs not found are memoized too (as None), so that
+    dangling references are not queried again in the request.
+    """
+    uids = [str(uid) if uid is not None else None for uid in uids]
+    memo = request_memo('uu.chart.uidmemo')
+    if memo is None:
+        memo = {}
+    missing = list(set(uids) - set(memo) - set([None]))
+    if missing:
+        catalog = getSite().portal_catalog
+        memo.update((uid, None) for uid in missing)
+        for brain in catalog.unrestrictedSearchResults({'UID': missing}):
+            memo[brain.UID] = brain._unrestrictedGetObject()
+    return [memo.get(uid, None) for uid in uids]
+
+
 def resolve_uid(uid):
-    catalog = getSite().portal_catalog
-    r = catalog.unrestrictedSearchResults({'UID': str(uid)})
-    if not r:
-        return None
-    return r[0]._unrestrictedGetObject()
+    return resolve_uids([uid])[0]
 
 
 def provider_measure(context):
@@ -283,7 +300,9 @@ class IAggregateDescription(Interface):
     only considered relevant to aggregation of data from multiple
     sources or samples.
 
-    'distribution' attribute would have values that look like:
+    'distribution' attribute would have values that look like (in JSON;
+    points built by uu.chart store a compact Distribution of the same
+    data, see uu.chart.columns):
     [{ "value": 75.0, "sample_size": 8 }, { "value": 80, "sample_size": 10}]
 
     This data is sufficient to compute:
@@ -392,6 +411,12 @@ class IDataSeries(form.Schema):
         required=True,
         )
 
+    form.omitted('style_overrides')
+    style_overrides = schema.Dict(
+        key_type=schema.BytesLine(),
+        required=False,
+        )
+
     def __iter__():
         """
         Return iterable of date, number data point objects providing
@@ -412,6 +437,14 @@ class IDataSeries(form.Schema):
         If not applicable, return empty list.
         """
 
+    def diagnostics():
+        """
+        If applicable, return a list of rows of input rejected by
+        parsing, as (line, row, reason) tuples.
+
+        If not applicable, return empty list.
+        """
+
 
 class IDataCollection(Interface):
     """
@@ -837,11 +870,30 @@ class IBaseChart(
         title=u'Bound theme',
         description=u'If a theme is bound, any updates to that theme '
                     u'will OVER-WRITE display configuration saved '
-                    u'on this chart.',
+                    u'on this chart, unless it inherits styles.',
         required=False,
         constraint=is_content_uuid
         )
 
+    inherit_styles = schema.Bool(
+        title=u'Inherit styles from bound theme?',
+        description=u'If checked, display configuration of this chart '
+                    u'and its series is looked up from the bound theme '
+                    u'when the chart is shown, rather than copied to '
+                    u'it; settings changed on this chart (or a series) '
+                    u'after binding override those of the theme (the '
+                    u'edit form shows the values in effect), and are '
+                    u'cleared when the chart is bound again.',
+        default=False,
+        required=False,
+        )
+
+    form.omitted('style_overrides')
+    style_overrides = schema.Dict(
+        key_type=schema.BytesLine(),
+        required=False,
+        )
+
     info = RichText(
         title=_(u'Informative notes'),
         description=_(u'This allows any rich text and may contain free-form '
@@ -1075,6 +1127,19 @@ class IMeasureSeriesProvider(form.Schema, IDataSeries, ILineDisplay):
         default='AVG',
         )
 
+    materialized = schema.Bool(
+        title=u'Precompute data?',
+        description=u'If checked, data for this series is computed in '
+                    u'advance and stored, then refreshed in the '
+                    u'background when forms, the measure or the data set '
+                    u'change, instead of being computed from forms every '
+                    u'time the chart is viewed.  Recommended for '
+                    u'frequently viewed charts; data shown may briefly '
+                    u'lag behind form changes.',
+        default=False,
+        required=False,
+        )
+
     form.omitted('data')
     data = schema.List(
         title=_(u'Data'),
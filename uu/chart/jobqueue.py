@@ -0,0 +1,257 @@
+"""
+Persistent queue of background jobs refreshing materialized measure
+series data (see uu.chart.materialize), stored in an annotation of the
+site, so that jobs survive restarts and are shared by all ZEO clients.
+
+Jobs are keyed by provider UID: queueing a provider that is already
+queued keeps one job, at the higher of both priorities.  Jobs run in
+order of priority (PUBLISHED first: series of published charts and
+reports), then in the order queued, in a worker thread of each process
+(woken when jobs are queued), each job in its own transaction; a job
+picked by two processes at once conflicts, and is run by one of them.
+The last HISTORY jobs run are kept, with their wait and run times, for
+the queue status view.
+"""
+
+import logging
+import threading
+import time
+from weakref import WeakKeyDictionary
+
+from AccessControl.SecurityManagement import newSecurityManager
+from AccessControl.SpecialUsers import system
+from Acquisition import aq_base
+from BTrees.Length import Length
+from BTrees.OOBTree import OOBTree, OOTreeSet
+from persistent import Persistent
+from zope.annotation.interfaces import IAnnotations
+from zope.component.hooks import getSite
+from ZODB.POSException import ConflictError
+import transaction
+
+from uu.chart.parallel import opened
+
+
+logger = logging.getLogger('uu.chart')
+
+ANNOTATION_KEY = 'uu.chart.refreshqueue'
+
+PUBLISHED, OTHER = 0, 1  # priorities, in order run
+
+PRIORITY_LABELS = {PUBLISHED: u'Published', OTHER: u'Other'}
+
+HISTORY = 100  # number of finished jobs kept
+
+RETRIES = 3  # attempts to commit job on conflict
+
+
+class RefreshQueue(Persistent):
+    """Queue of refresh jobs for materialized measure series providers"""
+
+    def __init__(self):
+        self.pending = OOTreeSet()  # (priority, time queued, UID)
+        self.queued = OOBTree()  # UID -> key in pending
+        self.materialized = OOTreeSet()  # UIDs of materialized providers
+        self.history = OOBTree()  # (time finished, UID) -> job info dict
+        self.done = Length()
+        self.failed = Length()
+
+    def __contains__(self, uid):
+        return uid in self.queued
+
+    def depth(self):
+        """Number of jobs queued"""
+        return len(self.queued)
+
+    def depth_by_priority(self):
+        """Dict of priority to number of jobs queued"""
+        result = {}
+        for priority, queued, uid in self.pending:
+            result[priority] = result.get(priority, 0) + 1
+        return result
+
+    def add(self, uid, priority=OTHER):
+        """
+        Queue job for UID, unless queued already at the same or higher
+        priority; returns True if queued.
+        """
+        key = self.queued.get(uid, None)
+        if key is not None:
+            if key[0] <= priority:
+                return False
+            self.pending.remove(key)
+        key = (priority, time.time(), uid)
+        self.pending.insert(key)
+        self.queued[uid] = key
+        return True
+
+    def discard(self, uid):
+        key = self.queued.get(uid, None)
+        if key is not None:
+            del self.queued[uid]
+            self.pending.remove(key)
+
+    def pop(self):
+        """
+        Remove next job, return its (priority, time queued, UID) key, or
+        None if there are no jobs queued.
+        """
+        if not self.pending:
+            return None
+        key = self.pending.minKey()
+        self.pending.remove(key)
+        del self.queued[key[2]]
+        return key
+
+    def record(self, key, path, started, status):
+        """Record finished job, with its key as returned by pop()"""
+        priority, queued, uid = key
+        finished = time.time()
+        self.history[(finished, uid)] = {
+            'uid': uid,
+            'path': path,
+            'priority': priority,
+            'wait': started - queued,
+            'duration': finished - started,
+            'finished': finished,
+            'status': status,
+            }
+        (self.failed if status != 'ok' else self.done).change(1)
+        while len(self.history) > HISTORY:
+            del self.history[self.history.minKey()]
+
+    def recent(self):
+        """Info dicts for finished jobs, most recent first"""
+        return list(reversed(self.history.values()))
+
+
+def get_queue(site=None, create=False):
+    """RefreshQueue for site (default current), or None if none yet"""
+    site = site if site is not None else getSite()
+    annotations = IAnnotations(site)
+    queue = annotations.get(ANNOTATION_KEY, None)
+    if queue is None and create:
+        queue = annotations[ANNOTATION_KEY] = RefreshQueue()
+    return queue
+
+
+# worker:
+
+def run_job(queue, refresh):
+    """
+    Pop and run the next job of queue, refresh being a function of UID
+    returning the (physical) path of the refreshed provider; returns
+    the job key, or None if the queue is empty.  Failures are logged,
+    and recorded with the job.  Caller commits.
+    """
+    key = queue.pop()
+    if key is None:
+        return None
+    started = time.time()
+    try:
+        path = refresh(key[2])
+        queue.record(key, path, started, 'ok')
+    except ConflictError:
+        raise
+    except Exception:
+        logger.exception('Failed refresh job for %s' % key[2])
+        transaction.abort()  # restores job, remove it again:
+        queue.discard(key[2])
+        queue.record(key, None, started, 'failed')
+    return key
+
+
+def _drain(db, site_path, refresh):
+    """Run all jobs queued for site, each in its own transaction"""
+    with opened(db, site_path) as app:
+        newSecurityManager(None, system)
+        site = app.unrestrictedTraverse(site_path)
+        conflicts = 0
+        while conflicts < RETRIES:
+            queue = get_queue(site)
+            if queue is None:
+                break
+            try:
+                key = run_job(queue, refresh)
+                if key is None:
+                    break
+                transaction.commit()
+                conflicts = 0
+            except ConflictError:
+                transaction.abort()
+                conflicts += 1
+
+
+class Worker(threading.Thread):
+    """Process-wide worker thread, running jobs of woken sites"""
+
+    def __init__(self):
+        super(Worker, self).__init__(name='uu.chart refresh queue')
+        self.daemon = True
+        self.sites = {}  # site path -> (db, refresh function)
+        self.lock = threading.Lock()
+        self.event = threading.Event()
+
+    def wake(self, db, site_path, refresh):
+        with self.lock:
+            self.sites[site_path] = (db, refresh)
+        self.event.set()
+
+    def run(self):
+        while True:
+            self.event.wait()
+            self.event.clear()
+            with self.lock:
+                sites = self.sites.items()
+                self.sites = {}
+            for site_path, (db, refresh) in sites:
+                try:
+                    _drain(db, site_path, refresh)
+                except Exception:
+                    logger.exception('Failed running refresh queue')
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def wake(db, site_path, refresh):
+    """Wake (starting, if needed) worker, to run jobs queued for site"""
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = Worker()
+            _worker.start()
+    _worker.wake(db, site_path, refresh)
+
+
+_woken = WeakKeyDictionary()  # transactions waking worker after commit
+
+
+def _after_commit(success, db, site_path, refresh):
+    if success:
+        wake(db, site_path, refresh)
+
+
+def enqueue(jobs, refresh):
+    """
+    Queue jobs, a sequence of (UID, priority), for current site; the
+    worker is woken, to run them with function refresh (see run_job()),
+    after the current transaction is committed.
+    """
+    jobs = list(jobs)
+    if not jobs:
+        return
+    site = getSite()
+    queue = get_queue(site, create=True)
+    for uid, priority in jobs:
+        queue.add(uid, priority)
+    jar = getattr(aq_base(site), '_p_jar', None)
+    txn = transaction.get()
+    if jar is None or txn in _woken:
+        return
+    _woken[txn] = True
+    txn.addAfterCommitHook(
+        _after_commit,
+        args=(jar.db(), site.getPhysicalPath(), refresh),
+        )
@@ -0,0 +1,167 @@
+"""
+Cache of rendered chart JSON, keyed by everything the JSON depends on:
+
+  * chart UID;
+  * audience of chart JSON: public for published charts (notes and
+    URIs of points are omitted), members for any other state, read from
+    the review state snapshot stored on charts (see handlers.audience());
+  * content version of chart: the ZODB serials of the chart, its series
+    (and their label or style overrides), the stylebook and line styles
+    the chart inherits styles from by reference (see uu.chart.styleref),
+    the measures and datasets referenced by measure series, and the
+    catalog counter when there are measure series (data for a measure
+    comes from forms found by catalog query); for materialized measure
+    series with stored data, the serial of the stored data is used
+    instead of measure, dataset and catalog counter;
+  * absolute URL of the chart, as seen by the request (that is, with
+    the host name and any virtual hosting root of the request, as the
+    JSON contains absolute URLs);
+  * locale of the request (used in date labels);
+  * output format (compact or indented).
+
+Rendering JSON for one audience also caches the variant for the other,
+from the same series data, so that both are cached for a version.
+Entries for old versions are never used; event handlers also discard
+cached JSON for a chart when it (or one of its series) is modified or
+transitioned, so the memory is freed early.  The same content version
+is used for HTTP ETag values and for version tokens in JSON URLs.
+"""
+
+from hashlib import md5
+import random
+
+from Acquisition import aq_base, aq_inner, aq_parent
+from plone.uuid.interfaces import IUUID
+from Products.CMFCore.utils import getToolByName
+from zope.globalrequest import getRequest
+
+from uu.chart.browser.datelabel import get_locale
+from uu.chart.cache import committed_serial, memory_cache
+from uu.chart.depindex import get_index
+from uu.chart.handlers import audience
+from uu.chart.interfaces import IBaseChart
+from uu.chart.interfaces import IMeasureSeriesProvider
+from uu.chart.interfaces import resolve_uids
+from uu.chart.materialize import get_materialized, is_materialized
+from uu.chart.styleref import bound_stylebook, stylebook_objects
+
+
+def json_cache():
+    """Process-wide LRU cache of rendered chart JSON"""
+    return memory_cache('json', 32)
+
+
+def content_version(chart):
+    """
+    Hex digest of the versions of chart and the content its JSON is
+    computed from, or None if any of it is uncommitted or modified in
+    the current transaction.
+    """
+    objects = [chart]
+    references = []
+    series_list = list(chart.series())
+    stylebook = bound_stylebook(chart)
+    if stylebook is not None:
+        objects.extend(stylebook_objects(stylebook))  # styles by reference
+    for series in series_list:
+        objects.append(series)
+        record = get_materialized(series) if is_materialized(series) else None
+        if record is not None:
+            objects.append(record)  # data is read only from stored copy
+        elif IMeasureSeriesProvider.providedBy(series):
+            references.append(getattr(series, 'measure', None))
+            references.append(getattr(series, 'dataset', None))
+    objects.extend(obj for obj in resolve_uids(references) if obj is not None)
+    for obj in [chart] + series_list:
+        for name in ('label_overrides', 'style_overrides'):
+            overrides = getattr(aq_base(obj), name, None)
+            if getattr(overrides, '_p_jar', None) is not None:
+                objects.append(overrides)
+    serials = map(committed_serial, objects)
+    if None in serials:
+        return None
+    parts = [
+        (IUUID(obj, None), serial) for obj, serial in zip(objects, serials)
+        ]
+    if references:
+        parts.append(getToolByName(chart, 'portal_catalog').getCounter())
+    return md5(repr(parts)).hexdigest()
+
+
+def version_token(charts):
+    """
+    Token for content version of charts, for use in JSON URLs; random
+    (not cacheable) if the version of any chart is not known.
+    """
+    versions = map(content_version, charts)
+    if None in versions:
+        return str(random.randint(1, 2 ** 32))
+    if len(versions) == 1:
+        return versions[0]
+    return md5(repr(versions)).hexdigest()
+
+
+def _locale_name(request):
+    locale = get_locale(request) if request is not None else None
+    if locale is None:
+        return None
+    return (locale.id.language, locale.id.territory)
+
+
+def chart_json_key(chart, variant=None, compact=False):
+    """
+    Cache key for rendered JSON of chart for audience variant (default
+    that of chart), or None if the JSON cannot be cached.
+    """
+    version = content_version(chart)
+    if version is None:
+        return None
+    if variant is None:
+        variant = audience(chart)
+    return (
+        IUUID(chart),
+        variant,
+        version,
+        chart.absolute_url(),
+        _locale_name(getRequest()),
+        bool(compact),
+        )
+
+
+def etag(keys):
+    """ETag header value for cache key(s), or None for no key"""
+    if not keys or None in keys:
+        return None
+    return '"%s"' % md5(repr(keys)).hexdigest()
+
+
+def invalidate_chart(chart):
+    uid = IUUID(chart, None)
+    if uid is not None:
+        json_cache().discard_if(lambda key: key[0] == uid)
+
+
+def handle_content_modified(context, event):
+    """
+    Handler for modification or workflow transition of chart or series:
+    discard cached JSON for the affected chart.
+    """
+    if not IBaseChart.providedBy(context):
+        context = aq_parent(aq_inner(context))
+        if not IBaseChart.providedBy(context):
+            return
+    invalidate_chart(context)
+
+
+def handle_source_modified(context, event):
+    """
+    Handler for modification of measure or dataset: discard cached JSON
+    for charts with series bound to it.
+    """
+    index = get_index()
+    uid = IUUID(context, None)
+    if index is None or uid is None:
+        return
+    charts = set(index.chart_uids(uid))
+    if charts:
+        json_cache().discard_if(lambda key: key[0] in charts)
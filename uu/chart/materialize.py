@@ -0,0 +1,254 @@
+"""
+Materialized (precomputed) data for measure series.
+
+When the materialized option of a measure series provider is set, its
+(filtered, summarized) data is computed ahead of reads and stored as
+serialized PointColumns in an annotation of the provider, and data is
+served from that stored copy.
+
+A refresh of stored data is queued (see uu.chart.jobqueue) when the
+measure, data set or forms it is computed from change, or when the
+series or its chart is modified; affected providers are found by the
+dependency index (see uu.chart.depindex).  Queued jobs are run after
+the triggering transaction is committed, by a background worker thread
+with its own database connection (as the system user: stored data is
+the same for every viewer).  Until then the stale copy is served,
+marked stale in chart JSON: stored data is marked stale when its
+refresh is queued, which changes the version of the stored data, and
+so of the chart JSON (see uu.chart.jsoncache) computed from it.
+"""
+
+from datetime import datetime
+
+from Acquisition import aq_base
+from persistent import Persistent
+from plone.uuid.interfaces import IUUID
+from Products.CMFCore.utils import getToolByName
+from zope.annotation.interfaces import IAnnotations
+
+from uu.chart.columns import PointColumns
+from uu.chart.depindex import get_index
+from uu.chart.handlers import wfinfo
+from uu.chart.interfaces import IMeasureSeriesProvider
+from uu.chart.interfaces import MEASURESERIES_DATA
+from uu.chart.interfaces import resolve_uid, resolve_uids
+from uu.chart.jobqueue import OTHER, PUBLISHED
+from uu.chart.jobqueue import enqueue, get_queue, wake
+from uu.formlibrary.measure.interfaces import MEASURE_DEFINITION_TYPE
+
+
+ANNOTATION_KEY = 'uu.chart.materialized'
+
+DATASET_TYPE = 'uu.formlibrary.setspecifier'
+
+FORM_TYPES = ('uu.formlibrary.simpleform', 'uu.formlibrary.multiform')
+
+
+class MaterializedData(Persistent):
+    """Stored data of a measure series provider"""
+
+    def __init__(self):
+        self.columns = None  # serialized PointColumns
+        self.updated = None  # datetime of last refresh
+        self.stale = True
+
+    def data(self, pointcls):
+        """Stored PointColumns, or None if never computed"""
+        if self.columns is None:
+            return None
+        cached = getattr(self, '_v_data', None)
+        if cached is None or cached.pointcls is not pointcls:
+            cached = self._v_data = PointColumns.fromstring(
+                pointcls,
+                self.columns,
+                )
+        return cached
+
+    def store(self, columns):
+        self.columns = columns.tostring()
+        self.updated = datetime.now()
+        self.stale = False
+        self._v_data = columns
+
+
+def is_materialized(context):
+    return bool(
+        IMeasureSeriesProvider.providedBy(context) and
+        getattr(aq_base(context), 'materialized', False)
+        )
+
+
+def get_materialized(context, create=False):
+    """MaterializedData for provider, or None if there is none (yet)"""
+    annotations = IAnnotations(context)
+    record = annotations.get(ANNOTATION_KEY, None)
+    if record is None and create:
+        record = annotations[ANNOTATION_KEY] = MaterializedData()
+    return record
+
+
+def stored_data(context):
+    """Stored data of materialized provider, or None if there is none"""
+    record = get_materialized(context)
+    if record is None:
+        return None
+    return record.data(context.pointcls)
+
+
+def materialized_info(context):
+    """Dict of staleness info for JSON, or None if not materialized"""
+    if not is_materialized(context):
+        return None
+    record = get_materialized(context)
+    if record is None or record.updated is None:
+        return {'stale': True, 'updated': None}
+    return {
+        'stale': record.stale,
+        'updated': record.updated.isoformat(),
+        }
+
+
+def refresh(context):
+    """Compute and store data of provider now"""
+    record = get_materialized(context, create=True)
+    record.store(context._data(filtered=True))
+    return record
+
+
+def refresh_uid(uid):
+    """
+    Refresh provider by UID (job function for the refresh queue), if
+    it is materialized; returns path of provider, or None.
+    """
+    context = resolve_uid(uid)
+    if context is None:
+        return None
+    if is_materialized(context):
+        refresh(context)
+    return '/'.join(context.getPhysicalPath())
+
+
+def priority(context):
+    """Refresh priority for provider: series of published charts first"""
+    try:
+        state = wfinfo(context)[0]
+    except ValueError:
+        return OTHER  # unknown workflow
+    return PUBLISHED if state == 'published' else OTHER
+
+
+def mark_stale(providers):
+    """Mark stored data of (materialized) providers stale"""
+    for provider in providers:
+        record = get_materialized(provider) if provider is not None else None
+        if record is not None and not record.stale:
+            record.stale = True
+
+
+def schedule_refresh(providers):
+    """Mark stale, and queue refresh of, (materialized) providers"""
+    providers = [p for p in providers if is_materialized(p)]
+    mark_stale(providers)
+    enqueue(
+        [(IUUID(p), priority(p)) for p in providers],
+        refresh_uid,
+        )
+
+
+def wake_queue(site):
+    """Wake worker to run any jobs queued for site now"""
+    db = aq_base(site)._p_jar.db()
+    wake(db, site.getPhysicalPath(), refresh_uid)
+
+
+def _track(context, removed=False):
+    """Keep set of materialized provider UIDs of queue up to date"""
+    uid = IUUID(context, None)
+    queue = get_queue()
+    if uid is None or (queue is None and not is_materialized(context)):
+        return
+    queue = queue if queue is not None else get_queue(create=True)
+    if is_materialized(context) and not removed:
+        queue.materialized.insert(uid)
+    elif uid in queue.materialized:
+        queue.materialized.remove(uid)
+        queue.discard(uid)
+
+
+def affected_providers(context):
+    """
+    Catalog brains of materialized measure series providers with data
+    computed from context: a measure definition, data set, or form
+    (affecting all measures of its form definition); found by the
+    dependency index (or, until it is built, the references index),
+    without loading providers.
+    """
+    queue = get_queue()
+    if queue is None or not queue.materialized:
+        return []
+    portal_type = getattr(aq_base(context), 'portal_type', None)
+    catalog = getToolByName(context, 'portal_catalog')
+    find = catalog.unrestrictedSearchResults
+    if portal_type in (MEASURE_DEFINITION_TYPE, DATASET_TYPE):
+        uids = [IUUID(context)]
+    elif portal_type in FORM_TYPES:
+        definition = resolve_uid(getattr(context, 'definition', None))
+        if definition is None:
+            return []
+        uids = [
+            brain.UID for brain in find({
+                'portal_type': MEASURE_DEFINITION_TYPE,
+                'path': '/'.join(definition.getPhysicalPath()),
+                })
+            ]
+    else:
+        return []
+    if not uids:
+        return []
+    index = get_index()
+    if index is None:
+        query = {'portal_type': MEASURESERIES_DATA, 'references': uids}
+    else:
+        providers = set()
+        for uid in uids:
+            providers.update(index.provider_uids(uid))
+        providers = [uid for uid in providers if uid in queue.materialized]
+        if not providers:
+            return []
+        query = {'UID': providers}
+    return [brain for brain in find(query) if brain.UID in queue.materialized]
+
+
+# event handlers:
+
+def handle_series_modified(context, event):
+    """Handler for addition or modification of measure series provider"""
+    _track(context)
+    schedule_refresh([context])
+
+
+def handle_series_removed(context, event):
+    _track(context, removed=True)
+
+
+def handle_chart_modified(context, event):
+    """Handler for modification of chart (e.g. its date range)"""
+    schedule_refresh(context.series())
+
+
+def handle_source_modified(context, event):
+    """
+    Handler for change of any content: for measures, data sets and
+    forms, queue refresh of materialized data computed from them.
+    """
+    portal_type = getattr(aq_base(context), 'portal_type', None)
+    if portal_type not in FORM_TYPES + (
+            MEASURE_DEFINITION_TYPE,
+            DATASET_TYPE,
+            ):
+        return
+    _priority = lambda b: PUBLISHED if b.review_state == 'published' else OTHER
+    brains = affected_providers(context)
+    # loaded only to mark their stored data stale, for chart JSON:
+    mark_stale(resolve_uids([b.UID for b in brains]))
+    enqueue([(b.UID, _priority(b)) for b in brains], refresh_uid)
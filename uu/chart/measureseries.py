@@ -1,31 +1,111 @@
 from Acquisition import aq_parent, aq_inner
 from plone.indexer.decorator import indexer
+from plone.uuid.interfaces import IUUID
+from Products.CMFCore.utils import getToolByName
 from zope.interface import implements
 
+from uu.chart import materialize, summarize
+from uu.chart.cache import committed_serial, memory_cache
+from uu.chart.columns import PointColumns
 from uu.chart.content import BaseDataSequence, filter_data, computed_attribute
 from uu.chart.data import NamedDataPoint, TimeSeriesDataPoint
 from uu.chart.data import non_numeric
 from uu.chart.interfaces import IMeasureSeriesProvider
 from uu.chart.interfaces import INamedSeriesChart
-from uu.chart.interfaces import provider_measure, resolve_uid
+from uu.chart.interfaces import resolve_uids
+from uu.chart.memo import request_memo
 from uu.chart.interfaces import AGGREGATE_FUNCTIONS, AGGREGATE_LABELS
 
 
 DATASET_TYPE = 'uu.formlibrary.setspecifier'
 
+SELECTION_STRATEGIES = ('FIRST', 'LAST', 'IGNORE')
+
 
 def weighted_mean(points, default_sample_size=1):
     """
     Weight mean by sample size, use default size if data points do not
     provide.
     """
-    _sample_size = lambda p: getattr(p, 'sample_size', default_sample_size)
-    pairs = [(point.value, _sample_size(point)) for point in points]
+    pairs = [(point.value, point.sample_size) for point in points]
+    return weighted_mean_pairs(pairs, default_sample_size)
+
+
+def weighted_mean_pairs(pairs, default_sample_size=1):
+    """
+    Weighted mean of (value, sample size) pairs; use default size for
+    pairs with sample size of None.
+    """
+    _size = lambda s: default_sample_size if s is None else s
+    pairs = [(value, _size(size)) for value, size in pairs]
     total_samples = sum(zip(*pairs)[1])
     sum_weighted_values = sum([pair[0] * pair[1] for pair in pairs])
     return sum_weighted_values / float(total_samples)
 
 
+def points_version(measure, dataset, pointcls):
+    """
+    Key for the version of dataset_points of measure for dataset: UIDs
+    and serials of both, the catalog counter (the points come from
+    forms found by catalog query), and the absolute URL of the measure
+    (point URIs are absolute URLs of forms, as seen by the request);
+    None if either is uncommitted or modified in the current transaction.
+    """
+    serials = (committed_serial(measure), committed_serial(dataset))
+    if None in serials:
+        return None
+    return (
+        IUUID(measure),
+        IUUID(dataset),
+        ) + serials + (
+        getToolByName(measure, 'portal_catalog').getCounter(),
+        measure.absolute_url(),
+        pointcls.__name__,
+        )
+
+
+def _measure_points(measure, dataset, pointcls):
+    result = PointColumns(pointcls)
+    infos = measure.dataset_points(dataset)  # list of info dicts
+    _key = lambda info: info.get('start')  # datetime.date
+    if pointcls == NamedDataPoint:
+        _key = lambda info: info.get('title')
+    for info in infos or []:
+        result.append(
+            _key(info),
+            info.get('value'),
+            note=measure.value_note(info),
+            uri=info.get('url', None),
+            sample_size=info.get('raw_denominator', None),
+            )
+    if result.dated:
+        result = result.sorted_by_key()
+    return result
+
+
+def measure_points(measure, dataset, pointcls, version=None):
+    """
+    PointColumns (sorted by date, if dated) of dataset_points of measure
+    for dataset; for a known version (see points_version()), memoized in
+    the request and in the process-wide 'points' cache, so that series
+    (and charts) bound to the same measure and dataset share one result,
+    which callers must not modify.
+    """
+    if version is None:
+        return _measure_points(measure, dataset, pointcls)
+    memo = request_memo('uu.chart.pointsmemo')
+    if memo is not None and version in memo:
+        return memo[version]
+    cache = memory_cache('points', 16)
+    result = cache.get(version)
+    if result is None:
+        result = _measure_points(measure, dataset, pointcls)
+        cache.set(version, result, result.nbytes())
+    if memo is not None:
+        memo[version] = result
+    return result
+
+
 class MeasureSeriesProvider(BaseDataSequence):
 
     implements(IMeasureSeriesProvider)
@@ -42,179 +122,227 @@ class MeasureSeriesProvider(BaseDataSequence):
                 self._v_pointcls = NamedDataPoint
         return self._v_pointcls
 
-    def weighted_mean_summarization(self, points):
-        items = [(point.identity(), point) for point in points]
-        if not items:
-            return []
-        keys = zip(*items)[0]
-        if len(keys) == len(set(keys)):
-            return points  # no duplicate points for each key
+    def _keymap(self, points):
+        """
+        Given PointColumns, return list of unique keys (in order of first
+        appearance) and mapping of key to list of row indices.
+        """
         sorted_uniq_keys = []
         keymap = {}
-        for key, point in items:
+        for idx, key in enumerate(points.keys):
             if key not in keymap:
                 sorted_uniq_keys.append(key)    # only once
                 keymap[key] = []
-            keymap[key].append(point)
+            keymap[key].append(idx)
+        return sorted_uniq_keys, keymap
+
+    def _distribution(self, points, rows):
+        return points.distribution(rows)
+
+    def weighted_mean_summarization(self, points):
+        if not points:
+            return points
+        sorted_uniq_keys, keymap = self._keymap(points)
+        if len(sorted_uniq_keys) == len(points):
+            return points  # no duplicate points for each key
         label = 'Weighted mean'
-        result = []
+        result = PointColumns(self.pointcls)
         for key in sorted_uniq_keys:
-            keypoints = keymap[key]
-            vcount = len([p for p in keypoints if not non_numeric(p.value)])
+            rows = keymap[key]
+            numeric = [i for i in rows if not non_numeric(points.value(i))]
+            vcount = len(numeric)
             if vcount == 0:
                 # special case, only NaN values must have been found,
                 # so we will append a constructed NaN point:
-                point = self.pointcls(
-                    date=key,
-                    value=float('NaN'),
+                result._append(
+                    key,
+                    float('NaN'),
                     note='All respective forms have N/A values for point',
                     )
-                result.append(point)
             if vcount == 1:
-                result.append(keymap[key])  # original point preserved
+                result.append_row(points, numeric[0])  # original preserved
             elif vcount > 1:
-                value = weighted_mean(
-                    [p for p in keypoints if not non_numeric(p.value)]
+                value = weighted_mean_pairs(
+                    [(points.value(i), points.sample_size(i))
+                     for i in numeric]
+                    )
+                distribution = self._distribution(points, rows)
+                combined_sample_size = sum(
+                    [points.sample_size(i) for i in rows
+                     if points.sample_size(i) is not None]
                     )
-                distribution = [
-                    {
-                        'value': p.value,
-                        'sample_size': p.sample_size
-                    }
-                    for p in keypoints
-                    ]
-                combined_sample_size = sum([p.sample_size for p in keypoints])
                 note = u'%s of %s sources (N=%s).' % (
                     label,
-                    len(keypoints),
+                    len(rows),
                     combined_sample_size
                     )
-                aggregate_point = self.pointcls(
+                result._append(
                     key,
                     value,
                     note=note,
                     sample_size=combined_sample_size,
                     distribution=distribution
                     )
-                result.append(aggregate_point)
         return result
 
     def aggregate_function_summarization(self, points, strategy='AVG'):
-        items = [(point.identity(), point) for point in points]
-        if not items:
-            return []
-        sorted_uniq_keys = []
+        if not points:
+            return points
         fn = AGGREGATE_FUNCTIONS.get(strategy)
-        keymap = {}
-        pointmap = {}  # original points
-        for k, v in items:
-            if k not in keymap:
-                sorted_uniq_keys.append(k)  # only once
-                keymap[k] = []
-            if non_numeric(v.value):
-                continue  # ignore NaN values in keymap
-            keymap[k].append(v)  # sequence of 1..* values per key
-            pointmap[k] = v  # last point seen for key
+        sorted_uniq_keys, keymap = self._keymap(points)
         label = dict(AGGREGATE_LABELS).get(strategy)
-        result = []
+        result = PointColumns(self.pointcls)
         for k in sorted_uniq_keys:
-            vcount = len(keymap[k])
+            # ignore NaN values:
+            rows = [i for i in keymap[k] if not non_numeric(points.value(i))]
+            vcount = len(rows)
             if vcount == 0:
                 # special case, only NaN values must have been found,
                 # so we will append a constructed NaN point:
-                point = self.pointcls(
-                    date=k,
-                    value=float('NaN'),
+                result._append(
+                    k,
+                    float('NaN'),
                     note='All respective forms have N/A values for point',
                     )
-                result.append(point)
             if vcount == 1:
-                result.append(pointmap[k])  # original point preserved
+                result.append_row(points, rows[0])  # original preserved
             elif vcount > 1:
                 note = u'%s of %s values found.' % (label, vcount)
-                keypoints = keymap[k]
-                value = fn([p.value for p in keymap[k]])
-                distribution = [
-                    {
-                        'value': p.value,
-                        'sample_size': p.sample_size
-                    }
-                    for p in keypoints
-                    ]
+                value = fn([points.value(i) for i in rows])
+                distribution = self._distribution(points, rows)
                 combined_sample_size = sum(
-                    [p.sample_size for p in self.filter_data(keypoints)
-                     if p.sample_size is not None]
+                    [points.sample_size(i) for i in rows
+                     if points.sample_size(i) is not None]
                     )
-                aggregate_point = self.pointcls(
+                result._append(
                     k,
                     value,
                     note=note,
                     sample_size=combined_sample_size,
                     distribution=distribution
                     )
-                result.append(aggregate_point)
         return result
 
     def summarize(self, points):
+        """
+        Summarize PointColumns, return PointColumns; aggregate and
+        weighted mean strategies use the configured engine (the above
+        methods are the reference implementation).
+        """
         strategy = getattr(self, 'summarization_strategy', 'AVG')
+        vectorized = summarize.engine() == 'vectorized'
         if strategy in AGGREGATE_FUNCTIONS:
+            if vectorized:
+                label = dict(AGGREGATE_LABELS).get(strategy)
+                return summarize.aggregate_summarization(
+                    points,
+                    strategy,
+                    label,
+                    )
             return self.aggregate_function_summarization(points, strategy)
         if strategy == 'WEIGHTED_MEAN':
+            if vectorized:
+                return summarize.weighted_mean_summarization(points)
             return self.weighted_mean_summarization(points)
-        items = [(point.identity(), point) for point in points]
-        if not items:
-            return []
-        keys = zip(*items)[0]
-        if len(keys) == len(set(keys)):
+        if strategy in SELECTION_STRATEGIES:
+            return self.selection_summarization(points, strategy)
+        return points  # fallback
+
+    def selection_summarization(self, points, strategy):
+        """
+        Summarize PointColumns by selecting one row per key: the FIRST
+        or LAST row for each key, or (IGNORE) only rows of keys without
+        duplicates.  Keys are output in chronological order for dated
+        points, else in order of first appearance.
+        """
+        if not points:
+            return points
+        if points.dated:
+            points = points.sorted_by_key()  # stable: keeps order per key
+        uniq_keys, keymap = self._keymap(points)
+        if len(uniq_keys) == len(points):
             return points  # no duplicate points for each key
-        if strategy == 'LAST':
-            return dict(items).values()  # dict() picks last on collision
         if strategy == 'FIRST':
-            return dict(reversed(items)).values()
-        if strategy == 'IGNORE':
-            # return only points without duplicated keys
-            return [v for k, v in items if keys.count(k) == 1]
-        return points  # fallback
+            rows = [keymap[key][0] for key in uniq_keys]
+        elif strategy == 'LAST':
+            rows = [keymap[key][-1] for key in uniq_keys]
+        else:
+            rows = [
+                keymap[key][0] for key in uniq_keys if len(keymap[key]) == 1
+                ]
+        return points.take(rows)
 
-    def filter_data(self, points):
+    def data_version(self):
+        """
+        Key for the version of data of series: its own version, and the
+        serial of stored data if materialized (and stored), else the
+        version of the points of its measure and dataset (see
+        points_version()); None if not known.
+        """
+        version = self._version()
+        if version is None:
+            return None
+        if getattr(self, 'materialized', False):
+            record = materialize.get_materialized(self)
+            if record is not None and record.columns is not None:
+                serial = committed_serial(record)
+                return None if serial is None else version + (serial,)
+        measure, dataset = resolve_uids(
+            [getattr(self, 'measure', None), getattr(self, 'dataset', None)]
+            )
+        if measure is None or \
+                getattr(dataset, 'portal_type', None) != DATASET_TYPE:
+            return version  # no data
+        points = points_version(measure, dataset, self.pointcls)
+        return None if points is None else version + points
+
+    def filter_data(self, points, excluded=False, version=None):
         """Pre-summarization filtering"""
         if self.pointcls is TimeSeriesDataPoint:
-            return filter_data(self, points)
-        return points
+            return filter_data(self, points, excluded, version)
+        return [] if excluded else points
 
     def _data(self, filtered=True, excluded=False):
-        measure = provider_measure(self)
+        measure, dataset = resolve_uids(
+            [getattr(self, 'measure', None), getattr(self, 'dataset', None)]
+            )
         if measure is None:
-            return []
-        dataset_uid = getattr(self, 'dataset', None)
-        dataset = resolve_uid(dataset_uid)
+            return PointColumns(self.pointcls)
         if getattr(dataset, 'portal_type', None) != DATASET_TYPE:
-            return []  # no dataset or wrong type
-        infos = measure.dataset_points(dataset)  # list of info dicts
-        if not infos:
-            return []
-        _key = lambda info: info.get('start')  # datetime.date
-        if self.pointcls == NamedDataPoint:
-            _key = lambda info: info.get('title')
-        _point = lambda info: self.pointcls(
-            _key(info),
-            info.get('value'),
-            note=measure.value_note(info),
-            uri=info.get('url', None),
-            sample_size=info.get('raw_denominator', None),
-            )
-        all_points = map(_point, infos)
-        if filtered and not excluded:
-            all_points = self.filter_data(all_points)
+            return PointColumns(self.pointcls)  # no dataset or wrong type
+        version = points_version(measure, dataset, self.pointcls)
+        result = measure_points(measure, dataset, self.pointcls, version)
+        if not result:
+            return result
         if excluded:
-            included = self.filter_data(all_points)
-            all_points = [p for p in all_points if p not in included]
-        return self.summarize(all_points)
+            result = self.filter_data(result, True, version)
+        elif filtered:
+            result = self.filter_data(result, False, version)
+        return self.summarize(result)
 
     @computed_attribute(level=1)
     def data(self):
+        if getattr(self, 'materialized', False):
+            stored = materialize.stored_data(self)
+            if stored is not None:
+                return stored  # else not (yet) refreshed, compute now
         return self._data(filtered=True)
 
+    def diagnostics(self):
+        return []  # no input to parse
+
+
+def referenced_uids(charts):
+    """UIDs of measures and datasets referenced by series of charts"""
+    uids = set()
+    for chart in charts:
+        for series in chart.series():
+            if IMeasureSeriesProvider.providedBy(series):
+                uids.add(getattr(series, 'measure', None))
+                uids.add(getattr(series, 'dataset', None))
+    uids.discard(None)
+    return sorted(uids)
+
 
 @indexer(IMeasureSeriesProvider)
 def measure_series_references(context):
@@ -0,0 +1,24 @@
+"""
+Memos for the lifetime of a request (and its transaction), for values
+resolved many times in one request, e.g. by every series of a report.
+"""
+
+from zope.annotation.interfaces import IAnnotations
+from zope.globalrequest import getRequest
+import transaction
+
+
+def request_memo(name):
+    """
+    Get dict memo for name in the current request, reset when the
+    transaction changes; None if there is no (annotatable) request.
+    """
+    request = getRequest()
+    annotations = IAnnotations(request, None) if request is not None else None
+    if annotations is None:
+        return None
+    txn = transaction.get()
+    memo = annotations.get(name, None)
+    if memo is None or memo[0] is not txn:
+        memo = annotations[name] = (txn, {})
+    return memo[1]
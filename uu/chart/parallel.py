@@ -0,0 +1,188 @@
+"""
+Concurrent computation of series data for charts (of a report), on a
+bounded, process-wide pool of threads.
+
+ZODB connections (and the persistent objects loaded by them) must not
+be shared between threads, so each task opens its own connection from
+the database, traverses to its chart, and computes data for the chart
+series there: only the resulting PointColumns (plain, non-persistent
+objects) are returned to the calling thread.  Tasks run as the same
+user as the caller, with the same site set, and abort their (read-only)
+transaction when done.  The request of a task has the server URL and
+virtual hosting root of the calling request, so that URLs computed
+(e.g. URIs of points) are those the caller would compute.
+
+Each worker connection sees the latest committed state of the database,
+which may be newer than the snapshot of the calling request: a task is
+given the content version of its chart as seen by the caller, and its
+result is discarded (the caller computes the data itself) unless the
+worker sees the same version, so that data is never cached under the
+key of another version.
+
+The number of threads is the report_parallelism setting; 1 (default)
+disables concurrent computation.
+"""
+
+from contextlib import contextmanager
+import logging
+from multiprocessing.pool import ThreadPool
+import threading
+from urllib import unquote
+
+from AccessControl.SecurityManagement import getSecurityManager
+from AccessControl.SecurityManagement import newSecurityManager
+from AccessControl.SecurityManagement import noSecurityManager
+from Acquisition import aq_base
+from Testing.makerequest import makerequest
+from zope.component.hooks import getSite, setSite
+from zope.globalrequest import getRequest, setRequest
+import transaction
+
+from uu.chart.config import setting
+
+
+logger = logging.getLogger('uu.chart')
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def parallelism():
+    """Configured number of threads for concurrent computation"""
+    return max(1, setting('report_parallelism', 1, int))
+
+
+def pool():
+    """Process-wide thread pool, or None if parallelism is disabled"""
+    global _pool
+    workers = parallelism()
+    if workers < 2:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPool(workers)
+    return _pool
+
+
+def _user(site, userid):
+    """Find user by id in site or (for Zope users) root user folder"""
+    app = site.getPhysicalRoot()
+    for context in (site, app):
+        acl_users = getattr(aq_base(context), 'acl_users', None)
+        if acl_users is None:
+            continue
+        user = context.acl_users.getUserById(userid)
+        if user is not None:
+            if not hasattr(user, 'aq_base'):
+                user = user.__of__(context.acl_users)
+            return user
+    return None
+
+
+def request_location(request=None):
+    """
+    Server URL, virtual root path (script) and physical path of virtual
+    root of request (default current), for opened(); None if no request.
+    """
+    request = request if request is not None else getRequest()
+    if request is None:
+        return None
+    return (
+        request.get('SERVER_URL'),
+        tuple(getattr(request, '_script', ())),
+        request.get('VirtualRootPhysicalPath'),
+        )
+
+
+def _environ(location):
+    if location is None or not location[0]:
+        return None
+    script = '/'.join(map(unquote, location[1]))  # quoted by request
+    return {'SERVER_URL': location[0], 'SCRIPT_NAME': '/' + script}
+
+
+@contextmanager
+def opened(db, site_path, userid=None, location=None):
+    """
+    Open a connection to db, with a request (at location, as returned
+    by request_location(), if given), the site at site_path and (if
+    given) user set, yielding the application root; on exit, the
+    transaction is aborted, and all of the above reset and closed.
+    """
+    conn = db.open()
+    try:
+        app = makerequest(
+            conn.root()['Application'],
+            environ=_environ(location),
+            )
+        if location is not None and location[2] is not None:
+            app.REQUEST['VirtualRootPhysicalPath'] = location[2]
+        setRequest(app.REQUEST)
+        site = app.unrestrictedTraverse(site_path)
+        setSite(site)
+        user = _user(site, userid) if userid else None
+        if user is not None:
+            newSecurityManager(None, user)
+        yield app
+    finally:
+        noSecurityManager()
+        setSite(None)
+        setRequest(None)
+        transaction.abort()
+        conn.close()
+
+
+def _series_data(task):
+    """
+    Compute data for all series of a chart in its own connection; returns
+    list of (series id, data) pairs, or None on failure, or if the chart
+    content version seen is not that expected by the caller.
+    """
+    db, site_path, chart_path, userid, location, version, expected = task
+    try:
+        with opened(db, site_path, userid, location) as app:
+            chart = app.unrestrictedTraverse(chart_path)
+            if version is not None and version(chart) != expected:
+                return None  # not the snapshot of caller
+            return [
+                (series.getId(), series.data) for series in chart.series()
+                ]
+    except Exception:
+        logger.exception('Failed computing series data for %s' % (
+            '/'.join(chart_path),
+            ))
+        return None
+
+
+def series_data(charts, version=None):
+    """
+    Compute series data for each chart concurrently (if enabled), return
+    iterator (in order of charts) of lists of (series id, data) pairs,
+    or None for any chart not computed (caller computes it instead);
+    version is a function of chart returning its content version, if
+    given (results are None for charts changed since the caller read
+    them, or not committed).
+    """
+    charts = list(charts)
+    workers = pool()
+    jar = getattr(aq_base(charts[0]), '_p_jar', None) if charts else None
+    if workers is None or len(charts) < 2 or jar is None:
+        return iter([None] * len(charts))
+    site = getSite()
+    user = getSecurityManager().getUser()
+    userid = user.getId() if user is not None else None
+    location = request_location()
+    tasks = [
+        (
+            jar.db(),
+            site.getPhysicalPath(),
+            chart.getPhysicalPath(),
+            userid,
+            location,
+            version,
+            version(chart) if version is not None else None,
+        )
+        for chart in charts
+        ]
+    return workers.imap(_series_data, tasks)
@@ -0,0 +1,97 @@
+"""
+benchmark_summarize.py -- time summarization strategies of measure
+series on synthetic data with heavy key duplication (many sites/forms
+reporting values for the same few dates), as for multi-site datasets.
+
+Usage (with an interpreter that can import uu.chart, e.g. zopepy):
+
+    bin/zopepy uu/chart/scripts/benchmark_summarize.py [POINTS [KEYS]]
+
+POINTS (default 20000) is the number of points, KEYS (default 36) the
+number of distinct dates they share.
+"""
+
+from datetime import date
+import random
+import sys
+import time
+
+from uu.chart.columns import PointColumns
+from uu.chart.data import TimeSeriesDataPoint
+from uu.chart.interfaces import AGGREGATE_LABELS
+from uu.chart.measureseries import MeasureSeriesProvider
+from uu.chart.measureseries import SELECTION_STRATEGIES
+from uu.chart import summarize
+
+
+REPEAT = 3
+
+
+def make_points(size, nkeys, seed=0):
+    """Unsorted time series points, size points over nkeys dates"""
+    rand = random.Random(seed)
+    dates = [date(2000 + i // 12, i % 12 + 1, 1) for i in range(nkeys)]
+    points = PointColumns(TimeSeriesDataPoint)
+    for i in xrange(size):
+        value = rand.random() * 100 if rand.random() > 0.05 else None
+        points.append(
+            rand.choice(dates),
+            value,
+            sample_size=rand.choice((None, 10, 25)),
+            )
+    # a few keys without duplicates, so IGNORE has output:
+    for i in range(3):
+        points.append(date(1990 + i, 1, 1), float(i))
+    return points
+
+
+def timed(fn, *args):
+    """Best time of REPEAT calls, in seconds"""
+    best = None
+    for i in range(REPEAT):
+        start = time.time()
+        fn(*args)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(args):
+    size = int(args[0]) if args else 20000
+    nkeys = int(args[1]) if len(args) > 1 else 36
+    points = make_points(size, nkeys)
+    provider = MeasureSeriesProvider()
+    provider._v_pointcls = TimeSeriesDataPoint
+    print '%s points, %s distinct keys' % (len(points), nkeys + 3)
+    for strategy in SELECTION_STRATEGIES:
+        print '%-14s %8.4fs' % (
+            strategy,
+            timed(provider.selection_summarization, points, strategy),
+            )
+    engines = ['reference']
+    if summarize.HAS_NUMPY:
+        engines.append('vectorized')
+    strategies = [name for name, label in AGGREGATE_LABELS]
+    for strategy in strategies + ['WEIGHTED_MEAN']:
+        times = []
+        for engine in engines:
+            if strategy == 'WEIGHTED_MEAN':
+                fn = {
+                    'reference': provider.weighted_mean_summarization,
+                    'vectorized': summarize.weighted_mean_summarization,
+                    }[engine]
+                args = (points,)
+            else:
+                fn = {
+                    'reference': provider.aggregate_function_summarization,
+                    'vectorized': summarize.aggregate_summarization,
+                    }[engine]
+                args = (points, strategy)
+                if engine == 'vectorized':
+                    args += (strategy,)
+            times.append('%s %8.4fs' % (engine, timed(fn, *args)))
+        print '%-14s %s' % (strategy, '  '.join(times))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -163,13 +163,15 @@ def output_report_json(report, path):
     uid = IUUID(report)
     os.mkdir(os.path.join(path, uid))
     f = open(os.path.join(path, uid, 'report.json'), 'w+')
-    f.write(ReportJSON(report).render())
+    for chunk in ReportJSON(report).iterencode():
+        f.write(chunk)
     f.close()
     charts = [o for o in report.objectValues() if IBaseChart.providedBy(o)]
     for chart in charts:
         chart_name = '%s.json' % chart.getId()
         f = open(os.path.join(path, uid, chart_name), 'w+')
-        f.write(ChartJSON(chart).render())
+        for chunk in ChartJSON(chart).iterencode():
+            f.write(chunk)
         f.close()
     return os.path.join(path, IUUID(report))
 
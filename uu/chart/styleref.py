@@ -0,0 +1,243 @@
+"""
+Style inheritance by reference: a chart bound to a stylebook (theme)
+with its inherit_styles option set does not have display settings of
+the stylebook copied onto it (and its series) when the stylebook is
+modified; instead, effective display values are looked up through the
+stylebook reference as the chart is rendered, so that editing a
+stylebook writes only the stylebook (or line style), however many
+charts are bound to it.
+
+Resolved values of a stylebook (a dict of chart display values, and
+one of line display values for each line style) are cached per
+stylebook version (UID and ZODB serials of stylebook and its line
+styles) in the process-wide 'styles' cache, and memoized in the
+request, so that the charts of a report bound to one stylebook share
+one lookup.
+
+Values set on the chart (or a series) itself, by editing it after it
+is bound, are recorded in its style_overrides, and take precedence over
+the stylebook; setting a value back to that of the stylebook removes
+the override.  Series use the line style at the same position (as
+copying styles does).  Overrides are cleared when a chart is (re)bound,
+and edit forms show (and compare edits to) the effective values, not
+the (stale) values stored on the chart (see browser.datamanager).
+"""
+
+from Acquisition import aq_base, aq_inner, aq_parent
+from persistent.dict import PersistentDict
+from plone.uuid.interfaces import IUUID
+from zope.lifecycleevent.interfaces import IAttributes
+
+from uu.chart.browser.styles import clear_overrides, copy_plan
+from uu.chart.cache import committed_serial, memory_cache
+from uu.chart.interfaces import IBaseChart, IChartStyleBook, ILineDisplayCore
+from uu.chart.interfaces import resolve_uid
+from uu.chart.memo import request_memo
+
+
+CHART_EXCLUDE = ('x_label', 'y_label')  # chart-specific, never inherited
+
+REBIND = ('stylebook', 'inherit_styles')  # fields (re)binding a chart
+
+
+class Styled(object):
+    """
+    Read-only view of a chart or series, with effective display values
+    (styles) in place of those stored on it.
+    """
+
+    def __init__(self, context, styles):
+        self._context = context
+        self._styles = styles
+
+    def __getattr__(self, name):
+        styles = self.__dict__['_styles']
+        if name in styles:
+            return styles[name]
+        return getattr(self.__dict__['_context'], name)
+
+
+def inherits(chart):
+    """True if chart resolves styles from its bound stylebook"""
+    base = aq_base(chart)
+    return bool(
+        getattr(base, 'inherit_styles', False) and
+        getattr(base, 'stylebook', None)
+        )
+
+
+def bound_stylebook(chart):
+    """Stylebook chart resolves styles from, or None"""
+    if not inherits(chart):
+        return None
+    stylebook = resolve_uid(chart.stylebook)
+    if not IChartStyleBook.providedBy(stylebook):
+        return None  # removed, or not a stylebook
+    return stylebook
+
+
+def stylebook_objects(stylebook):
+    """Stylebook and its line styles, the content styles resolve from"""
+    return [stylebook] + list(stylebook.objectValues())
+
+
+def stylebook_version(stylebook):
+    """
+    Key for the version of stylebook: its UID and serials of it and its
+    line styles; None if any is uncommitted or modified.
+    """
+    serials = tuple(map(committed_serial, stylebook_objects(stylebook)))
+    if None in serials:
+        return None
+    return (IUUID(stylebook),) + serials
+
+
+def _values(context, plan):
+    return dict(
+        (name, getattr(context, name, default)) for name, default in plan
+        )
+
+
+def _resolve(stylebook):
+    line_plan = copy_plan(ILineDisplayCore)
+    return (
+        _values(stylebook, copy_plan(IChartStyleBook, CHART_EXCLUDE)),
+        [_values(line, line_plan) for line in stylebook.objectValues()],
+        )
+
+
+def resolved_styles(stylebook):
+    """
+    Tuple of dict of chart display values of stylebook, and list of
+    dicts of line display values (of each line style); callers must not
+    modify the result.
+    """
+    version = stylebook_version(stylebook)
+    if version is None:
+        return _resolve(stylebook)
+    memo = request_memo('uu.chart.stylememo')
+    if memo is not None and version in memo:
+        return memo[version]
+    cache = memory_cache('styles', 1)
+    result = cache.get(version)
+    if result is None:
+        result = _resolve(stylebook)
+        cache.set(version, result, len(repr(result)))
+    if memo is not None:
+        memo[version] = result
+    return result
+
+
+def _overrides(context):
+    return getattr(aq_base(context), 'style_overrides', None) or {}
+
+
+def chart_styles(chart, stylebook=None):
+    """
+    Dict of effective chart display values: those of stylebook (default
+    that bound to chart), updated with overrides of chart; None if chart
+    does not resolve styles from a stylebook.
+    """
+    stylebook = stylebook or bound_stylebook(chart)
+    if stylebook is None:
+        return None
+    styles = dict(resolved_styles(stylebook)[0])
+    styles.update(_overrides(chart))
+    return styles
+
+
+def series_styles(chart, stylebook=None):
+    """
+    Dict of series id to dict of effective display values of series,
+    from the line style at the same position, updated with overrides of
+    series; None if chart does not resolve styles from a stylebook.
+    """
+    stylebook = stylebook or bound_stylebook(chart)
+    if stylebook is None:
+        return None
+    lines = resolved_styles(stylebook)[1]
+    result = {}
+    for series, line in zip(chart.objectValues(), lines):
+        styles = dict(line)
+        styles.update(_overrides(series))
+        result[series.getId()] = styles
+    return result
+
+
+def effective_styles(context):
+    """
+    Dict of effective display values of chart or series context, or
+    None if its chart does not resolve styles from a stylebook.
+    """
+    if IBaseChart.providedBy(context):
+        return chart_styles(context)
+    chart = aq_parent(aq_inner(context))
+    if not IBaseChart.providedBy(chart):
+        return None
+    styles = series_styles(chart)
+    if styles is None:
+        return None
+    return styles.get(context.getId(), _overrides(context))
+
+
+def styled(chart):
+    """Chart, or a Styled view of it if it resolves styles"""
+    styles = chart_styles(chart)
+    return chart if styles is None else Styled(chart, styles)
+
+
+def record_overrides(context, names, stylebook):
+    """
+    Record values of names (display fields of chart or series context)
+    as overrides of the values inherited from stylebook, or remove the
+    override where equal; returns True if overrides were changed.
+    """
+    chart_values, lines = resolved_styles(stylebook)
+    if IBaseChart.providedBy(context):
+        inherited = chart_values
+    else:
+        chart = aq_parent(aq_inner(context))
+        position = list(chart.objectIds()).index(context.getId())
+        inherited = lines[position] if position < len(lines) else {}
+    current = _overrides(context)
+    overrides = dict(current)
+    for name in names:
+        if name not in inherited:
+            continue  # not a display field of stylebook (or no line)
+        value = getattr(aq_base(context), name, None)
+        if value == inherited[name]:
+            overrides.pop(name, None)
+        else:
+            overrides[name] = value
+    if overrides == dict(current):
+        return False
+    context.style_overrides = PersistentDict(overrides)
+    return True
+
+
+def changed_names(event):
+    """Names of attributes (fields) changed, per descriptions of event"""
+    names = []
+    for description in getattr(event, 'descriptions', None) or ():
+        if IAttributes.providedBy(description):
+            names.extend(description.attributes)
+    return names
+
+
+# event handlers:
+
+def handle_styled_modified(context, event):
+    """
+    Handler for modification of chart or series: record display values
+    edited on a chart resolving styles from a stylebook (or its series)
+    as overrides; overrides are cleared first if the chart is rebound.
+    """
+    chart = context
+    if not IBaseChart.providedBy(context):
+        chart = aq_parent(aq_inner(context))
+    stylebook = bound_stylebook(chart)
+    names = changed_names(event)
+    if chart is context and set(names) & set(REBIND):
+        clear_overrides(chart)
+    if stylebook is not None and names:
+        record_overrides(context, names, stylebook)
@@ -8,7 +8,11 @@ from uu.formlibrary.measure.interfaces import IMeasureGroup
 
 from interfaces import IChartStyleBook, ILineStyle, IBaseChart
 from interfaces import LINESTYLE_TYPE, STYLEBOOK_TYPE
-from browser.styles import clone_chart_styles, MeasureGroupStyles
+from interfaces import resolve_uids
+from browser.styles import clone_chart_styles, clone_line_styles
+from browser.styles import MeasureGroupStyles
+from depindex import get_bindings
+from styleref import inherits
 
 
 class ChartStyleBook(Container):
@@ -51,27 +55,49 @@ def update_quick_line_styles(context, event=None):
                 )
 
 
+def bound_charts(stylebook):
+    """
+    Charts bound to stylebook, found by binding index (see depindex),
+    or until it is built, in the report containing the stylebook.
+    """
+    bookuid = IUUID(stylebook)
+    index = get_bindings()
+    if index is None:
+        report = stylebook.__parent__
+        charts = [o for o in report.objectValues() if IBaseChart.providedBy(o)]
+    else:
+        charts = resolve_uids(index.chart_uids(bookuid))
+    return [
+        o for o in charts
+        if o is not None and getattr(o, 'stylebook', None) == bookuid
+        ]
+
+
 def handle_stylebook_modified(context, event):
     """
-    When stylebook is modified, find any charts in same report
-    that are bound to it, and update them.
+    When stylebook is modified, update any charts bound to it; only
+    values that differ are written, and each chart (or series) changed
+    is reindexed once per transaction.  Charts inheriting styles by
+    reference (see uu.chart.styleref) are not written to at all.
     """
-    bookuid = IUUID(context)
-    report = context.__parent__
-    charts = [o for o in report.objectValues() if IBaseChart.providedBy(o)]
-    if not charts:
-        return
-    bound = [o for o in charts if getattr(o, 'stylebook', None) == bookuid]
-    if not bound:
-        return
-    for target in bound:
-        clone_chart_styles(context, target)
-        target.reindexObject()
+    for target in bound_charts(context):
+        if not inherits(target):
+            clone_chart_styles(context, target)
 
 
 def handle_line_style_modified(context, event):
+    """
+    When a line style is modified, update the line (series) at the same
+    position in each chart bound to its stylebook.
+    """
     stylebook = context.__parent__
-    handle_stylebook_modified(stylebook, None)
+    position = list(stylebook.objectIds()).index(context.getId())
+    for target in bound_charts(stylebook):
+        if inherits(target):
+            continue  # resolves line styles by reference
+        lines = target.objectValues()
+        if position < len(lines):
+            clone_line_styles(context, lines[position])
 
 
 def stylebook_added(context, event):
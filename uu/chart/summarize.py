@@ -0,0 +1,265 @@
+"""
+Vectorized (NumPy) group-by summarization of PointColumns, computing
+aggregates for all keys at once in a few array passes, rather than one
+Python loop per key.
+
+Rows are grouped by a stable sort on the key column; groups are output
+in order of first appearance of their key, as the reference
+implementation (MeasureSeriesProvider.aggregate_function_summarization
+and .weighted_mean_summarization) does.  Notes, combined sample sizes
+and distributions are the same as the reference implementation; sums
+may differ from it in the last bits of precision (NumPy uses pairwise
+summation).  Aggregates that are integers in the reference (COUNT;
+SUM and PRODUCT of integers only; MIN, MAX and odd-sized MEDIAN where
+the value selected is an integer) are output as integers too.
+
+The engine is selected per deployment with the summarization_engine
+setting: 'vectorized' (default, if NumPy is available) or 'reference'.
+"""
+
+from uu.chart.columns import PointColumns, NOSIZE
+from uu.chart.config import setting
+
+try:
+    import numpy
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+
+ENGINES = ('vectorized', 'reference')
+
+ALL_NAN_NOTE = 'All respective forms have N/A values for point'
+
+
+def engine():
+    """Name of configured summarization engine"""
+    name = setting('summarization_engine', 'vectorized')
+    if name not in ENGINES or not HAS_NUMPY:
+        return 'reference'
+    return name
+
+
+class Groups(object):
+    """
+    Grouping of rows of PointColumns by key: order is row indices
+    sorted (stably) by key, and group g spans order[starts[g]:ends[g]];
+    groups are numbered in order of first appearance of key.
+    """
+
+    def __init__(self, points):
+        keys = numpy.asarray(
+            points.keys if points.dated else list(points.keys)
+            )
+        self.size = len(keys)
+        uniq, first, codes = numpy.unique(
+            keys,
+            return_index=True,
+            return_inverse=True,
+            )
+        # renumber groups (sorted by key) by first appearance of key:
+        appearance = numpy.argsort(first, kind='mergesort')
+        rank = numpy.empty(len(appearance), dtype=numpy.intp)
+        rank[appearance] = numpy.arange(len(appearance))
+        self.first = first[appearance]
+        self.codes = rank[codes]
+        self.order = numpy.argsort(self.codes, kind='mergesort')
+        self.counts = numpy.bincount(self.codes, minlength=len(self.first))
+        self.ends = numpy.cumsum(self.counts)
+        self.starts = self.ends - self.counts
+
+    def __len__(self):
+        return len(self.first)
+
+    def rows(self, group):
+        """Row indices of group, in original order"""
+        return self.order[self.starts[group]:self.ends[group]].tolist()
+
+    def reduce(self, ufunc, values, rows=None):
+        """
+        Reduce values of rows (boolean mask, default all) per group with
+        ufunc; returns (result, count) arrays, result for groups without
+        any rows is undefined.
+        """
+        if rows is None:
+            rows = numpy.ones(self.size, dtype=bool)
+        sel = self.order[rows[self.order]]
+        codes = self.codes[sel]
+        count = numpy.bincount(codes, minlength=len(self))
+        result = numpy.zeros(len(self), dtype=numpy.float64)
+        nonempty = numpy.flatnonzero(count)
+        if len(sel):
+            starts = numpy.searchsorted(codes, nonempty)
+            result[nonempty] = ufunc.reduceat(values[sel], starts)
+        return result, count
+
+    def median(self, values, rows):
+        """
+        Median of values of rows (boolean mask) per group, and index of
+        the upper middle row of each group (the median for odd-sized
+        groups; undefined for groups without any rows).
+        """
+        sel = numpy.flatnonzero(rows)
+        sel = sel[numpy.lexsort((values[sel], self.codes[sel]))]
+        codes = self.codes[sel]
+        count = numpy.bincount(codes, minlength=len(self))
+        result = numpy.zeros(len(self), dtype=numpy.float64)
+        middle = numpy.zeros(len(self), dtype=numpy.intp)
+        nonempty = numpy.flatnonzero(count)
+        if len(sel):
+            starts = numpy.searchsorted(codes, nonempty)
+            n = count[nonempty]
+            ordered = values[sel]
+            upper = ordered[starts + n // 2]
+            lower = ordered[starts + (n - 1) // 2]
+            result[nonempty] = numpy.where(
+                n % 2,
+                upper,
+                (lower + upper) / 2.0,
+                )
+            middle[nonempty] = sel[starts + n // 2]
+        return result, middle
+
+    def first_rows(self, rows):
+        """Index of first row of rows (boolean mask) of each group"""
+        result = numpy.zeros(len(self), dtype=numpy.intp)
+        sel = numpy.flatnonzero(rows)
+        result[self.codes[sel][::-1]] = sel[::-1]
+        return result
+
+
+def _arrays(points):
+    """NumPy arrays (views) of values, sample sizes of PointColumns"""
+    values = numpy.frombuffer(points.values, dtype=numpy.float64)
+    sizes = numpy.frombuffer(points.sample_sizes, dtype=numpy.dtype('l'))
+    return values, sizes
+
+
+def _ints(points):
+    """Boolean array marking rows of PointColumns with integer values"""
+    result = numpy.zeros(len(points), dtype=bool)
+    result[list(points.ints)] = True
+    return result
+
+
+def _aggregate(groups, strategy, values, numeric, ints):
+    """
+    Aggregate values of numeric rows per group; returns arrays of values
+    and of flags for values that are integers in reference implementation.
+    """
+    count = numpy.bincount(groups.codes[numeric], minlength=len(groups))
+    if strategy == 'MEDIAN':
+        result, middle = groups.median(values, numeric)
+        return result, (count % 2 == 1) & ints[middle]
+    if strategy == 'COUNT':
+        return count.astype(float), numpy.ones(len(groups), dtype=bool)
+    ufunc = {
+        'SUM': numpy.add,
+        'AVG': numpy.add,
+        'PRODUCT': numpy.multiply,
+        'MIN': numpy.minimum,
+        'MAX': numpy.maximum,
+        }[strategy]
+    result = groups.reduce(ufunc, values, numeric)[0]
+    if strategy == 'AVG':
+        mean = result / numpy.maximum(count, 1)
+        return mean, numpy.zeros(len(groups), dtype=bool)
+    if strategy in ('MIN', 'MAX'):
+        # reference returns the first of the rows with the value:
+        matching = numeric & (values == result[groups.codes])
+        selected = groups.first_rows(matching)
+        return result, ints[selected]
+    floats = numpy.bincount(
+        groups.codes[numeric & ~ints],
+        minlength=len(groups),
+        )
+    return result, floats == 0
+
+
+def _build(points, groups, numeric, value, note, sources=None, ints=None):
+    """
+    Build result PointColumns: one row per group, copied from original
+    for groups with one numeric value, NaN for groups with none, else
+    with value and note (functions of group index) computed, and sample
+    size and distribution of source rows (mask, default all rows); ints
+    flags groups with integer values.
+    """
+    values, sizes = _arrays(points)
+    vcount = numpy.bincount(groups.codes[numeric], minlength=len(groups))
+    combined = groups.reduce(
+        numpy.add,
+        numpy.where(sizes == NOSIZE, 0, sizes).astype(numpy.float64),
+        sources,
+        )[0].astype(numpy.int64)
+    # row index of (first) numeric row for groups with one numeric value:
+    single = numpy.zeros(len(groups), dtype=numpy.intp)
+    numeric_rows = numpy.flatnonzero(numeric)
+    single[groups.codes[numeric_rows][::-1]] = numeric_rows[::-1]
+    result = PointColumns(points.pointcls)
+    for group in xrange(len(groups)):
+        key = points.keys[int(groups.first[group])]
+        count = int(vcount[group])
+        if count == 0:
+            result._append(key, float('NaN'), note=ALL_NAN_NOTE)
+        elif count == 1:
+            result.append_row(points, int(single[group]))
+        else:
+            size = int(combined[group])
+            rows = groups.rows(group)
+            if sources is not None:
+                rows = [idx for idx in rows if sources[idx]]
+            result._append(
+                key,
+                (int if ints is not None and ints[group] else float)(
+                    value[group]
+                    ),
+                note=note(group, count, size),
+                sample_size=size,
+                distribution=points.distribution(rows),
+                )
+    return result
+
+
+def aggregate_summarization(points, strategy, label):
+    """
+    Summarize PointColumns by key with aggregate function named by
+    strategy (SUM, AVG, PRODUCT, MIN, MAX, MEDIAN, COUNT) over numeric
+    values of each key.
+    """
+    if not points:
+        return points
+    groups = Groups(points)
+    values = _arrays(points)[0]
+    numeric = ~numpy.isnan(values)
+    value, ints = _aggregate(groups, strategy, values, numeric, _ints(points))
+    note = lambda group, count, size: u'%s of %s values found.' % (
+        label,
+        count,
+        )
+    return _build(points, groups, numeric, value, note, numeric, ints)
+
+
+def weighted_mean_summarization(points, label='Weighted mean'):
+    """
+    Summarize PointColumns by key with mean of numeric values weighted
+    by sample size (1 for rows without sample size).
+    """
+    if not points:
+        return points
+    groups = Groups(points)
+    if len(groups) == len(points):
+        return points  # no duplicate points for each key
+    values, sizes = _arrays(points)
+    numeric = ~numpy.isnan(values)
+    weights = numpy.where(sizes == NOSIZE, 1, sizes).astype(numpy.float64)
+    weighted = groups.reduce(numpy.add, values * weights, numeric)[0]
+    total = groups.reduce(numpy.add, weights, numeric)[0]
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        value = weighted / total
+    counts = groups.counts
+    note = lambda group, count, size: u'%s of %s sources (N=%s).' % (
+        label,
+        counts[group],
+        size,
+        )
+    return _build(points, groups, numeric, value, note)
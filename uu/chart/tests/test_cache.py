@@ -0,0 +1,79 @@
+from datetime import date
+import shutil
+import tempfile
+import unittest2 as unittest
+
+from uu.chart.cache import LRUCache, ColumnFileStore, ParseCache
+from uu.chart.columns import PointColumns
+from uu.chart.data import TimeSeriesDataPoint, NamedDataPoint
+from uu.chart.ingest import ParsedInput, RejectedRow
+
+
+class LRUCacheTest(unittest.TestCase):
+    """Test size-bounded LRU cache"""
+
+    def test_eviction(self):
+        cache = LRUCache(maxsize=10)
+        cache.set('a', 1, size=4)
+        cache.set('b', 2, size=4)
+        self.assertEqual(cache.get('a'), 1)  # 'a' now most recent
+        cache.set('c', 3, size=4)  # evicts 'b', least recently used
+        self.assertNotIn('b', cache)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.size, 8)
+        cache.set('d', 4, size=11)  # larger than cache, not stored
+        self.assertNotIn('d', cache)
+        cache.discard('a')
+        self.assertEqual(cache.size, 4)
+        self.assertEqual(cache.get('a', 'missing'), 'missing')
+        cache.set(('x', 1), 5, size=1)
+        cache.set(('x', 2), 6, size=1)
+        cache.discard_if(lambda key: key[0] == 'x')
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.size, 4)
+
+
+class ColumnStoreTest(unittest.TestCase):
+    """Test on-disk tier for parsed columns"""
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_roundtrip(self):
+        points = PointColumns(TimeSeriesDataPoint)
+        points.append(date(2014, 1, 1), 1.0, note=u'note \u2713')
+        points.append(date(2014, 2, 1), None, uri='http://example.com/',
+                      sample_size=7)
+        rejected = [RejectedRow(3, [u'x', u'y'], 'Unrecognized date')]
+        store = ColumnFileStore(self.path)
+        store.set('uid1', 'serial01', ParsedInput(points, rejected, 42, 3))
+        self.assertIsNone(store.get('uid1', 'serial02', TimeSeriesDataPoint))
+        self.assertIsNone(store.get('uid2', 'serial01', TimeSeriesDataPoint))
+        parsed = store.get('uid1', 'serial01', TimeSeriesDataPoint)
+        self.assertEqual(parsed.rejected, rejected)
+        self.assertEqual((parsed.offset, parsed.lines), (42, 3))
+        loaded = parsed.columns
+        self.assertEqual(list(loaded.keys), list(points.keys))
+        self.assertEqual(loaded.notes, points.notes)
+        self.assertEqual(loaded.uris, points.uris)
+        self.assertIsNone(loaded.value(1))
+        self.assertEqual(loaded.sample_size(1), 7)
+        # mismatched key type is a miss, not an error:
+        self.assertIsNone(store.get('uid1', 'serial01', NamedDataPoint))
+
+    def test_parse_cache(self):
+        points = PointColumns(NamedDataPoint)
+        points.append(u'a', 1.0)
+        parsed = ParsedInput(points)
+        cache = ParseCache(1024 * 1024, self.path)
+        cache.set('uid1', 'serial01', parsed)
+        self.assertIs(cache.get('uid1', 'serial01', NamedDataPoint), parsed)
+        self.assertIs(cache.latest('uid1', NamedDataPoint), parsed)
+        self.assertIsNone(cache.latest('uid2', NamedDataPoint))
+        cache.memory.clear()
+        loaded = cache.get('uid1', 'serial01', NamedDataPoint)
+        self.assertEqual(loaded.columns.keys, [u'a'])
@@ -0,0 +1,212 @@
+import unittest2 as unittest
+
+from uu.chart.cascade import Cascade, DeferredIndexing, SECURITY_INDEX
+from uu.chart.cascade import publish_transitions, unpublish_transitions
+from uu.chart.cascadejob import STALE_AFTER, CascadeJob
+
+
+class FakeCatalogAware(object):
+
+    def reindexObject(self, idxs=[]):
+        self.reindexed.append(list(idxs))
+
+    def reindexObjectSecurity(self, skip_self=False):
+        self.reindexed.append('security')
+
+
+class FakeItem(DeferredIndexing, FakeCatalogAware):
+
+    def __init__(self, name, state, contents=(), portal_type='Item'):
+        self.name = name
+        self.state = state
+        self.contents = list(contents)
+        self.portal_type = portal_type
+        self.isPrincipiaFolderish = bool(contents)
+        self.parent = None
+        for item in self.contents:
+            item.parent = self
+        self.reindexed = []
+
+    def getPhysicalPath(self):
+        if self.parent is None:
+            return ('', self.name)
+        return self.parent.getPhysicalPath() + (self.name,)
+
+    def contentValues(self):
+        return self.contents
+
+    def unrestrictedTraverse(self, path, default=None):
+        item = self
+        while item.parent is not None:
+            item = item.parent
+        for name in path[2:]:
+            found = [o for o in item.contents if o.name == name]
+            if not found:
+                return default
+            item = found[0]
+        return item
+
+
+class FakeWorkflowTool(object):
+    """Changes state, updating catalog (as CMF workflow tool does)"""
+
+    STATES = {
+        'share': 'visible',
+        'end_collaboration': 'visible',
+        'publish': 'published',
+        'return_for_editing': 'visible',
+        }
+
+    def __init__(self):
+        self.done = []
+        self.chain_lookups = 0
+
+    def getChainFor(self, item):
+        self.chain_lookups += 1
+        if item.portal_type == 'Other':
+            return ('other_workflow',)
+        return ('workspace_workflow',)
+
+    def getStatusOf(self, chain, item):
+        return {'review_state': item.state}
+
+    def doActionFor(self, item, name, comment=None):
+        self.done.append((item.name, name, comment))
+        item.state = self.STATES[name]
+        item.reindexObject(idxs=['review_state'])
+        item.reindexObjectSecurity()
+
+
+def report(*charts):
+    result = FakeItem('report', 'published', charts)
+    result.portal_workflow = FakeWorkflowTool()
+    return result
+
+
+def chart(name, state, *series):
+    return FakeItem(name, state, series, portal_type='Chart')
+
+
+class CascadeTest(unittest.TestCase):
+    """Test single-pass workflow cascade"""
+
+    def test_transitions(self):
+        self.assertEqual(publish_transitions('private'), ['share', 'publish'])
+        self.assertEqual(publish_transitions('private', ('private',)), [])
+        self.assertEqual(publish_transitions('published'), [])
+        self.assertEqual(publish_transitions('pending'), ['publish'])
+        self.assertEqual(
+            publish_transitions('collaborative_editing'),
+            ['end_collaboration', 'publish'],
+            )
+        self.assertEqual(
+            unpublish_transitions('published'),
+            ['return_for_editing'],
+            )
+        self.assertEqual(unpublish_transitions('visible'), [])
+
+    def test_publish(self):
+        s1 = FakeItem('s1', 'visible')
+        s2 = FakeItem('s2', 'private')  # ignored
+        s3 = FakeItem('s3', 'visible')
+        context = report(
+            chart('c1', 'visible', s1, s2),
+            chart('c2', 'private', s3),  # ignored, with contents
+            chart('c3', 'published', FakeItem('s4', 'visible')),
+            FakeItem('doc', 'visible', portal_type='Other'),
+            )
+        cascade = Cascade(context, 'publish', ['report', 'chart'])
+        self.assertIs(cascade.run(), cascade)
+        wftool = context.portal_workflow
+        self.assertEqual(wftool.done, [
+            ('c1', 'publish', 'Publishing item: report'),
+            ('s1', 'publish', 'Publishing item: chart'),
+            ])
+        self.assertEqual(wftool.chain_lookups, 3)  # once per type
+        self.assertEqual(s3.state, 'visible')
+        self.assertEqual(cascade.transitions, 2)
+        # one catalog update per item, when done:
+        c1 = context.contents[0]
+        self.assertEqual(c1.reindexed, [[SECURITY_INDEX, 'review_state']])
+        self.assertEqual(s1.reindexed, [[SECURITY_INDEX, 'review_state']])
+        self.assertEqual(s2.reindexed, [[SECURITY_INDEX]])
+        self.assertEqual(s3.reindexed, [])
+        self.assertEqual(cascade.reindexed, 3)
+        self.assertIn('2 transitions of 2 items', cascade.summary())
+
+    def test_unpublish(self):
+        s1 = FakeItem('s1', 'published')
+        context = report(
+            chart('c1', 'published', s1, FakeItem('s2', 'visible')),
+            chart('c2', 'visible', FakeItem('s3', 'published')),
+            )
+        cascade = Cascade(context, 'unpublish', ['report']).run()
+        self.assertEqual(
+            [(name, t) for name, t, c in context.portal_workflow.done],
+            [('c1', 'return_for_editing'), ('s1', 'return_for_editing')],
+            )
+        self.assertEqual(
+            set(c for name, t, c in context.portal_workflow.done),
+            set(['Un-publishing item: report']),
+            )
+        self.assertEqual(cascade.reindexed, 3)
+        # catalog is updated as usual outside a cascade:
+        s1.reindexObject(idxs=['Title'])
+        self.assertEqual(s1.reindexed[-1], ['Title'])
+
+
+class CascadeJobTest(unittest.TestCase):
+    """Test chunked background cascade jobs"""
+
+    def test_run_chunk(self):
+        series = [FakeItem('s%s' % i, 'visible') for i in range(4)]
+        context = report(
+            chart('c1', 'visible', *series[:3]),
+            chart('c2', 'visible', series[3]),
+            )
+        cascade = Cascade(context, 'publish', ['report', 'chart'])
+        steps = cascade.prepare()
+        job = CascadeJob('publish', [
+            (item.getPhysicalPath(), names, comment, under)
+            for item, names, comment, under in steps
+            ])
+        self.assertEqual(job.info()['total'], 6)
+        context.contents[1].contents = []  # s3 removed since planned
+        job.run_chunk(context, size=3)
+        self.assertEqual(job.status, 'running')
+        self.assertEqual((job.position, job.transitions), (3, 3))
+        self.assertEqual(series[2].state, 'visible')
+        job.run_chunk(context, size=3)
+        self.assertEqual(job.status, 'done')
+        self.assertFalse(job.running())
+        self.assertEqual(job.info()['done'], 6)
+        self.assertEqual(job.transitions, 5)
+        self.assertEqual(series[3].state, 'visible')
+        self.assertEqual(
+            [name for name, t, c in context.portal_workflow.done],
+            ['c1', 's0', 's1', 's2', 'c2'],
+            )
+        # series in chunk after its chart still updated for security:
+        self.assertEqual(
+            series[2].reindexed,
+            [[SECURITY_INDEX, 'review_state']],
+            )
+
+    def test_queue(self):
+        job = CascadeJob('publish', [])
+        self.assertIsNone(job.info()['queued'])
+        job.queue('unpublish', [{'a': 1}], 'editor')
+        job.queue('publish', [{'b': 2}], 'admin')  # latest wins
+        self.assertEqual(job.queued, ('publish', ({'b': 2},), 'admin'))
+        self.assertEqual(job.info()['queued'], 'publish')
+
+    def test_stale(self):
+        job = CascadeJob('publish', [((), (), None, False)])
+        self.assertTrue(job.running())
+        job.heartbeat -= STALE_AFTER + 1  # e.g. worker process restarted
+        self.assertTrue(job.stale())
+        self.assertFalse(job.running())
+        self.assertEqual(job.info()['status'], 'failed')
+        job.status = 'done'
+        self.assertFalse(job.stale())
+        self.assertEqual(job.info()['status'], 'done')
@@ -0,0 +1,187 @@
+from datetime import date, datetime
+import math
+import unittest2 as unittest
+
+from uu.chart.columns import Distribution, PointColumns, merge_keys
+from uu.chart.data import TimeSeriesDataPoint, NamedDataPoint
+from uu.chart.interfaces import ITimeSeriesDataPoint, INamedDataPoint
+
+
+class PointColumnsTest(unittest.TestCase):
+    """Test columnar point storage"""
+
+    def _timeseries(self):
+        points = PointColumns(TimeSeriesDataPoint)
+        points.append(date(2014, 1, 1), 1.5)
+        points.append(datetime(2014, 2, 1, 12, 30), None, note=u'N/A')
+        points.append(date(2014, 3, 1), 3, uri='http://example.com/',
+                      sample_size=12.0)
+        return points
+
+    def test_columns(self):
+        points = self._timeseries()
+        self.assertEqual(len(points), 3)
+        self.assertEqual(list(points.keys), [
+            date(2014, 1, 1).toordinal(),
+            date(2014, 2, 1).toordinal(),
+            date(2014, 3, 1).toordinal(),
+            ])
+        self.assertEqual(points.values[0], 1.5)
+        self.assertTrue(math.isnan(points.values[1]))
+        self.assertIsNone(points.value(1))  # None preserved, not NaN
+        self.assertEqual(points.sample_size(2), 12)
+        self.assertIsNone(points.sample_size(0))
+        self.assertEqual(points.notes, {1: u'N/A'})
+        self.assertEqual(points.uris, {2: 'http://example.com/'})
+
+    def test_ints(self):
+        points = self._timeseries()
+        self.assertEqual(points.ints, set([2]))
+        self.assertIs(type(points.value(2)), int)  # not 3.0
+        self.assertIs(type(points[2].value), int)
+        self.assertIs(type(points[1:][1].value), int)
+        loaded = PointColumns.fromstring(TimeSeriesDataPoint,
+                                         points.tostring())
+        self.assertEqual(loaded.ints, points.ints)
+
+    def test_lazy_points(self):
+        points = self._timeseries()
+        p = points[1]
+        self.assertTrue(ITimeSeriesDataPoint.providedBy(p))
+        self.assertEqual(p.identity(), date(2014, 2, 1))
+        self.assertEqual(p.note, u'N/A')
+        self.assertIsNone(p.value)
+        self.assertEqual(points[-1].uri, 'http://example.com/')
+        self.assertEqual(
+            [p.date for p in points],
+            points.identities(),
+            )
+        self.assertRaises(IndexError, lambda: points[3])
+        self.assertEqual(len(points[1:]), 2)
+
+    def test_crop(self):
+        points = self._timeseries()
+        cropped = points.crop(date(2014, 2, 1), None)
+        self.assertEqual(len(cropped), 2)
+        self.assertEqual(cropped.notes, {0: u'N/A'})
+        excluded = points.crop(date(2014, 2, 1), None, excluded=True)
+        self.assertEqual(excluded.identities(), [date(2014, 1, 1)])
+        self.assertEqual(len(points.crop(None, None)), 3)
+
+    def test_sorted_crop(self):
+        points = PointColumns(TimeSeriesDataPoint)
+        for month in (5, 1, 3, 3, 2, 4):
+            points.append(date(2014, month, 1), month, note=str(month))
+        ordered = points.sorted_by_key()
+        self.assertTrue(ordered.ordered)
+        self.assertFalse(points.ordered)
+        self.assertEqual([d.month for d in ordered.identities()],
+                         [1, 2, 3, 3, 4, 5])
+        self.assertIs(ordered.sorted_by_key(), ordered)
+        for start, end in [
+                (date(2014, 2, 1), date(2014, 3, 15)),
+                (date(2014, 2, 15), None),
+                (None, date(2013, 1, 1)),
+                (date(2014, 6, 1), None),
+                ]:
+            for excluded in (False, True):
+                cropped = ordered.crop(start, end, excluded)
+                scanned = points.crop(start, end, excluded).sorted_by_key()
+                self.assertEqual(list(cropped.keys), list(scanned.keys))
+                self.assertEqual(
+                    [p.note for p in cropped],
+                    [p.note for p in scanned],
+                    )
+        self.assertIs(ordered.crop(None, None), ordered)
+        self.assertEqual(ordered.bounds(date(2014, 3, 1), date(2014, 3, 1)),
+                         (2, 4))
+
+    def test_slice_extend(self):
+        points = self._timeseries()
+        head = points[:2]
+        self.assertEqual(len(head), 2)
+        self.assertEqual(head.notes, {1: u'N/A'})
+        self.assertIsNone(head.value(1))
+        tail = points[1:]
+        self.assertEqual(tail.uris, {1: 'http://example.com/'})
+        head.extend(points[2:])
+        self.assertEqual(list(head.keys), list(points.keys))
+        self.assertEqual(head.uris, points.uris)
+        self.assertEqual(head.nulls, points.nulls)
+        self.assertEqual(len(points), 3)  # source unmodified
+        self.assertEqual(len(points[2:1]), 0)
+
+    def test_named(self):
+        points = PointColumns(NamedDataPoint)
+        points.append(u'a', 1.0)
+        points.append(u'b', 2.0, note=u'note')
+        self.assertFalse(points.dated)
+        self.assertEqual(points.identities(), [u'a', u'b'])
+        self.assertTrue(INamedDataPoint.providedBy(points[1]))
+        self.assertEqual(points[1].name, u'b')
+        copy = PointColumns.from_points(NamedDataPoint, points)
+        self.assertEqual(list(copy.keys), [u'a', u'b'])
+        self.assertEqual(copy.notes, {1: u'note'})
+
+    def test_distribution(self):
+        points = self._timeseries()
+        distribution = points.distribution([0, 1, 2])
+        self.assertEqual(
+            list(distribution),
+            [(1.5, None), (None, None), (3.0, 12)],
+            )
+        self.assertEqual(
+            distribution,
+            Distribution.from_dicts([
+                {'value': 1.5, 'sample_size': None},
+                {'value': float('NaN'), 'sample_size': None},
+                {'value': 3, 'sample_size': 12},
+                ]),
+            )
+        points.append(date(2014, 4, 1), 2.25, sample_size=12,
+                      distribution=distribution)
+        self.assertIs(points.distributions[3], distribution)
+        self.assertIs(points[3].distribution, distribution)
+        loaded = PointColumns.fromstring(TimeSeriesDataPoint,
+                                         points.tostring())
+        self.assertEqual(loaded.distributions, {3: distribution})
+        # integer values stay integers, as point values do:
+        for source in (distribution, loaded.distributions[3]):
+            self.assertEqual(
+                [type(value) for value, size in source],
+                [float, type(None), int],
+                )
+        self.assertEqual(
+            [type(value) for value, size in Distribution.from_pairs(
+                [(2, None), (2.0, 1)])],
+            [int, float],
+            )
+        # list of dict (e.g. from other point providers) is converted:
+        points.append(date(2014, 5, 1), 1.0, sample_size=1,
+                      distribution=[{'value': 1.0, 'sample_size': 1}])
+        self.assertEqual(list(points.distributions[4]), [(1.0, 1)])
+
+    def test_slots(self):
+        point = self._timeseries()[0]
+        self.assertFalse(hasattr(point, '__dict__'))
+        self.assertRaises(AttributeError, setattr, point, 'other', 1)
+
+    def test_merge_keys(self):
+        points = PointColumns(TimeSeriesDataPoint)
+        for month in (3, 1, 2, 1):
+            points.append(date(2014, month, 1), 1.0)
+        other = [date(2013, 12, 1).toordinal(), date(2014, 2, 1).toordinal()]
+        self.assertEqual(
+            map(date.fromordinal, merge_keys([points.keys, other, []])),
+            [date(2013, 12, 1)] + [date(2014, m, 1) for m in (1, 2, 3)],
+            )
+        self.assertEqual(merge_keys([]), [])
+
+    def test_invalid_date(self):
+        points = PointColumns(TimeSeriesDataPoint)
+        self.assertRaises(ValueError, points.append, u'2014-01-01', 1.0)
+
+    def test_empty(self):
+        points = PointColumns(TimeSeriesDataPoint)
+        self.assertFalse(points)
+        self.assertEqual(list(points), [])
@@ -0,0 +1,43 @@
+from datetime import date
+import unittest2 as unittest
+
+from uu.chart.browser.datelabel import LabelFormatter, label_formatter
+
+
+class LabelFormatterTest(unittest.TestCase):
+    """Test locale date label formatting"""
+
+    def test_formats(self):
+        d = date(2014, 2, 1)
+        for usage, expected in (
+                ('abbr', u'Feb'),
+                ('abbr+year', u'Feb 2014'),
+                ('name', u'February'),
+                ('name+year', u'February 2014'),
+                ('locale', '02/01/2014'),
+                ):
+            self.assertEqual(LabelFormatter('en_US', usage)(d), expected)
+
+    def test_locale(self):
+        d = date(2014, 2, 1)
+        self.assertEqual(
+            LabelFormatter('fr_FR', 'name+year')(d),
+            u'f\xe9vrier 2014',
+            )
+        self.assertEqual(LabelFormatter('fr_FR', 'abbr')(d), u'Feb')
+        # unknown locale: default names
+        self.assertEqual(LabelFormatter('xx_YY', 'name')(d), u'February')
+
+    def test_shared(self):
+        formatter = label_formatter('en_US', 'name')
+        self.assertIs(label_formatter('en_US', 'name'), formatter)
+        self.assertIsNot(label_formatter('en_US', 'abbr'), formatter)
+        dates = [date(2014, month, 1) for month in (1, 2, 3)]
+        self.assertEqual(
+            formatter.labels(dates),
+            {
+                dates[0]: u'January',
+                dates[1]: u'February',
+                dates[2]: u'March',
+            },
+            )
@@ -0,0 +1,44 @@
+import unittest2 as unittest
+
+from uu.chart.depindex import DependencyIndex, StyleBindingIndex
+
+
+class DependencyIndexTest(unittest.TestCase):
+    """Test reverse dependency index of measure series providers"""
+
+    def test_index(self):
+        index = DependencyIndex()
+        index.index('p1', ('m1', 'd1'), 'c1', 'r1')
+        index.index('p2', ('m1', 'd2'), 'c2', 'r1')
+        index.index('p3', ('m2', None), 'c2', None)
+        self.assertEqual(index.provider_uids('m1'), ['p1', 'p2'])
+        self.assertEqual(index.provider_uids('d2'), ['p2'])
+        self.assertEqual(index.chart_uids('m1'), ['c1', 'c2'])
+        self.assertEqual(index.report_uids('m1'), ['r1'])
+        self.assertEqual(index.report_uids('m2'), [])
+        self.assertEqual(index.provider_uids('unknown'), [])
+        # rebinding provider to other measure:
+        index.index('p1', ('m2', 'd1'), 'c1', 'r1')
+        self.assertEqual(index.provider_uids('m1'), ['p2'])
+        self.assertEqual(index.chart_uids('m2'), ['c1', 'c2'])
+        # removal:
+        index.unindex('p2')
+        index.unindex('p2')  # not indexed: ignored
+        self.assertNotIn('m1', index.providers)
+        self.assertEqual(index.provider_uids('d2'), [])
+        self.assertEqual(sorted(index.info), ['p1', 'p3'])
+
+    def test_bindings(self):
+        index = StyleBindingIndex()
+        index.bind('c1', 's1')
+        index.bind('c2', 's1')
+        index.bind('c3', None)  # unbound: not indexed
+        self.assertEqual(index.chart_uids('s1'), ['c1', 'c2'])
+        self.assertNotIn('c3', index.bound)
+        index.bind('c1', 's2')  # rebound
+        self.assertEqual(index.chart_uids('s1'), ['c2'])
+        self.assertEqual(index.chart_uids('s2'), ['c1'])
+        index.bind('c2', None)
+        self.assertNotIn('s1', index.charts)
+        self.assertEqual(index.chart_uids('s1'), [])
+        self.assertEqual(dict(index.bound), {'c1': 's2'})
@@ -0,0 +1,142 @@
+import csv
+from datetime import date
+from StringIO import StringIO
+import unittest2 as unittest
+
+from uu.formlibrary.utils import normalize_usa_date
+
+from uu.chart.data import TimeSeriesDataPoint, NamedDataPoint
+from uu.chart.ingest import parse_series, parse_input, detect_date_format
+
+
+SAMPLE = u"""
+1/1/2014,5,first note
+2/1/2014,6.5,,http://example.com/
+03/01/2014,nan
+not a date,4
+4/1/2014,not a number
+5/1/2014
+2/30/2014,3
+6/1/2014,2,note,,12
+7/1/2014,2,note,,x
+8/1/2014,1e2,note,,
+""".strip()
+
+
+def reference_rows(text, keytype):
+    """
+    Per-row parse, as the original loop on the content type did it, but
+    skipping rows with invalid sample size (rather than failing).
+    """
+    result = []
+    for row in csv.reader(StringIO(text)):
+        note = uri = sample_size = None
+        if len(row) < 2:
+            continue
+        try:
+            key = row[0]
+            if keytype == date:
+                key = normalize_usa_date(key)
+            value = float(row[1])
+        except ValueError:
+            continue
+        if len(row) >= 3:
+            note = row[2]
+        if len(row) >= 4:
+            uri = row[3]
+        if len(row) >= 5:
+            try:
+                sample_size = int(row[4]) if row[4].strip() else None
+            except ValueError:
+                continue
+        result.append((key, value, note, uri, sample_size))
+    return result
+
+
+def column_rows(columns):
+    return [
+        (p.identity(), p.value, p.note, p.uri, p.sample_size)
+        for p in columns
+        ]
+
+
+class IngestTest(unittest.TestCase):
+    """Test bulk ingest of CSV series input"""
+
+    def assertSameRows(self, a, b):
+        self.assertEqual(len(a), len(b))
+        for row_a, row_b in zip(a, b):
+            # compare NaN values as equal:
+            self.assertEqual(repr(row_a), repr(row_b))
+
+    def test_timeseries(self):
+        columns, rejected = parse_series(SAMPLE, TimeSeriesDataPoint)
+        self.assertSameRows(
+            column_rows(columns),
+            reference_rows(SAMPLE, date),
+            )
+        self.assertEqual(
+            [(r.line, r.reason) for r in rejected],
+            [
+                (4, 'Unrecognized date'),
+                (5, 'Non-numeric value'),
+                (6, 'Missing value'),
+                (7, 'Unrecognized date'),
+                (9, 'Invalid sample size'),
+            ])
+
+    def test_named(self):
+        text = u'a,1\nb,2,note\nc,x\n'
+        columns, rejected = parse_series(text, NamedDataPoint)
+        self.assertSameRows(
+            column_rows(columns),
+            reference_rows(text, unicode),
+            )
+        self.assertEqual(len(rejected), 1)
+
+    def test_detect_format(self):
+        self.assertEqual(detect_date_format(['x', '1/2/2014']).name, 'usa')
+        self.assertIsNone(detect_date_format(['x', 'y']))
+
+    def test_empty(self):
+        columns, rejected = parse_series(u'', TimeSeriesDataPoint)
+        self.assertEqual(len(columns), 0)
+        self.assertEqual(rejected, [])
+
+    def test_large(self):
+        rows = [
+            '%s/%s/%s,%s' % (m, d, y, m * d * 1.5)
+            for y in range(1990, 2014)
+            for m in range(1, 13)
+            for d in range(1, 29)
+            ]
+        text = '\n'.join(rows)
+        columns, rejected = parse_series(text, TimeSeriesDataPoint)
+        self.assertEqual(rejected, [])
+        self.assertSameRows(
+            column_rows(columns),
+            reference_rows(text, date),
+            )
+
+    def test_incremental(self):
+        text = SAMPLE + u'\n9/1/2014,7\n10/1/20'  # last row incomplete
+        previous = parse_input(text, TimeSeriesDataPoint)
+        count = len(previous.columns)
+        appended = text + u'14,8,"multi\nline note"\n11/1/2014,x\n'
+        parsed = parse_input(appended, TimeSeriesDataPoint, previous)
+        self.assertEqual(parsed.offset, len(appended))
+        full = parse_input(appended, TimeSeriesDataPoint)
+        self.assertSameRows(column_rows(parsed.columns),
+                            column_rows(full.columns))
+        self.assertSameRows(column_rows(parsed.columns),
+                            reference_rows(appended, date))
+        self.assertEqual(parsed.rejected, full.rejected)
+        self.assertEqual(parsed.rejected[-1].line, 14)
+        self.assertEqual(parsed.columns.notes[6], u'multi\nline note')
+        # previous parse not modified:
+        self.assertEqual(len(previous.columns), count)
+        # changed (not appended) input is parsed in full:
+        edited = u'1/1/2013,1' + appended[8:]
+        self.assertFalse(previous.resumable(edited))
+        parsed = parse_input(edited, TimeSeriesDataPoint, previous)
+        self.assertEqual(parsed.columns.identity(0), date(2013, 1, 1))
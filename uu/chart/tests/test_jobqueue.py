@@ -0,0 +1,55 @@
+import unittest2 as unittest
+
+from uu.chart.jobqueue import HISTORY, OTHER, PUBLISHED
+from uu.chart.jobqueue import RefreshQueue, run_job
+
+
+class RefreshQueueTest(unittest.TestCase):
+    """Test persistent queue of refresh jobs"""
+
+    def test_order_dedup(self):
+        queue = RefreshQueue()
+        self.assertTrue(queue.add('a'))
+        self.assertTrue(queue.add('b'))
+        self.assertTrue(queue.add('c', PUBLISHED))
+        self.assertFalse(queue.add('a'))  # duplicate
+        self.assertFalse(queue.add('c'))  # queued at higher priority
+        self.assertTrue(queue.add('b', PUBLISHED))  # raises priority
+        self.assertEqual(queue.depth(), 3)
+        self.assertEqual(queue.depth_by_priority(), {PUBLISHED: 2, OTHER: 1})
+        self.assertIn('a', queue)
+        order = []
+        while True:
+            key = queue.pop()
+            if key is None:
+                break
+            order.append(key[2])
+        self.assertEqual(order, ['c', 'b', 'a'])
+        self.assertEqual(queue.depth(), 0)
+        self.assertNotIn('a', queue)
+
+    def test_run_job(self):
+        queue = RefreshQueue()
+        for uid in ('a', 'b'):
+            queue.add(uid)
+        refreshed = []
+        refresh = lambda uid: refreshed.append(uid) or '/site/%s' % uid
+        self.assertEqual(run_job(queue, refresh)[2], 'a')
+        self.assertEqual(run_job(queue, refresh)[2], 'b')
+        self.assertIsNone(run_job(queue, refresh))
+        self.assertEqual(refreshed, ['a', 'b'])
+        self.assertEqual(queue.done(), 2)
+        recent = queue.recent()
+        self.assertEqual(
+            [job['path'] for job in recent],
+            ['/site/b', '/site/a'],
+            )
+        self.assertTrue(all(job['status'] == 'ok' for job in recent))
+
+    def test_history(self):
+        queue = RefreshQueue()
+        for i in range(HISTORY + 5):
+            queue.add(str(i))
+            queue.record(queue.pop(), None, 0, 'ok')
+        self.assertEqual(len(queue.history), HISTORY)
+        self.assertEqual(queue.done(), HISTORY + 5)
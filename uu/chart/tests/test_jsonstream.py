@@ -0,0 +1,99 @@
+import json
+import unittest2 as unittest
+
+from uu.chart.browser.jsonstream import LazyArray, RawJSON
+from uu.chart.browser.jsonstream import iterencode, write_json
+
+
+SAMPLE = [
+    [
+        'uid1',
+        {
+            'series': [
+                {
+                    'data': [('2014-01-01', {'value': 1.5, 'note': None})],
+                    'title': u'Series \u2713',
+                },
+            ],
+            'labels': {'2014-01-01': 'Jan 2014'},
+            'goal': 3,
+            'empty': [],
+        },
+    ],
+    ['uid2', {}],
+]
+
+
+def lazy(obj):
+    """Copy of obj, with every list replaced by LazyArray"""
+    if isinstance(obj, dict):
+        return dict((k, lazy(v)) for k, v in obj.items())
+    if isinstance(obj, list):
+        return LazyArray(lazy(v) for v in obj)
+    return obj
+
+
+class MockResponse(object):
+
+    def __init__(self):
+        self.headers = {}
+        self.written = []
+
+    def setHeader(self, name, value):
+        self.headers[name.lower()] = value
+
+    def write(self, data):
+        self.written.append(data)
+
+
+class JSONStreamTest(unittest.TestCase):
+    """Test streaming JSON encoder"""
+
+    def test_same_as_dumps(self):
+        for obj in (SAMPLE, SAMPLE[0][1], [], {}, 1, 'x'):
+            self.assertEqual(
+                ''.join(iterencode(lazy(obj), indent=2)),
+                json.dumps(obj, indent=2),
+                )
+            self.assertEqual(
+                ''.join(iterencode(lazy(obj))),
+                json.dumps(obj, separators=(',', ':')),
+                )
+
+    def test_raw(self):
+        chart = SAMPLE[0][1]
+        for indent in (2, None):
+            raw = RawJSON(''.join(iterencode(chart, indent)))
+            self.assertEqual(
+                ''.join(iterencode(LazyArray([['uid1', raw]]), indent)),
+                ''.join(iterencode([['uid1', chart]], indent)),
+                )
+
+    def test_encoded(self):
+        items = [{'a': [1, 2]}, u'\u2713', None]
+        for indent in (2, None):
+            seps = (', ', ': ') if indent else (',', ':')
+            texts = [
+                json.dumps(v, indent=indent, separators=seps) for v in items
+                ]
+            encoded = {'data': LazyArray(texts, encoded=True)}
+            self.assertEqual(
+                ''.join(iterencode([encoded], indent)),
+                json.dumps([{'data': items}], indent=indent, separators=seps),
+                )
+
+    def test_write_json(self):
+        response = MockResponse()
+        body = write_json(response, iterencode(lazy(SAMPLE)))
+        self.assertEqual(json.loads(body), json.loads(json.dumps(SAMPLE)))
+        self.assertEqual(response.headers['content-length'], str(len(body)))
+        self.assertEqual(response.written, [])
+        # larger than threshold: streamed, without known length
+        response = MockResponse()
+        body = write_json(response, iterencode(lazy(SAMPLE)), threshold=16)
+        self.assertEqual(body, '')
+        self.assertNotIn('content-length', response.headers)
+        self.assertEqual(
+            ''.join(response.written),
+            ''.join(iterencode(SAMPLE)),
+            )
@@ -0,0 +1,26 @@
+from datetime import date
+import unittest2 as unittest
+
+from uu.chart.columns import PointColumns
+from uu.chart.data import TimeSeriesDataPoint
+from uu.chart.materialize import MaterializedData
+
+
+class MaterializedDataTest(unittest.TestCase):
+    """Test stored data of materialized measure series"""
+
+    def test_store(self):
+        record = MaterializedData()
+        self.assertTrue(record.stale)
+        self.assertIsNone(record.data(TimeSeriesDataPoint))
+        points = PointColumns(TimeSeriesDataPoint)
+        points.append(date(2014, 1, 1), 1.5, note=u'x')
+        points.append(date(2014, 2, 1), None, sample_size=3)
+        record.store(points)
+        self.assertFalse(record.stale)
+        self.assertIsNotNone(record.updated)
+        self.assertIs(record.data(TimeSeriesDataPoint), points)
+        del record._v_data  # as when loaded from database
+        loaded = record.data(TimeSeriesDataPoint)
+        self.assertEqual(loaded.tostring(), points.tostring())
+        self.assertEqual(loaded.notes, {0: u'x'})
@@ -0,0 +1,29 @@
+import unittest2 as unittest
+
+from uu.chart.parallel import _environ, request_location
+
+
+class FakeRequest(dict):
+    """Request behind a virtual host, as set up by VirtualHostMonster"""
+
+    _script = ['site%20name']
+
+
+class ParallelTest(unittest.TestCase):
+    """Test worker requests of concurrent computation"""
+
+    def test_location(self):
+        request = FakeRequest(
+            SERVER_URL='https://example.org',
+            VirtualRootPhysicalPath=('', 'site'),
+            )
+        location = request_location(request)
+        self.assertEqual(
+            location,
+            ('https://example.org', ('site%20name',), ('', 'site')),
+            )
+        self.assertEqual(
+            _environ(location),
+            {'SERVER_URL': 'https://example.org', 'SCRIPT_NAME': '/site name'},
+            )
+        self.assertIsNone(_environ(None))
@@ -0,0 +1,112 @@
+import unittest2 as unittest
+
+from uu.chart.browser.report import ReportView, batch
+
+
+class FakeBrain(object):
+
+    def __init__(self, obj):
+        self.obj = obj
+        self.portal_type = obj.portal_type
+        self.loaded = False
+
+    def getObject(self):
+        self.loaded = True
+        return self.obj
+
+
+class FakeElement(object):
+
+    def __init__(self, name, portal_type, expired=False):
+        self.name = name
+        self.portal_type = portal_type
+        self.expired = expired
+
+
+class FakeCatalog(object):
+    """Catalog omitting expired content, unless show_inactive is set"""
+
+    def __init__(self, brains):
+        self.brains = brains
+        self.queries = []
+
+    def searchResults(self, query, show_inactive=False):
+        self.queries.append(query)
+        types = query['portal_type']
+        return [
+            b for b in self.brains
+            if b.portal_type in types and (show_inactive or not b.obj.expired)
+            ]
+
+
+class FakeReport(object):
+
+    def __init__(self, types, expired=()):
+        self.portal_catalog = FakeCatalog([
+            FakeBrain(FakeElement('e%s' % i, portal_type, i in expired))
+            for i, portal_type in enumerate(types)
+            ])
+
+    def getPhysicalPath(self):
+        return ('', 'site', 'report')
+
+
+CHART, PAGE = 'uu.chart.timeseries', 'Document'
+
+
+class ReportViewTest(unittest.TestCase):
+    """Test catalog-driven batching and paging of report elements"""
+
+    def view(self, types, page_size):
+        view = ReportView(FakeReport(types), None)
+        view.page_size = lambda: page_size
+        return view
+
+    def test_batch(self):
+        items = range(10)
+        self.assertEqual(batch(items), items)
+        self.assertEqual(batch(items, 8), [8, 9])
+        self.assertEqual(batch(items, 2, 3), [2, 3, 4])
+
+    def test_size(self):
+        view = self.view([CHART, PAGE, CHART, CHART], 2)
+        self.assertEqual(view.size(), 3)
+        brains = view.context.portal_catalog.brains
+        self.assertFalse([b for b in brains if b.loaded])
+
+    def test_page(self):
+        view = self.view([CHART, PAGE, CHART, CHART, PAGE], 2)
+        brains = view.context.portal_catalog.brains
+        first = view.page()
+        self.assertEqual([e.name for e in first['elements']], ['e0', 'e1'])
+        self.assertEqual(first['plots'], 1)
+        self.assertEqual(first['offset'], 0)
+        self.assertEqual(first['next'], 2)
+        self.assertEqual(first['total'], 5)
+        # only elements of page are loaded:
+        loaded = [b.loaded for b in brains]
+        self.assertEqual(loaded, [True, True, False, False, False])
+        second = view.page(2)
+        self.assertEqual([e.name for e in second['elements']], ['e2', 'e3'])
+        self.assertEqual((second['plots'], second['offset']), (2, 1))
+        self.assertEqual(second['next'], 4)
+        last = view.page(4)
+        self.assertEqual((last['plots'], last['offset']), (0, 3))
+        self.assertIsNone(last['next'])
+        self.assertIs(view.page(2), second)  # memoized
+        self.assertEqual(len(view.context.portal_catalog.queries), 1)
+
+    def test_unpaged(self):
+        view = self.view([CHART, PAGE, CHART], None)
+        page = view.page()
+        self.assertEqual(len(page['elements']), 3)
+        self.assertEqual(page['plots'], 2)
+        self.assertIsNone(page['next'])
+        self.assertEqual(self.view([], None).page()['elements'], [])
+
+    def test_expired(self):
+        view = ReportView(FakeReport([CHART, PAGE, CHART], expired=[2]), None)
+        view.page_size = lambda: None
+        self.assertEqual(view.size(), 2)
+        names = [e.name for e in view.page()['elements']]
+        self.assertEqual(names, ['e0', 'e1', 'e2'])
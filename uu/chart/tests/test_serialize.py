@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+from datetime import date
+import json
+import unittest2 as unittest
+
+from uu.chart.browser.jsonstream import LazyArray, iterencode
+from uu.chart.browser.serialize import ChartJSON
+from uu.chart.columns import PointColumns
+from uu.chart.data import NamedDataPoint, TimeSeriesDataPoint
+from uu.chart.handlers import MEMBERS, PUBLIC, SNAPSHOT, audience
+from uu.chart import summarize
+
+
+class MockSeries(object):
+    title = u'Series ✓'
+
+
+class MockChart(object):
+    """Chart with snapshot of review state, without workflow"""
+
+    def __init__(self, state):
+        setattr(self, SNAPSHOT, state)
+
+
+def chart_json(data, show_notes=True):
+    """ChartJSON for one series of data, without a chart context"""
+    adapter = ChartJSON.__new__(ChartJSON)
+    adapter.context = None
+    adapter.show_notes = adapter.show_uris = show_notes
+    adapter._data = [(MockSeries(), data)]
+    return adapter
+
+
+class ChartJSONTest(unittest.TestCase):
+    """Test batch point serialization against point dicts"""
+
+    def _points(self, pointcls=TimeSeriesDataPoint):
+        points = PointColumns(pointcls)
+        for i, (value, note, uri, size) in enumerate((
+                (1.5, None, None, None),
+                (None, u'N/A ✓', None, 3),
+                (float('NaN'), 'note "quoted" %s', 'http://example.com/', 0),
+                (float('inf'), None, None, None),
+                (1e-20, 'utf-8 \xc3\xa9', None, 12),
+                (5, None, None, None),
+                )):
+            if pointcls is TimeSeriesDataPoint:
+                key = date(2014, i + 1, 1)
+            else:
+                key = u'name \xe9 %s' % i
+            points.append(key, value, note=note, uri=uri, sample_size=size)
+        return points
+
+    def assertSameJSON(self, data):
+        for show_notes in (True, False):
+            adapter = chart_json(data, show_notes)
+            for compact, indent in ((False, 2), (True, None)):
+                seps = (',', ':') if compact else (', ', ': ')
+                expected = json.dumps(
+                    adapter._series_list(),
+                    indent=indent,
+                    separators=seps,
+                    )
+                series = LazyArray(adapter._iterseries(True, compact))
+                self.assertEqual(
+                    ''.join(iterencode(series, indent)),
+                    expected,
+                    )
+
+    def test_timeseries(self):
+        self.assertSameJSON(self._points())
+
+    def test_named(self):
+        self.assertSameJSON(self._points(NamedDataPoint))
+
+    @unittest.skipUnless(summarize.HAS_NUMPY, 'NumPy not installed')
+    def test_distributions(self):
+        points = self._points()
+        points.extend(self._points())
+        result = summarize.weighted_mean_summarization(points, u'Mean')
+        self.assertSameJSON(result)
+        series = LazyArray(chart_json(result)._iterseries(True, True))
+        data = json.loads(''.join(iterencode(series, None)))[0]['data']
+        distribution = data[5][1]['distribution']
+        self.assertEqual(
+            [repr(item['value']) for item in distribution],
+            ['5', '5'],  # integer values, as in the source points
+            )
+
+    def test_variants(self):
+        self.assertEqual(audience(MockChart('published')), PUBLIC)
+        self.assertEqual(audience(MockChart('visible')), MEMBERS)
+        public = ChartJSON(MockChart('visible'), PUBLIC)
+        self.assertFalse(public.show_notes or public.show_uris)
+        members = ChartJSON(MockChart('published'), MEMBERS)
+        self.assertTrue(members.show_notes and members.show_uris)
+        self.assertEqual(ChartJSON(MockChart('published')).variant, PUBLIC)
@@ -0,0 +1,134 @@
+import unittest2 as unittest
+
+import transaction
+from zope.interface import alsoProvides
+
+from uu.chart.browser.styles import clear_overrides, clone_chart_styles
+from uu.chart.browser.styles import copy_plan
+from uu.chart.interfaces import IBaseChart, IChartStyleBook, ILineDisplayCore
+from uu.chart.styleref import Styled, chart_styles, series_styles
+from uu.chart.styleref import effective_styles, record_overrides
+
+
+class MockStyled(object):
+    """Chart, stylebook or line with attribute writes recorded"""
+
+    def __init__(self, name, lines=(), **kwargs):
+        self.__dict__.update(kwargs)
+        self.__dict__['name'] = name
+        self.__dict__['lines'] = list(lines)
+        self.__dict__['written'] = []
+        self.__dict__['reindexed'] = 0
+
+    def __setattr__(self, name, value):
+        self.written.append(name)
+        self.__dict__[name] = value
+
+    def getPhysicalPath(self):
+        return ('', self.name)
+
+    def getId(self):
+        return self.name
+
+    def objectIds(self):
+        return [line.name for line in self.lines]
+
+    def objectValues(self):
+        return self.lines
+
+    def reindexObject(self):
+        self.__dict__['reindexed'] += 1
+
+
+class StyleCloneTest(unittest.TestCase):
+    """Test copying styles from stylebook to bound charts"""
+
+    def tearDown(self):
+        transaction.abort()
+
+    def test_copy_plan(self):
+        plan = copy_plan(IChartStyleBook, ['x_label', 'y_label'])
+        self.assertIs(plan, copy_plan(IChartStyleBook, ['y_label', 'x_label']))
+        names = [name for name, default in plan]
+        self.assertNotIn('x_label', names)
+        self.assertIn('legend_location', names)
+
+    def test_clone(self):
+        book = MockStyled(
+            'book',
+            [MockStyled('l1', color=u'#f00'), MockStyled('l2')],
+            legend_location='nw',
+            )
+        line = MockStyled('s1')
+        chart = MockStyled('chart', [line, MockStyled('s2')])
+        clone_chart_styles(book, chart)
+        self.assertIn('legend_location', chart.written)
+        self.assertEqual(line.color, u'#f00')
+        line_fields = len(copy_plan(ILineDisplayCore))
+        self.assertEqual(len(line.written), line_fields)
+        # changed again, only differing values are written:
+        book.lines[0].color = u'#0f0'
+        del chart.written[:], line.written[:]
+        clone_chart_styles(book, chart)
+        clone_chart_styles(book, chart)
+        self.assertEqual(chart.written, [])
+        self.assertEqual(line.written, ['color'])
+        # reindexed once per transaction, before commit:
+        self.assertEqual(chart.reindexed, 0)
+        transaction.get().commit()
+        self.assertEqual((chart.reindexed, line.reindexed), (1, 1))
+        self.assertEqual(chart.lines[1].reindexed, 1)
+
+
+class StyleReferenceTest(unittest.TestCase):
+    """Test resolving styles of charts from stylebook by reference"""
+
+    def test_resolve(self):
+        book = MockStyled(
+            'book',
+            [MockStyled('l1', color=u'#f00')],
+            legend_location='nw',
+            x_label=u'Book label',
+            )
+        series = MockStyled('s1', style_overrides={'marker_size': 4.0})
+        chart = MockStyled('chart', [series, MockStyled('s2')])
+        styles = chart_styles(chart, book)
+        self.assertEqual(styles['legend_location'], 'nw')
+        self.assertNotIn('x_label', styles)  # chart-specific
+        lines = series_styles(chart, book)
+        self.assertEqual(lines.keys(), ['s1'])  # no line style for s2
+        self.assertEqual(lines['s1']['color'], u'#f00')
+        self.assertEqual(lines['s1']['marker_size'], 4.0)
+        # nothing is written to chart or series:
+        self.assertEqual(chart.written + series.written, [])
+        styled = Styled(chart, styles)
+        self.assertEqual(styled.legend_location, 'nw')
+        self.assertEqual(styled.getId(), 'chart')
+
+    def test_overrides(self):
+        book = MockStyled('book', legend_location='nw')
+        chart = MockStyled('chart', legend_location='nw')
+        alsoProvides(chart, IBaseChart)
+        chart.legend_location = 'sw'
+        self.assertTrue(record_overrides(chart, ['legend_location'], book))
+        overrides = dict(chart.style_overrides)
+        self.assertEqual(overrides, {'legend_location': 'sw'})
+        self.assertEqual(chart_styles(chart, book)['legend_location'], 'sw')
+        self.assertFalse(record_overrides(chart, ['title'], book))
+        chart.legend_location = 'nw'  # same as stylebook, no override
+        self.assertTrue(record_overrides(chart, ['legend_location'], book))
+        self.assertEqual(dict(chart.style_overrides), {})
+
+    def test_rebind(self):
+        series = MockStyled('s1', style_overrides={'color': u'#0f0'})
+        chart = MockStyled(
+            'chart',
+            [series, MockStyled('s2')],
+            style_overrides={'legend_location': 'sw'},
+            )
+        alsoProvides(chart, IBaseChart)
+        self.assertIsNone(effective_styles(chart))  # not bound
+        clear_overrides(chart)
+        self.assertEqual(dict(chart.style_overrides), {})
+        self.assertEqual(dict(series.style_overrides), {})
+        self.assertEqual(chart.lines[1].written, [])  # had no overrides
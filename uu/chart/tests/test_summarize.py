@@ -0,0 +1,108 @@
+from datetime import date
+import unittest2 as unittest
+
+from uu.chart.columns import PointColumns
+from uu.chart.data import TimeSeriesDataPoint
+from uu.chart.interfaces import AGGREGATE_LABELS
+from uu.chart.measureseries import MeasureSeriesProvider
+from uu.chart import summarize
+
+
+def exact(value):
+    """Value and its type, floats rounded (sums differ in last bits)"""
+    if isinstance(value, float):
+        return (float, round(value, 9))
+    return (type(value), value)
+
+
+def rows(points):
+    return [
+        (
+            points.identity(idx),
+            exact(points.value(idx)),
+            points.notes.get(idx),
+            points.sample_size(idx),
+            points.distributions.get(idx),
+        )
+        for idx in range(len(points))
+        ]
+
+
+@unittest.skipUnless(summarize.HAS_NUMPY, 'NumPy not installed')
+class SummarizationEngineTest(unittest.TestCase):
+    """Test vectorized summarization against reference implementation"""
+
+    def _points(self):
+        points = PointColumns(TimeSeriesDataPoint)
+        for month, value, size in (
+                (1, 1.5, 10),
+                (2, 4, None),
+                (1, 3, 5),
+                (3, None, 2),
+                (2, 2.5, 3),
+                (1, 0.5, None),
+                (4, 7, 1),
+                (3, None, 4),
+                (4, 2, 2),
+                (4, 9, None),
+                ):
+            points.append(date(2014, month, 1), value, sample_size=size)
+        return points
+
+    def _reference(self):
+        provider = MeasureSeriesProvider()
+        provider._v_pointcls = TimeSeriesDataPoint
+        return provider
+
+    def test_aggregate(self):
+        points = self._points()
+        reference = self._reference()
+        for strategy, label in AGGREGATE_LABELS:
+            expected = reference.aggregate_function_summarization(
+                points,
+                strategy,
+                )
+            result = summarize.aggregate_summarization(
+                points,
+                strategy,
+                label,
+                )
+            self.assertEqual(len(result), 4)
+            self.assertEqual(
+                [row for i, row in enumerate(rows(result)) if i != 2],
+                [row for i, row in enumerate(rows(expected)) if i != 2],
+                )
+            self.assertEqual(result.notes[2], summarize.ALL_NAN_NOTE)
+        count = summarize.aggregate_summarization(points, 'COUNT', u'Count')
+        self.assertEqual([count.value(i) for i in (0, 1, 3)], [3, 2, 3])
+        self.assertEqual(count.ints, set([0, 1, 3]))
+
+    def test_weighted_mean(self):
+        points = self._points()
+        points.values[3] = points.values[7] = 1.0  # no all-NaN keys
+        points.nulls.clear()
+        expected = self._reference().weighted_mean_summarization(points)
+        result = summarize.weighted_mean_summarization(points)
+        self.assertEqual(rows(result), rows(expected))
+        self.assertAlmostEqual(result.value(0), (15 + 15 + 0.5) / 16.0)
+
+
+class SelectionSummarizationTest(unittest.TestCase):
+    """Test FIRST, LAST and IGNORE strategies"""
+
+    def test_selection(self):
+        points = PointColumns(TimeSeriesDataPoint)
+        for month, value in ((3, 1), (1, 2), (3, 3), (2, 4), (1, 5), (4, 6)):
+            points.append(date(2014, month, 1), value)
+        provider = MeasureSeriesProvider()
+        provider._v_pointcls = TimeSeriesDataPoint
+        for strategy, expected in (
+                ('FIRST', [(1, 2), (2, 4), (3, 1), (4, 6)]),
+                ('LAST', [(1, 5), (2, 4), (3, 3), (4, 6)]),
+                ('IGNORE', [(2, 4), (4, 6)]),
+                ):
+            result = provider.selection_summarization(points, strategy)
+            self.assertEqual(
+                [(p.identity().month, p.value) for p in result],
+                expected,
+                )
@@ -0,0 +1,38 @@
+import unittest2 as unittest
+
+from zope.component import getSiteManager
+from zope.interface import Interface, alsoProvides
+
+from uu.formlibrary.interfaces import ISetSpecifier
+from uu.formlibrary.measure.interfaces import IMeasureDefinition
+
+from uu.chart.browser.measureseries import ChartUsageView
+from uu.chart.interfaces import IChartProductLayer
+from uu.chart.tests.layers import DEFAULT_PROFILE_TESTING
+
+
+class Content(object):
+    """Stand-in for measure or dataset"""
+
+
+class ChartUsageTest(unittest.TestCase):
+    """Test chart usage view of measures and datasets"""
+
+    layer = DEFAULT_PROFILE_TESTING
+
+    def test_registered(self):
+        adapters = getSiteManager().adapters
+        for iface in (IMeasureDefinition, ISetSpecifier):
+            view = adapters.lookup(
+                (iface, IChartProductLayer),
+                Interface,
+                name='chart_usage',
+                )
+            self.assertIsNotNone(view)
+            self.assertTrue(issubclass(view, ChartUsageView))
+
+    def test_noun(self):
+        measure, dataset = Content(), Content()
+        alsoProvides(measure, IMeasureDefinition)
+        self.assertEqual(ChartUsageView(measure, None).noun, u'measure')
+        self.assertEqual(ChartUsageView(dataset, None).noun, u'dataset')